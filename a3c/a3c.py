@@ -7,32 +7,7 @@ import datetime
 from os import path
 from models import ActorCriticLSTM
 from helpers.helpers import make_sure_path_exists
-
-
-def normalize_state_buf(step_state_buf):
-    norm_state_buf = np.asarray(step_state_buf, dtype=np.float32)
-    for i in xrange(1):
-        norm_state_buf[:, i][norm_state_buf[:, i] < 1.0] = 1.0
-        norm_state_buf[:, i] = np.log(norm_state_buf[:, i])
-
-    return norm_state_buf
-
-
-def ewma(data, window):
-    alpha = 2 /(window + 1.0)
-    alpha_rev = 1-alpha
-    n = data.shape[0]
-
-    pows = alpha_rev**(np.arange(n+1))
-
-    scale_arr = 1/pows[:-1]
-    offset = data[0]*pows[1:]
-    pw0 = alpha*alpha_rev**(n-1)
-
-    mult = data*pw0*scale_arr
-    cumsums = mult.cumsum()
-    out = offset + cumsums*scale_arr[::-1]
-    return out
+from helpers.features import a3c_state, normalize_state_buf
 
 
 class A3C(object):
@@ -69,7 +44,10 @@ class A3C(object):
         self.action_cnt = env.action_cnt
 
         # must call env.set_sample_action() before env.run()
-        env.set_sample_action(self.sample_action)
+        if env.num_envs > 1:
+            env.set_sample_actions(self.sample_actions)
+        else:
+            env.set_sample_action(self.sample_action)
 
         # build tensorflow computation graph
         self.build_tf_graph()
@@ -187,68 +165,113 @@ class A3C(object):
         else:
             return 3
 
-    def sample_action(self, step_state_buf):
-
-        # ravel() is a faster flatten()
-        flat_step_state_buf = np.asarray(step_state_buf, dtype=np.float32).ravel()
-
+    def observe(self, step_state_buf):
+        """Appends the state of a step to the episode buffers. Returns the
+        state and, with dagger, the expert action.
+        """
         # normalize step_state_buf and append to episode buffer
         # norm_state_buf = normalize_state_buf(step_state_buf)
 
         # state = EWMA of past step
-        ewma_delay = ewma(flat_step_state_buf, 3)
+        ewma_delay = a3c_state(step_state_buf)
 
         self.state_buf.extend([ewma_delay])
         last_index = self.indices[-1] if len(self.indices) > 0 else -1
         self.indices.append(1 + last_index)
 
+        expert_action = None
         if self.dagger:
             expert_action = self.sample_expert_action(step_state_buf)
             self.action_buf.append(expert_action)
 
+        return ewma_delay, expert_action
+
+    def step_ops(self):
+        """Ops of one step of the local network, from its LSTM state."""
+        pi = self.local_network
+        if self.dagger:
+            return [pi.step_action_probs, pi.step_state_out]
+        return [pi.step_action_probs, pi.step_state_out, pi.step_state_values]
+
+    def sample_action(self, step_state_buf):
+        state, expert_action = self.observe(step_state_buf)
+
+        if self.dagger:
             # exponentially decaying sample of using expert policy
             use_expert = 0.75 ** self.local_step
 
             if use_expert == 0:
                 return expert_action
 
-        # run ops in local networks
+        # run one step of the local network, carrying its LSTM state
         pi = self.local_network
 
         feed_dict = {
-            pi.states: [ewma_delay],  #norm_state_buf,
-            pi.indices: [0],
-            #pi.lstm_state_in: pi.lstm_state_init,
+            pi.step_states: [state],
+            pi.step_state_in: self.lstm_state,
         }
 
-        if self.dagger:
-            ops_to_run = [pi.action_probs]#, pi.lstm_state_out]
-        else:
-            ops_to_run = [pi.action_probs, pi.state_values]#, pi.lstm_state_out]
-
         start_time = time.time()
-        ret = self.session.run(ops_to_run, feed_dict)
+        ret = self.session.run(self.step_ops(), feed_dict)
         elapsed_time = time.time() - start_time
         self.time_file.write('TF sample_action took: %s s.\n' % elapsed_time)
 
-        if self.dagger:
-            action_probs = ret#, lstm_state_out = ret
-        else:
-            action_probs, state_values = ret#, lstm_state_out = ret
+        action_probs, self.lstm_state = ret[:2]
 
-        # choose an action to take and update current LSTM state
+        # choose an action to take
         #action = np.argmax(np.random.multinomial(1, action_probs - 1e-5))
 
-        action = np.argmax(action_probs)
-        # self.lstm_state = lstm_state_out
+        action = np.argmax(action_probs[0])
 
         if not self.dagger:
             self.action_buf.append(action)
-            self.value_buf.extend(state_values)
-        
+            self.value_buf.extend(ret[2])
 
         return action
 
+    def sample_actions(self, env_ids, states):
+        """sample_action() for the environments of a ParallelEnvironment:
+        one step of the local network for all of them, each with its own
+        episode buffers and LSTM state.
+        """
+        rows = np.asarray(env_ids)
+
+        step_states = []
+        expert_actions = []
+        for env_id, state in zip(env_ids, states):
+            (self.state_buf, self.indices,
+             self.action_buf, self.value_buf) = self.env_bufs[env_id]
+            step_state, expert_action = self.observe(state)
+            step_states.append(step_state)
+            expert_actions.append(expert_action)
+
+        if self.dagger and 0.75 ** self.local_step == 0:
+            return expert_actions
+
+        pi = self.local_network
+        feed_dict = {
+            pi.step_states: step_states,
+            pi.step_state_in: [(c[rows], h[rows])
+                               for c, h in self.env_lstm_states],
+        }
+        ret = self.session.run(self.step_ops(), feed_dict)
+        action_probs, state_out = ret[:2]
+
+        # scatter the new LSTM states back to their environments
+        for (c, h), (c_out, h_out) in zip(self.env_lstm_states, state_out):
+            c[rows] = c_out
+            h[rows] = h_out
+
+        actions = np.argmax(action_probs, axis=1)
+
+        if not self.dagger:
+            for i, env_id in enumerate(env_ids):
+                _, _, action_buf, value_buf = self.env_bufs[env_id]
+                action_buf.append(actions[i])
+                value_buf.append(ret[2][i])
+
+        return list(actions)
+
     def save_model(self, check_point=None):
         if check_point is None:
             model_path = path.join(self.logdir, 'model')
@@ -271,7 +294,7 @@ class A3C(object):
         self.state_buf = []
         self.indices = []
         self.action_buf = []
-        #self.lstm_state = self.local_network.lstm_state_init
+        self.lstm_state = self.local_network.lstm_state_init
 
         if not self.dagger:
             self.value_buf = []
@@ -279,10 +302,51 @@ class A3C(object):
         # reset environment
         self.env.reset()
 
+        if self.env.num_envs > 1:
+            self.rollout_parallel()
+            return
+
         # get an episode of rollout
         final_reward = self.env.rollout()
         print(final_reward)
 
+        self.seq_lens = [len(self.state_buf)]
+        self.compute_returns(final_reward)
+
+    def rollout_parallel(self):
+        """Gets an episode from every environment of a ParallelEnvironment
+        and merges them into the buffers of one update. seq_lens keeps the
+        episodes apart, so each is trained from a zero LSTM state, as it
+        was sampled.
+        """
+        self.env_bufs = [([], [], [], []) for _ in xrange(self.env.num_envs)]
+        self.env_lstm_states = self.local_network.zero_init_state(
+            self.env.num_envs)
+        final_rewards = self.env.rollout()
+        print(final_rewards)
+
+        merged = ([], [], [], [], [])
+        for bufs, final_reward in zip(self.env_bufs, final_rewards):
+            (self.state_buf, self.indices,
+             self.action_buf, self.value_buf) = bufs
+            self.compute_returns(final_reward)
+
+            # indices count the steps of the merged episodes
+            offset = len(merged[0])
+            merged[0].extend(self.state_buf)
+            merged[1].extend([offset + i for i in self.indices])
+            merged[2].extend(self.action_buf)
+            if not self.dagger:
+                merged[3].extend(self.reward_buf)
+                merged[4].extend(self.adv_buf)
+
+        (self.state_buf, self.indices, self.action_buf,
+         self.reward_buf, self.adv_buf) = merged
+        self.seq_lens = [len(bufs[0]) for bufs in self.env_bufs]
+
+    def compute_returns(self, final_reward):
+        """Discounted returns and advantages of the episode in the buffers."""
+
         # state_buf, indices, action_buf, etc. should have been filled in
         episode_len = len(self.indices)
         # assert len(self.action_buf) == episode_len
@@ -329,7 +393,8 @@ class A3C(object):
             if self.dagger:
                 ret = self.session.run(ops_to_run, {
                     pi.states: self.state_buf,
-                    # pi.indices: self.indices,
+                    pi.indices: self.indices,
+                    pi.seq_lens: self.seq_lens,
                     self.actions: self.action_buf,
                     #pi.lstm_state_in: pi.lstm_state_init,
                 })
@@ -337,6 +402,7 @@ class A3C(object):
                 ret = self.session.run(ops_to_run, {
                     pi.states: self.state_buf,
                     pi.indices: self.indices,
+                    pi.seq_lens: self.seq_lens,
                     self.actions: self.action_buf,
                     self.rewards: self.reward_buf,
                     self.advantages: self.adv_buf,
@@ -21,63 +21,122 @@ class ActorCriticNetwork(object):
 
 
 class ActorCriticLSTM(object):
+    """Actor and critic on a 2-layer LSTM, in two graphs on the same
+    variables: states, whole episodes through dynamic_rnn for training,
+    and step_states, one step of a batch of flows through the cell itself
+    for inference, with the LSTM state of every flow fed in and out.
+    """
+
     def __init__(self, state_dim, action_cnt):
+        # the steps of one or more episodes, one after another; seq_lens
+        # holds the length of each, and is one episode of all unless fed
         self.states = tf.placeholder(tf.float32, [None, state_dim])
         self.indices = tf.placeholder(tf.int32, [None])
-        rnn_in = tf.expand_dims(self.states, [0])  # shape=(1, ?, state_dim)
-
-        lstm_layers = 2
-        lstm_state_dim = 256
+        self.seq_lens = tf.placeholder_with_default(
+            tf.shape(self.states)[:1], [None])
+
+        # each episode is a sequence of its own, from its own LSTM state:
+        # shape=(episodes, longest, state_dim), padded with zeros
+        steps = tf.where(tf.sequence_mask(self.seq_lens))
+        episode_cnt = tf.size(self.seq_lens)
+        rnn_in = tf.scatter_nd(steps, self.states, tf.stack(
+            [tf.cast(episode_cnt, tf.int64),
+             tf.cast(tf.reduce_max(self.seq_lens), tf.int64),
+             tf.constant(state_dim, tf.int64)]))
+        rnn_in.set_shape([None, None, state_dim])
+
+        self.lstm_layers = 2
+        self.lstm_state_dim = 256
         lstm_cell_list = []
-        for i in xrange(lstm_layers):
-            lstm_cell_list.append(rnn.BasicLSTMCell(lstm_state_dim))
+        for i in xrange(self.lstm_layers):
+            lstm_cell_list.append(rnn.BasicLSTMCell(self.lstm_state_dim))
         stacked_cell = rnn.MultiRNNCell(lstm_cell_list)
 
-       # self.lstm_state_init = []
-        #self.lstm_state_in = []
-        #lstm_state_in = []
-        #for i in xrange(lstm_layers):
-            #c_init = np.zeros([1, lstm_state_dim], np.float32)
-            #h_init = np.zeros([1, lstm_state_dim], np.float32)
-            #self.lstm_state_init.append((c_init, h_init))
-
-            #c_in = tf.placeholder(tf.float32, [1, lstm_state_dim])
-            #h_in = tf.placeholder(tf.float32, [1, lstm_state_dim])
-            #self.lstm_state_in.append((c_in, h_in))
-            #lstm_state_in.append(rnn.LSTMStateTuple(c_in, h_in))
-
-        #self.lstm_state_init = tuple(self.lstm_state_init)
-
-        # state input placeholder: ((c1, h1), (c2, h2))
-        #self.lstm_state_in = tuple(self.lstm_state_in)
-
-        # (LSTMStateTuple(c1, h1), LSTMStateTuple(c2, h2))
-        #lstm_state_in = tuple(lstm_state_in)
-
-        # lstm_state_out: (LSTMStateTuple(c1, h1), LSTMStateTuple(c2, h2))
-        # rnn_out: shape=(1, ?, lstm_state_dim), includes all h2 from the batch
+        # state input placeholders: ((c1, h1), (c2, h2)); every episode
+        # starts from zeros unless fed, as every flow does when sampling
+        self.lstm_state_init = tuple(self.zero_init_state(1))
+        zeros = tf.zeros([episode_cnt, self.lstm_state_dim])
+        self.lstm_state_in = self.state_placeholders(
+            default=[(zeros, zeros)] * self.lstm_layers)
+        self.step_state_in = self.state_placeholders()
+
+        # lstm_state_out: (LSTMStateTuple(c1, h1), LSTMStateTuple(c2, h2)),
+        # at the end of each episode
+        # rnn_out: shape=(episodes, longest, lstm_state_dim), all h2
         rnn_out, lstm_state_out = tf.nn.dynamic_rnn(
-            stacked_cell, rnn_in, dtype=tf.float32)  #, initial_state=lstm_state_in)
-
-        self.lstm_state_out = []
-        for i in xrange(lstm_layers):
-            self.lstm_state_out.append(
-                (lstm_state_out[i].c, lstm_state_out[i].h))
+            stacked_cell, rnn_in, sequence_length=self.seq_lens,
+            initial_state=self.state_tuples(self.lstm_state_in))
         # state output: ((c1, h1), (c2, h2))
-        self.lstm_state_out = tuple(self.lstm_state_out)
+        self.lstm_state_out = self.state_pairs(lstm_state_out)
 
-        # output: shape=(?, lstm_state_dim)
-        output = tf.reshape(rnn_out, [-1, lstm_state_dim])
+        # output: shape=(?, lstm_state_dim), in the order of states
+        output = tf.gather_nd(rnn_out, steps)
         output = tf.gather(output, self.indices)
 
-        # actor
-        actor_h1 = layers.relu(output, 64)
-        self.action_scores = layers.linear(actor_h1, action_cnt)
-        self.action_probs = tf.nn.softmax(self.action_scores)
+        (self.action_scores, self.action_probs,
+         self.state_values) = self.heads(output, action_cnt, reuse=False)
 
-        # critic
-        critic_h1 = layers.relu(output, 64)
-        self.state_values = tf.reshape(layers.linear(critic_h1, 1), [-1])
+        # single step: the cell was built by dynamic_rnn, so calling it
+        # again reuses its variables
+        self.step_states = tf.placeholder(tf.float32, [None, state_dim])
+        with tf.variable_scope('rnn', reuse=True):
+            step_out, step_state_out = stacked_cell(
+                self.step_states, self.state_tuples(self.step_state_in))
+        self.step_state_out = self.state_pairs(step_state_out)
+
+        (_, self.step_action_probs,
+         self.step_state_values) = self.heads(step_out, action_cnt, reuse=True)
 
         self.trainable_vars = tf.get_collection(
             tf.GraphKeys.TRAINABLE_VARIABLES, tf.get_variable_scope().name)
+
+    def heads(self, output, action_cnt, reuse):
+        """Actor and critic layers on LSTM outputs, under the scopes that
+        layers gives them by default, so checkpoints keep their names.
+        """
+        # actor
+        actor_h1 = layers.relu(output, 64, reuse=reuse,
+                               scope='fully_connected')
+        action_scores = layers.linear(actor_h1, action_cnt, reuse=reuse,
+                                      scope='fully_connected_1')
+        action_probs = tf.nn.softmax(action_scores)
+
+        # critic
+        critic_h1 = layers.relu(output, 64, reuse=reuse,
+                                scope='fully_connected_2')
+        state_values = tf.reshape(layers.linear(
+            critic_h1, 1, reuse=reuse, scope='fully_connected_3'), [-1])
+
+        return action_scores, action_probs, state_values
+
+    def state_placeholders(self, default=None):
+        state_in = []
+        for i in xrange(self.lstm_layers):
+            if default is None:
+                c_in = tf.placeholder(tf.float32,
+                                      [None, self.lstm_state_dim])
+                h_in = tf.placeholder(tf.float32,
+                                      [None, self.lstm_state_dim])
+            else:
+                c_in = tf.placeholder_with_default(
+                    default[i][0], [None, self.lstm_state_dim])
+                h_in = tf.placeholder_with_default(
+                    default[i][1], [None, self.lstm_state_dim])
+            state_in.append((c_in, h_in))
+
+        return tuple(state_in)
+
+    def state_tuples(self, state_pairs):
+        return tuple(rnn.LSTMStateTuple(c, h) for c, h in state_pairs)
+
+    def state_pairs(self, state_tuples):
+        return tuple((state.c, state.h) for state in state_tuples)
+
+    def zero_init_state(self, batch_size):
+        init_state = []
+        for _ in xrange(self.lstm_layers):
+            c_init = np.zeros([batch_size, self.lstm_state_dim], np.float32)
+            h_init = np.zeros([batch_size, self.lstm_state_dim], np.float32)
+            init_state.append((c_init, h_init))
+
+        return init_state
@@ -7,16 +7,20 @@ import tensorflow as tf
 from os import path
 from env.sender import Sender
 from models import ActorCriticLSTM
-from a3c import ewma
+from helpers.features import a3c_state
 
 
 class Learner(object):
-    def __init__(self, state_dim, action_cnt, restore_vars):
+    def __init__(self, state_dim, action_cnt, restore_vars, num_flows=1):
         with tf.variable_scope('local'):
             self.pi = ActorCriticLSTM(
                 state_dim=state_dim, action_cnt=action_cnt)
-            # # save the current LSTM state of local network
-            # self.lstm_state = self.pi.lstm_state_init
+
+        # the current LSTM state of local network
+        self.lstm_state = self.pi.lstm_state_init
+
+        # per-flow LSTM states for sample_actions(), one row per flow
+        self.flow_lstm_state = self.pi.zero_init_state(num_flows)
 
         self.session = tf.Session()
 
@@ -29,34 +33,71 @@ class Learner(object):
         self.session.run(tf.variables_initializer(uninit_vars))
 
     def sample_action(self, step_state_buf):
-        # ravel() is a faster flatten()
-        flat_step_state_buf = np.asarray(step_state_buf, dtype=np.float32).ravel()
-
         # state = EWMA of past step
-        ewma_delay = ewma(flat_step_state_buf, 3)
+        ewma_delay = a3c_state(step_state_buf)
 
-        ops_to_run = [self.pi.action_probs]#, self.pi.lstm_state_out]
+        ops_to_run = [self.pi.step_action_probs, self.pi.step_state_out]
         feed_dict = {
-            self.pi.states: [ewma_delay],
-            self.pi.indices: [0],
-            # self.pi.lstm_state_in: self.lstm_state,
+            self.pi.step_states: [ewma_delay],
+            self.pi.step_state_in: self.lstm_state,
         }
 
-        ret = self.session.run(ops_to_run, feed_dict)
-        action_probs = ret#, lstm_state_out = ret
+        action_probs, self.lstm_state = self.session.run(ops_to_run,
+                                                         feed_dict)
 
-        action = np.argmax(action_probs)
+        action = np.argmax(action_probs[0])
         # action = np.argmax(np.random.multinomial(1, action_probs[0] - 1e-5))
-        # self.lstm_state = lstm_state_out
         return action
 
+    def sample_actions(self, flow_ids, step_state_bufs):
+        """Batched sample_action() for many flows in one step of the
+        network, carrying each flow's LSTM state separately.
+        """
+        rows = np.asarray(flow_ids)
+
+        step_states = [a3c_state(buf) for buf in step_state_bufs]
+
+        ops_to_run = [self.pi.step_action_probs, self.pi.step_state_out]
+        feed_dict = {
+            self.pi.step_states: step_states,
+            self.pi.step_state_in: [(c[rows], h[rows])
+                                    for c, h in self.flow_lstm_state],
+        }
+        action_probs, state_out = self.session.run(ops_to_run, feed_dict)
+
+        # scatter the new LSTM states back to their flows
+        for (c, h), (c_out, h_out) in zip(self.flow_lstm_state, state_out):
+            c[rows] = c_out
+            h[rows] = h_out
+
+        return np.argmax(action_probs, axis=1)
+
+    def reset_flows(self, flow_ids):
+        """Starts flow_ids over, from a zero LSTM state."""
+        rows = np.asarray(flow_ids)
+        for c, h in self.flow_lstm_state:
+            c[rows] = 0.0
+            h[rows] = 0.0
+
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('port', type=int)
+    parser.add_argument('--batch-io', action='store_true',
+                        help='use batched datagram I/O (sendmmsg/recvmmsg)')
+    parser.add_argument('--wire-format', choices=['protobuf', 'struct'],
+                        default='protobuf',
+                        help='preferred wire format (default: protobuf)')
+    parser.add_argument('--io-backend', choices=['poll', 'epoll'],
+                        default='poll',
+                        help='event loop backend (default: poll)')
+    parser.add_argument('--async-inference', action='store_true',
+                        help='sample actions off the packet loop')
     args = parser.parse_args()
 
-    sender = Sender(args.port)
+    sender = Sender(args.port, batch_io=args.batch_io,
+                    wire_format=args.wire_format, io_backend=args.io_backend,
+                    async_inference=args.async_inference)
 
     model_path = path.join(project_root.DIR, 'a3c', 'logs', 'model')
 
@@ -29,6 +29,11 @@ def run(args):
                 cmd.append('--dagger')
             if args['driver'] is not None:
                 cmd += ['--driver', args['driver']]
+            if args['persistent_env']:
+                cmd.append('--persistent-env')
+            if args['emulate']:
+                cmd.append('--emulate')
+            cmd += ['--envs-per-worker', str(args['envs_per_worker'])]
 
             cmd = ssh_cmd + cmd
 
@@ -85,6 +90,9 @@ def construct_args(prog_args):
     args['worker_procs'] = []
     args['dagger'] = prog_args.dagger
     args['driver'] = prog_args.driver
+    args['persistent_env'] = prog_args.persistent_env
+    args['emulate'] = prog_args.emulate
+    args['envs_per_worker'] = prog_args.envs_per_worker
 
     return args
 
@@ -106,6 +114,15 @@ def main():
     parser.add_argument('--dagger', action='store_true',
         help='run Dagger rather than A3C')
     parser.add_argument('--driver', help='hostname of the driver')
+    parser.add_argument(
+        '--persistent-env', action='store_true',
+        help='keep mahimahi and the receiver alive across episodes')
+    parser.add_argument(
+        '--emulate', action='store_true',
+        help='emulate the mahimahi shells in process, in virtual time')
+    parser.add_argument(
+        '--envs-per-worker', metavar='K', type=int, default=1,
+        help='environments each worker runs in parallel (default: 1)')
     prog_args = parser.parse_args()
     args = construct_args(prog_args)
 
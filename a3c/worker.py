@@ -9,21 +9,20 @@ from subprocess import check_call
 from os import path
 from a3c import A3C
 from env.environment import Environment
+from env.parallel_environment import ParallelEnvironment
+from helpers.trace_cache import TraceCache
+
+
+TRACE_CACHE = TraceCache()
 
 
 def prepare_traces(bandwidth):
     trace_dir = path.join(project_root.DIR, 'env')
 
     if type(bandwidth) == int:
-        if bandwidth != 12:
-            gen_trace = path.join(project_root.DIR, 'helpers',
-                                  'generate_trace.py')
-            cmd = ['python', gen_trace, '--output-dir', trace_dir,
-                   '--bandwidth', str(bandwidth)]
-            sys.stderr.write('$ %s\n' % ' '.join(cmd))
-            check_call(cmd)
-
-        uplink_trace = path.join(trace_dir, '%dmbps.trace' % bandwidth)
+        # generated once, then shared by every worker through the cache
+        uplink_trace = TRACE_CACHE.generated_text(model='constant',
+                                                  bandwidth=bandwidth)
         downlink_trace = uplink_trace
     else:
         trace_path = path.join(trace_dir, bandwidth)
@@ -34,7 +33,7 @@ def prepare_traces(bandwidth):
     return uplink_trace, downlink_trace
 
 
-def create_env(task_index):
+def create_env(task_index, persistent=False, emulate=False, num_envs=1):
     bandwidth = int(np.linspace(30, 60, num=4, dtype=np.int)[task_index])
     delay = 25
     queue = None
@@ -46,7 +45,11 @@ def create_env(task_index):
         mm_cmd += (' --downlink-queue=droptail '
                    '--downlink-queue-args=packets=%d' % queue)
 
-    env = Environment(mm_cmd)
+    if num_envs > 1:
+        env = ParallelEnvironment([mm_cmd] * num_envs, persistent=persistent,
+                                  emulate=emulate)
+    else:
+        env = Environment(mm_cmd, persistent=persistent, emulate=emulate)
     #env.setup()
     return env
 
@@ -70,7 +73,8 @@ def run(args):
     if job_name == 'ps':
         server.join()
     elif job_name == 'worker':
-        env = create_env(task_index)
+        env = create_env(task_index, args.persistent_env, args.emulate,
+                         args.envs_per_worker)
 
         learner = A3C(
             cluster=cluster,
@@ -104,6 +108,15 @@ def main():
     parser.add_argument('--dagger', action='store_true',
                         help='run Dagger rather than A3C')
     parser.add_argument('--driver', help='hostname of the driver')
+    parser.add_argument('--persistent-env', action='store_true',
+                        help='keep mahimahi and the receiver alive across '
+                        'episodes')
+    parser.add_argument('--emulate', action='store_true',
+                        help='emulate the mahimahi shells in process, in '
+                        'virtual time')
+    parser.add_argument('--envs-per-worker', metavar='K', type=int, default=1,
+                        help='environments each worker runs in parallel, '
+                        'in child processes (default: 1)')
     args = parser.parse_args()
 
     # run parameter servers and workers
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+"""Loopback benchmark of delayed ACKs: CPU per delivered megabyte on the
+sender and the receiver, with one ACK per datagram and with coalescing."""
+
+import os
+import sys
+import time
+import signal
+import argparse
+from os import path
+from subprocess import Popen
+import project_root
+from env.sender import Sender
+from helpers.helpers import get_open_udp_port, cpu_time
+
+
+def hold_cwnd():
+    """Returns the index of the action that keeps cwnd unchanged."""
+    for idx, (op, val) in Sender.action_mapping.iteritems():
+        if op == '+' and val == 0.0:
+            return idx
+
+
+def proc_cpu_time(pid):
+    """Returns user + system CPU seconds consumed by process pid so far."""
+    with open('/proc/%d/stat' % pid) as stat:
+        fields = stat.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / float(
+        os.sysconf('SC_CLK_TCK'))
+
+
+def run_once(args, ack_count):
+    port = get_open_udp_port()
+    sender = Sender(port, train=True, batch_io=args.batch_io,
+                    wire_format='struct', io_backend=args.io_backend)
+    sender.cwnd = float(args.cwnd)
+
+    action = hold_cwnd()
+    sender.set_sample_action(lambda state: action)
+
+    receiver_src = path.join(project_root.DIR, 'env', 'run_receiver.py')
+    receiver = Popen([sys.executable, receiver_src, '127.0.0.1', str(port),
+                      '--io-backend', args.receiver_io_backend,
+                      '--ack-count', str(ack_count),
+                      '--ack-delay-us', str(args.ack_delay_us)],
+                     preexec_fn=os.setsid)
+
+    try:
+        sender.handshake()
+
+        start_wall = time.time()
+        start_cpu = cpu_time()
+        start_receiver_cpu = proc_cpu_time(receiver.pid)
+        sender.run()
+        wall = time.time() - start_wall
+        cpu = cpu_time() - start_cpu
+        receiver_cpu = proc_cpu_time(receiver.pid) - start_receiver_cpu
+    finally:
+        sender.cleanup()
+        os.killpg(os.getpgid(receiver.pid), signal.SIGTERM)
+        receiver.wait()
+
+    mbytes = sender.delivered / 1e6
+    return (8 * mbytes / wall, cpu * 1e6 / mbytes,
+            receiver_cpu * 1e6 / mbytes,
+            float(sender.acks_processed) / sender.seq_num,
+            sender.rtt_percentiles([95])[0])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--steps', type=int, default=300,
+                        help='steps per run (default: 300)')
+    parser.add_argument('--cwnd', type=int, default=100,
+                        help='fixed congestion window (default: 100)')
+    parser.add_argument('--ack-counts', default='1,2,4,8,16',
+                        help='comma-separated datagrams per ACK '
+                        '(default: 1,2,4,8,16)')
+    parser.add_argument('--ack-delay-us', type=int, default=1000,
+                        help='max time to hold a coalesced ACK '
+                        '(default: 1000)')
+    parser.add_argument('--batch-io', action='store_true',
+                        help='use batched datagram I/O on the sender')
+    parser.add_argument('--io-backend', choices=['poll', 'epoll'],
+                        default='epoll',
+                        help='sender event loop backend (default: epoll)')
+    parser.add_argument('--receiver-io-backend', choices=['blocking', 'epoll'],
+                        default='epoll',
+                        help='receiver event loop backend (default: epoll)')
+    args = parser.parse_args()
+
+    Sender.max_steps = args.steps
+
+    results = []
+    for ack_count in map(int, args.ack_counts.split(',')):
+        results.append((ack_count, run_once(args, ack_count)))
+
+    sys.stderr.write('\n%10s %8s %16s %16s %10s %10s\n' % (
+        'ack count', 'Mbps', 'sender us/MB', 'receiver us/MB',
+        'ACKs/pkt', 'p95 RTT'))
+    for ack_count, (mbps, sender_cpu, receiver_cpu, acks, rtt) in results:
+        sys.stderr.write('%10d %8.1f %16.0f %16.0f %10.2f %10.1f\n' % (
+            ack_count, mbps, sender_cpu, receiver_cpu, acks, rtt))
+
+
+if __name__ == '__main__':
+    main()
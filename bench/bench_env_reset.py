@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+"""Time spent in Environment.reset() per episode, restarting mahimahi and
+the receiver every episode vs. keeping them alive."""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+from os import path
+import project_root
+from env.environment import Environment
+from env.sender import Sender
+
+
+def run_once(args, persistent):
+    env = Environment(args.mahimahi_cmd, persistent=persistent)
+    env.set_sample_action(lambda state: np.random.randint(Sender.action_cnt))
+
+    reset_times = []
+    start = time.time()
+    try:
+        for _ in xrange(args.episodes):
+            env.reset()
+            reset_times.append(env.reset_time)
+            env.rollout()
+    finally:
+        env.cleanup()
+
+    return (np.mean(reset_times), np.max(reset_times), time.time() - start,
+            env.reset_summary())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--episodes', type=int, default=10,
+                        help='episodes per run (default: 10)')
+    parser.add_argument('--steps', type=int, default=100,
+                        help='steps per episode (default: 100)')
+    parser.add_argument(
+        '--mahimahi-cmd', default='env',
+        help='command the receiver runs in, e.g. "mm-delay 20" '
+        '(default: "env" with MAHIMAHI_BASE=127.0.0.1, i.e. no emulation)')
+    args = parser.parse_args()
+
+    Sender.max_steps = args.steps
+
+    # the receiver is started with "python" from PATH
+    os.environ['PATH'] = '%s:%s' % (path.dirname(sys.executable),
+                                    os.environ['PATH'])
+    os.environ.setdefault('MAHIMAHI_BASE', '127.0.0.1')
+
+    results = []
+    for persistent in [False, True]:
+        mode = 'persistent' if persistent else 'restart'
+        results.append((mode, run_once(args, persistent)))
+
+    sys.stderr.write('\n%-12s %14s %14s %12s\n' % (
+        'mode', 'mean reset s', 'max reset s', 'total s'))
+    for mode, (mean_reset, max_reset, total, _) in results:
+        sys.stderr.write('%-12s %14.3f %14.3f %12.2f\n' % (
+            mode, mean_reset, max_reset, total))
+
+    sys.stderr.write('\n%-12s %-10s %12s %12s\n' % (
+        'mode', 'phase', 'p50 ms', 'p99 ms'))
+    for mode, (_, _, _, summary) in results:
+        for phase, (p50, p99) in sorted(summary.iteritems()):
+            sys.stderr.write('%-12s %-10s %12.2f %12.2f\n' % (
+                mode, phase, 1000 * p50, 1000 * p99))
+
+
+if __name__ == '__main__':
+    main()
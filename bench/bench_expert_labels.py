@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+"""Time to label cwnds with the expert: get_best_action() one cwnd at a
+time, as TrueDaggerExpert did every step, against best_actions() and an
+ExpertTable over the whole array.
+"""
+
+import sys
+import time
+import argparse
+import numpy as np
+import project_root
+from env.sender import Sender
+from dagger.experts import action_error, best_actions, ExpertTable
+
+
+def timed(func, repeats):
+    start = time.time()
+    for _ in xrange(repeats):
+        func()
+    return (time.time() - start) / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cwnds', type=int, nargs='+',
+                        default=[1000, 100000, 1000000],
+                        help='numbers of cwnds to label')
+    parser.add_argument('--target', type=float, default=40.0)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    actions = Sender.action_mapping
+
+    def loop(cwnds):
+        return [min(actions, key=lambda idx: action_error(
+            actions, idx, cwnd, args.target)) for cwnd in cwnds]
+
+    sys.stderr.write('%10s %12s %14s %12s\n' %
+                     ('cwnds', 'loop (ms)', 'vectorized', 'table (ms)'))
+
+    rng = np.random.RandomState(0)
+    for cnt in args.cwnds:
+        cwnds = rng.uniform(2, 10 * args.target, cnt)
+        table = ExpertTable(args.target)
+
+        # the loop takes seconds on large arrays; time a sample of them
+        sample = cwnds[:10000]
+        loop_ms = (1000 * timed(lambda: loop(sample), 1) *
+                   len(cwnds) / len(sample))
+        vector_ms = 1000 * timed(lambda: best_actions(cwnds, args.target),
+                                 args.repeats)
+        table_ms = 1000 * timed(lambda: table.labels(cwnds), args.repeats)
+
+        sys.stderr.write('%10d %12.1f %14.1f %12.1f\n' %
+                         (cnt, loop_ms, vector_ms, table_ms))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+"""Steps per second of FluidBatchEnv with random actions, by number of
+simulated links.
+"""
+
+import sys
+import time
+import argparse
+import numpy as np
+import project_root
+from os import path
+from env.sender import Sender
+from env.fluid_env import FluidBatchEnv
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num-envs', type=int, nargs='+',
+                        default=[1, 64, 1024, 4096],
+                        help='numbers of links to simulate')
+    parser.add_argument('--steps', type=int, default=1000,
+                        help='steps per measurement (default: 1000)')
+    args = parser.parse_args()
+
+    trace = path.join(project_root.DIR, 'env', '12mbps.trace')
+    rng = np.random.RandomState(0)
+
+    sys.stderr.write('%10s %14s %18s\n' %
+                     ('num_envs', 'steps/s', 'env steps/min'))
+    for num_envs in args.num_envs:
+        env = FluidBatchEnv([trace] * num_envs,
+                            rng.randint(5, 100, num_envs),
+                            queues=rng.randint(10, 1000, num_envs),
+                            max_steps=args.steps)
+        actions = rng.randint(Sender.action_cnt,
+                              size=(args.steps, num_envs))
+
+        env.reset()
+        start = time.time()
+        for step in xrange(args.steps):
+            env.step(actions[step])
+        elapsed = time.time() - start
+
+        sys.stderr.write('%10d %14.0f %18.3g\n' % (
+            num_envs, args.steps / elapsed,
+            60 * num_envs * args.steps / elapsed))
+
+
+if __name__ == '__main__':
+    main()
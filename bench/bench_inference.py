@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+"""Per-step latency of DaggerLSTM inference: a sess.run() of the
+TensorFlow graph, as run_sender.py did, against NumpyDaggerLSTM, for one
+flow and for batches of flows.
+"""
+
+import sys
+import time
+import argparse
+import numpy as np
+import tensorflow as tf
+import project_root
+from env.sender import Sender
+from helpers.features import STATE_SCALES
+from dagger.run_sender import Learner, NumpyLearner
+from dagger.numpy_model import DEFAULT_CHECKPOINT, DEFAULT_WEIGHTS
+
+
+def per_step_us(func, steps):
+    func()  # warm up
+    start = time.time()
+    for _ in xrange(steps):
+        func()
+    return 1e6 * (time.time() - start) / steps
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--steps', type=int, default=2000)
+    parser.add_argument('--flows', type=int, nargs='+', default=[1, 8, 64])
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    state = list(rng.uniform(0, 2, len(STATE_SCALES)) * STATE_SCALES)
+
+    sys.stderr.write('%8s %12s %12s %10s\n' %
+                     ('flows', 'tf (us)', 'numpy (us)', 'speedup'))
+
+    for flows in args.flows:
+        tf_learner = Learner(Sender.state_dim, Sender.action_cnt,
+                             DEFAULT_CHECKPOINT, flows)
+        np_learner = NumpyLearner(Sender.state_dim, Sender.action_cnt,
+                                  DEFAULT_WEIGHTS, flows)
+
+        if flows == 1:
+            tf_us = per_step_us(lambda: tf_learner.sample_action(state),
+                                args.steps)
+            np_us = per_step_us(lambda: np_learner.sample_action(state),
+                                args.steps)
+        else:
+            flow_ids = np.arange(flows)
+            states = [state] * flows
+            tf_us = per_step_us(
+                lambda: tf_learner.sample_actions(flow_ids, states),
+                args.steps)
+            np_us = per_step_us(
+                lambda: np_learner.sample_actions(flow_ids, states),
+                args.steps)
+
+        sys.stderr.write('%8d %12.1f %12.1f %9.1fx\n' %
+                         (flows, tf_us, np_us, tf_us / np_us))
+
+        tf_learner.sess.close()
+        tf.reset_default_graph()
+
+
+if __name__ == '__main__':
+    main()
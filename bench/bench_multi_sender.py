@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+"""Loopback scaling benchmark of MultiSender: many flows in one process with
+cross-flow batched inference, against a single MultiReceiver process.
+"""
+
+import sys
+import time
+import argparse
+import numpy as np
+from multiprocessing import Process
+import project_root
+from env.sender import Sender
+from env.multi_sender import MultiSender
+from env.multi_receiver import MultiReceiver
+from helpers.helpers import cpu_time
+
+
+def receiver(ports):
+    """Serves every sender port from one MultiReceiver."""
+    multi_receiver = MultiReceiver()
+    for port in ports:
+        multi_receiver.add_peer('127.0.0.1', port)
+    multi_receiver.run()
+
+
+def hold_cwnd():
+    for idx, (op, val) in Sender.action_mapping.iteritems():
+        if op == '+' and val == 0.0:
+            return idx
+
+
+def open_senders(num_flows):
+    """Senders on distinct ports. Sender sets SO_REUSEADDR, with which the
+    kernel may hand the same ephemeral UDP port to two sockets.
+    """
+    senders = {}
+    duplicates = []
+    while len(senders) < num_flows:
+        sender = Sender(0, wire_format='struct')
+        port = sender.sock.getsockname()[1]
+        if port in senders:
+            duplicates.append(sender)
+        else:
+            senders[port] = sender
+
+    for sender in duplicates:
+        sender.cleanup()
+    return senders.values()
+
+
+def run_once(num_flows, duration):
+    senders = open_senders(num_flows)
+    ports = [sender.sock.getsockname()[1] for sender in senders]
+
+    action = hold_cwnd()
+    start = [None]
+
+    def sample_actions(flow_ids, states):
+        if time.time() - start[0] > duration:
+            for sender in senders:
+                sender.running = False
+        return np.full(len(flow_ids), action)
+
+    multi_sender = MultiSender(senders, sample_actions)
+    proc = Process(target=receiver, args=(ports,))
+    proc.daemon = True
+    proc.start()
+
+    try:
+        multi_sender.handshake()
+
+        start[0] = time.time()
+        start_cpu = cpu_time()
+        multi_sender.run()
+        wall = time.time() - start[0]
+        cpu = cpu_time() - start_cpu
+    finally:
+        multi_sender.cleanup()
+        proc.terminate()
+
+    pkts = sum(sender.seq_num for sender in senders)
+    rows_per_call = float(multi_sender.batch_rows) / max(
+        1, multi_sender.batch_calls)
+    return (pkts / wall, cpu * 1e6 / pkts,
+            multi_sender.batch_calls / wall, rows_per_call)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--flows', default='1,10,100,300',
+                        help='comma-separated flow counts (default: 1,10,100,300)')
+    parser.add_argument('--duration', type=float, default=5.0,
+                        help='seconds per run (default: 5)')
+    args = parser.parse_args()
+
+    results = []
+    for num_flows in map(int, args.flows.split(',')):
+        results.append((num_flows, run_once(num_flows, args.duration)))
+
+    sys.stderr.write('\n%6s %12s %14s %14s %14s\n' % (
+        'flows', 'packets/s', 'CPU us/packet', 'forward/s', 'flows/forward'))
+    for num_flows, (pps, cpu_per_pkt, calls, rows) in results:
+        sys.stderr.write('%6d %12.0f %14.2f %14.0f %14.1f\n' % (
+            num_flows, pps, cpu_per_pkt, calls, rows))
+
+
+if __name__ == '__main__':
+    main()
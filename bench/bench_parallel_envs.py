@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+"""Episodes per hour of one worker against the number of environments it
+runs in parallel."""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+from os import path
+import project_root
+from env.environment import Environment
+from env.parallel_environment import ParallelEnvironment
+from env.sender import Sender
+
+
+def run_once(args, num_envs):
+    cmds = [args.mahimahi_cmd] * num_envs
+    if num_envs > 1:
+        env = ParallelEnvironment(cmds, persistent=True, emulate=args.emulate)
+        env.set_sample_actions(lambda env_ids, states: np.random.randint(
+            Sender.action_cnt, size=len(env_ids)))
+    else:
+        env = Environment(cmds[0], persistent=True, emulate=args.emulate)
+        env.set_sample_action(
+            lambda state: np.random.randint(Sender.action_cnt))
+
+    start = time.time()
+    try:
+        for _ in xrange(args.rounds):
+            env.reset()
+            env.rollout()
+    finally:
+        env.cleanup()
+
+    return 3600 * args.rounds * num_envs / (time.time() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num-envs', type=int, nargs='+',
+                        default=[1, 2, 4, 8, 16],
+                        help='numbers of environments to run in parallel')
+    parser.add_argument('--rounds', type=int, default=3,
+                        help='episodes per environment (default: 3)')
+    parser.add_argument('--steps', type=int, default=100,
+                        help='steps per episode (default: 100)')
+    parser.add_argument(
+        '--mahimahi-cmd', default='env',
+        help='command the receiver runs in, e.g. "mm-delay 20" '
+        '(default: "env" with MAHIMAHI_BASE=127.0.0.1, i.e. no emulation)')
+    parser.add_argument('--emulate', action='store_true',
+                        help='emulate --mahimahi-cmd in process instead')
+    args = parser.parse_args()
+
+    Sender.max_steps = args.steps
+
+    # the receiver is started with "python" from PATH
+    os.environ['PATH'] = '%s:%s' % (path.dirname(sys.executable),
+                                    os.environ['PATH'])
+    os.environ.setdefault('MAHIMAHI_BASE', '127.0.0.1')
+
+    results = [(num_envs, run_once(args, num_envs))
+               for num_envs in args.num_envs]
+
+    sys.stderr.write('\n%8s %16s %10s\n' % ('envs', 'episodes/hour',
+                                            'speedup'))
+    for num_envs, eps_per_hour in results:
+        sys.stderr.write('%8d %16.0f %10.2f\n' % (
+            num_envs, eps_per_hour, eps_per_hour / results[0][1]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+"""Loopback benchmark of Sender packet I/O: per-packet vs. batched syscalls
+on the poll and epoll event loops."""
+
+import os
+import sys
+import time
+import signal
+import argparse
+from os import path
+from subprocess import Popen
+import project_root
+from env.sender import Sender
+from helpers.helpers import get_open_udp_port, cpu_time
+
+
+def hold_cwnd():
+    """Returns the index of the action that keeps cwnd unchanged."""
+    for idx, (op, val) in Sender.action_mapping.iteritems():
+        if op == '+' and val == 0.0:
+            return idx
+
+
+def run_once(args, io_backend, batch_io):
+    port = get_open_udp_port()
+    sender = Sender(port, train=True, batch_io=batch_io,
+                    wire_format=args.wire_format, io_backend=io_backend)
+    sender.cwnd = float(args.cwnd)
+
+    action = hold_cwnd()
+    sender.set_sample_action(lambda state: action)
+
+    receiver_src = path.join(project_root.DIR, 'env', 'run_receiver.py')
+    receiver = Popen([sys.executable, receiver_src, '127.0.0.1', str(port),
+                      '--io-backend', args.receiver_io_backend],
+                     preexec_fn=os.setsid)
+
+    try:
+        sender.handshake()
+
+        start_wall = time.time()
+        start_cpu = cpu_time()
+        sender.run()
+        wall = time.time() - start_wall
+        cpu = cpu_time() - start_cpu
+    finally:
+        sender.cleanup()
+        os.killpg(os.getpgid(receiver.pid), signal.SIGTERM)
+        receiver.wait()
+
+    pkts = sender.seq_num
+    stats = sender.loop_stats.summary()
+    return (pkts / wall, cpu * 1e6 / pkts,
+            stats['wakeups_per_sec'], 100 * stats['idle_frac'])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--steps', type=int, default=300,
+                        help='steps per run (default: 300)')
+    parser.add_argument('--cwnd', type=int, default=100,
+                        help='fixed congestion window (default: 100)')
+    parser.add_argument('--wire-format', choices=['protobuf', 'struct'],
+                        default='protobuf',
+                        help='preferred wire format (default: protobuf)')
+    parser.add_argument('--receiver-io-backend', choices=['blocking', 'epoll'],
+                        default='blocking',
+                        help='receiver event loop backend (default: blocking)')
+    args = parser.parse_args()
+
+    Sender.max_steps = args.steps
+
+    results = []
+    for io_backend in ['poll', 'epoll']:
+        for batch_io in [False, True]:
+            mode = '%s/%s' % (io_backend, 'batch' if batch_io else 'single')
+            results.append((mode, run_once(args, io_backend, batch_io)))
+
+    sys.stderr.write('\n%-14s %12s %14s %12s %8s\n' % (
+        'mode', 'packets/s', 'CPU us/packet', 'wakeups/s', 'idle %'))
+    for mode, (pps, cpu_per_pkt, wakeups, idle) in results:
+        sys.stderr.write('%-14s %12.0f %14.2f %12.0f %8.1f\n' % (
+            mode, pps, cpu_per_pkt, wakeups, idle))
+
+
+if __name__ == '__main__':
+    main()
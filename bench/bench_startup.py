@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+"""Time to first packet of dagger/run_sender.py: from launching it to
+the first data datagram at a receiver that greets it every millisecond,
+with the TensorFlow and NumPy backends and as a client of a warm
+prefork_server.py. --output appends the results as a JSON line, to track
+them over time.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+import project_root
+from os import path
+from helpers.helpers import get_open_udp_port
+
+
+RUN_SENDER = path.join(project_root.DIR, 'dagger', 'run_sender.py')
+PREFORK_SERVER = path.join(project_root.DIR, 'dagger', 'prefork_server.py')
+
+
+def time_to_first_packet(args, timeout_s=120):
+    """Seconds from launching run_sender.py with args to its first data
+    datagram.
+    """
+    port = get_open_udp_port()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(0.001)
+
+    devnull = open(os.devnull, 'w')
+    start = time.time()
+    proc = subprocess.Popen([sys.executable, RUN_SENDER, str(port)] + args,
+                            stderr=devnull)
+    try:
+        greeted = False
+        while time.time() - start < timeout_s:
+            if not greeted:
+                sock.sendto('Hello from receiver', ('127.0.0.1', port))
+            try:
+                msg = sock.recv(1600)
+            except socket.timeout:
+                continue
+
+            if msg == 'Hello from sender':
+                greeted = True
+            elif greeted:
+                return time.time() - start
+
+        raise RuntimeError('no packet from run_sender.py %s' % ' '.join(args))
+    finally:
+        proc.terminate()
+        proc.wait()
+        devnull.close()
+        sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--modes', nargs='+',
+                        default=['tf', 'numpy', 'prefork'],
+                        choices=['tf', 'numpy', 'prefork'])
+    parser.add_argument('--output', metavar='PATH',
+                        help='append the median times as a JSON line')
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    socket_path = path.join(tmp_dir, 'prefork.sock')
+    server = None
+
+    results = {}
+    try:
+        for mode in args.modes:
+            if mode == 'prefork':
+                server = subprocess.Popen(
+                    [sys.executable, PREFORK_SERVER, socket_path],
+                    stderr=open(os.devnull, 'w'))
+                while not path.exists(socket_path):
+                    time.sleep(0.01)
+                sender_args = ['--server', socket_path]
+            else:
+                sender_args = ['--backend', mode]
+
+            times = [time_to_first_packet(sender_args)
+                     for _ in xrange(args.repeats)]
+            results[mode] = 1000 * np.median(times)
+            sys.stderr.write('%-8s median %8.1f ms  min %8.1f ms\n' % (
+                mode, results[mode], 1000 * min(times)))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        if path.exists(socket_path):
+            os.remove(socket_path)
+        os.rmdir(tmp_dir)
+
+    if args.output:
+        with open(args.output, 'a') as output:
+            output.write(json.dumps({
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'repeats': args.repeats,
+                'time_to_first_packet_ms': results}) + '\n')
+
+
+if __name__ == '__main__':
+    main()
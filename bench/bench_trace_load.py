@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+"""Time to load a constant-rate trace: parsing its text, as every worker
+did, against memory-mapping it from the trace cache.
+"""
+
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+import project_root
+from os import path
+from helpers.traces import generate, write_trace
+from helpers.trace_cache import TraceCache, load_text_trace
+
+
+def timed(func, repeats):
+    start = time.time()
+    for _ in xrange(repeats):
+        func()
+    return (time.time() - start) / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bandwidth', type=float, nargs='+',
+                        default=[12, 100, 200], help='trace bandwidths')
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        sys.stderr.write('%10s %12s %14s %14s\n' %
+                         ('Mbps', 'text (ms)', 'first open', 'cached (ms)'))
+
+        for mbps in args.bandwidth:
+            text_path = path.join(tmp_dir, '%smbps.trace' % mbps)
+            write_trace(text_path, generate('constant', bandwidth=mbps))
+
+            text_ms = 1000 * timed(lambda: load_text_trace(text_path),
+                                   args.repeats)
+            # converting once, then mapping in every new process
+            first_ms = 1000 * timed(
+                lambda: TraceCache(path.join(tmp_dir, 'cache')).open(
+                    text_path), 1)
+            mmap_ms = 1000 * timed(
+                lambda: np.sum(TraceCache(path.join(tmp_dir, 'cache')).open(
+                    text_path)[0][-1]), args.repeats)
+
+            sys.stderr.write('%10s %12.1f %14.1f %14.1f\n' %
+                             (mbps, text_ms, first_ms, mmap_ms))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+"""Microbenchmark of per-packet serialize/parse cost: protobuf vs. struct."""
+
+import sys
+import time
+import argparse
+import project_root
+from env import datagram_pb2, wire
+
+
+PAYLOAD = 'x' * 1400
+
+
+def protobuf_serialize(i):
+    data = datagram_pb2.Data()
+    data.seq_num = i
+    data.send_ts = i
+    data.sent_bytes = i * 1400
+    data.delivered_time = i
+    data.delivered = i * 1400
+    data.payload = PAYLOAD
+    return data.SerializeToString()
+
+
+def protobuf_construct_ack(serialized_data):
+    data = datagram_pb2.Data()
+    data.ParseFromString(serialized_data)
+
+    ack = datagram_pb2.Ack()
+    ack.seq_num = data.seq_num
+    ack.send_ts = data.send_ts
+    ack.sent_bytes = data.sent_bytes
+    ack.delivered_time = data.delivered_time
+    ack.delivered = data.delivered
+    ack.ack_bytes = len(serialized_data)
+    return ack.SerializeToString()
+
+
+def protobuf_parse_ack(serialized_ack):
+    ack = datagram_pb2.Ack()
+    ack.ParseFromString(serialized_ack)
+    return ack
+
+
+def time_per_call(func, args):
+    start = time.time()
+    for arg in args:
+        func(arg)
+    return (time.time() - start) * 1e6 / len(args)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=100000,
+                        help='packets per measurement (default: 100000)')
+    args = parser.parse_args()
+
+    seqs = range(1, args.n + 1)
+    writer = wire.DataWriter(PAYLOAD)
+    struct_serialize = lambda i: writer.pack(i, i, i * 1400, i, i * 1400)
+
+    results = []
+    for name, serialize, construct_ack, parse_ack in [
+            ('protobuf', protobuf_serialize,
+             protobuf_construct_ack, protobuf_parse_ack),
+            ('struct', struct_serialize,
+             wire.construct_ack, wire.parse_ack)]:
+        data = [str(serialize(i)) for i in seqs]
+        acks = [construct_ack(d) for d in data]
+
+        results.append((name,
+                        time_per_call(serialize, seqs),
+                        time_per_call(construct_ack, data),
+                        time_per_call(parse_ack, acks)))
+
+    sys.stderr.write('%-10s %14s %14s %14s  (us/packet)\n' %
+                     ('format', 'serialize', 'construct_ack', 'parse_ack'))
+    for name, ser, ack, parse in results:
+        sys.stderr.write('%-10s %14.2f %14.2f %14.2f\n' %
+                         (name, ser, ack, parse))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+"""The best cwnd of a scenario, for TrueDaggerExpert: the fixed cwnd that
+maximizes Sender.compute_performance(), 10 * throughput - p95 RTT.
+
+best_cwnds.yml holds a grid of constant-rate scenarios, {bandwidth
+(Mbps): {one-way delay (ms): cwnd}}, and under 'scenarios' the best cwnd
+of other mahimahi commands, with traces by file name. BestCwndTable
+interpolates the grid for unseen points; sweeping fixed-cwnd policies
+over a scenario, as main() does, finds and records its best cwnd.
+"""
+
+import sys
+import shlex
+import argparse
+import multiprocessing
+import numpy as np
+import yaml
+import project_root
+from os import path
+from env.sender import Sender
+from env.environment import Environment
+from env.emulator import parse_mahimahi_cmd, open_trace
+from env.fluid_env import FluidBatchEnv
+from helpers.helpers import apply_op
+from helpers.traces import PACKETS_PER_MS_PER_MBPS
+from helpers.trace_cache import TraceCache
+
+
+DEFAULT_TABLE = path.join(project_root.DIR, 'dagger', 'best_cwnds.yml')
+BACKENDS = ['fluid', 'emulator', 'mahimahi']
+
+# the action that keeps the cwnd as it is
+HOLD = [idx for idx, (op, val) in Sender.action_mapping.iteritems()
+        if apply_op(op, 1.0, val) == 1.0][0]
+
+
+def bdp_packets(bandwidth, delay):
+    """Packets in flight at bandwidth (Mbps) over a one-way delay (ms)."""
+    return bandwidth * PACKETS_PER_MS_PER_MBPS * 2 * delay
+
+
+def scenario_key(mahimahi_cmd):
+    """mahimahi_cmd with traces by file name, the same on every host."""
+    return ' '.join(path.basename(token) if '/' in token else token
+                    for token in shlex.split(mahimahi_cmd))
+
+
+def link_of(mahimahi_cmd):
+    """(mean downlink bandwidth in Mbps, total one-way delay in ms)."""
+    delay = 0.0
+    bandwidth = None
+
+    for shell in parse_mahimahi_cmd(mahimahi_cmd):
+        if shell[0] == 'delay':
+            delay += shell[1]
+        elif shell[0] == 'link':
+            trace = open_trace(shell[2])[0]
+            bandwidth = len(trace) / (PACKETS_PER_MS_PER_MBPS * trace[-1])
+
+    if bandwidth is None:
+        raise ValueError('no mm-link: %s' % mahimahi_cmd)
+    return bandwidth, delay
+
+
+class BestCwndTable(object):
+    """The best cwnds of best_cwnds.yml, looked up or interpolated."""
+
+    def __init__(self, table_path=DEFAULT_TABLE):
+        self.table_path = table_path
+
+        table = {}
+        if path.exists(table_path):
+            with open(table_path) as table_file:
+                table = yaml.safe_load(table_file) or {}
+
+        self.scenarios = table.pop('scenarios', None) or {}
+        self.grid = table
+
+    def save(self):
+        table = dict(self.grid)
+        if self.scenarios:
+            table['scenarios'] = self.scenarios
+
+        with open(self.table_path, 'w') as table_file:
+            # scenario keys are long; keep each on one line
+            yaml.safe_dump(table, table_file, default_flow_style=False,
+                           width=1000)
+
+    def add(self, bandwidth, delay, cwnd):
+        self.grid.setdefault(bandwidth, {})[delay] = int(cwnd)
+
+    def add_scenario(self, mahimahi_cmd, cwnd):
+        self.scenarios[scenario_key(mahimahi_cmd)] = int(cwnd)
+
+    def lookup(self, bandwidth, delay):
+        """Best cwnd at bandwidth (Mbps) and one-way delay (ms).
+
+        Between grid points, the cwnd is interpolated bilinearly, which
+        is exact for the BDP, bandwidth * delay. Beyond the grid, it is
+        scaled by the BDP from the nearest edge.
+        """
+        if bandwidth in self.grid and delay in self.grid[bandwidth]:
+            return self.grid[bandwidth][delay]
+        if not self.grid:
+            raise ValueError('no best cwnds in %s' % self.table_path)
+
+        def along_delay(row):
+            delays = sorted(row)
+            cwnds = [row[d] for d in delays]
+            if delay > delays[-1]:
+                return cwnds[-1] * float(delay) / delays[-1]
+            return np.interp(delay, delays, cwnds)
+
+        bandwidths = sorted(self.grid)
+        cwnds = [along_delay(self.grid[b]) for b in bandwidths]
+
+        if bandwidth > bandwidths[-1]:
+            cwnd = cwnds[-1] * float(bandwidth) / bandwidths[-1]
+        elif bandwidth < bandwidths[0]:
+            cwnd = cwnds[0] * float(bandwidth) / bandwidths[0]
+        else:
+            cwnd = np.interp(bandwidth, bandwidths, cwnds)
+
+        return max(2, int(round(cwnd)))
+
+    def for_cmd(self, mahimahi_cmd):
+        """Best cwnd of a mahimahi command: its own if it has one, else
+        the grid's at the mean rate of its trace and its delay.
+        """
+        key = scenario_key(mahimahi_cmd)
+        if key in self.scenarios:
+            return self.scenarios[key]
+        return self.lookup(*link_of(mahimahi_cmd))
+
+
+def run_fixed_cwnd(job):
+    """Performance of an episode of mahimahi_cmd at a fixed cwnd, in an
+    Environment emulated in process or in mahimahi.
+    """
+    mahimahi_cmd, cwnd, backend = job
+
+    env = Environment(mahimahi_cmd, emulate=(backend == 'emulator'))
+    env.set_sample_action(lambda state: HOLD)
+    try:
+        env.reset()
+        env.sender.cwnd = float(cwnd)
+        return env.rollout()
+    finally:
+        env.cleanup()
+
+
+def evaluate(mahimahi_cmd, cwnds, backend='fluid', pool=None):
+    """Performance of every fixed cwnd of cwnds on mahimahi_cmd. The fluid
+    model runs them all in one batch; the other backends run one episode
+    per cwnd, in pool if given.
+    """
+    if backend == 'fluid':
+        env = FluidBatchEnv.from_mahimahi_cmds([mahimahi_cmd] * len(cwnds))
+        env.reset()
+        env.cwnd[:] = cwnds
+        actions = np.full(len(cwnds), HOLD)
+
+        done = False
+        while not done:
+            _, rewards, done = env.step(actions)
+        return rewards
+
+    jobs = [(mahimahi_cmd, cwnd, backend) for cwnd in cwnds]
+    return np.array((pool.map if pool else map)(run_fixed_cwnd, jobs))
+
+
+def sweep(mahimahi_cmd, backend='fluid', pool=None, points=16):
+    """Finds the best fixed cwnd of mahimahi_cmd: a coarse pass from 1/4
+    to 8 times the BDP, then a fine pass between the neighbors of the
+    best. Returns the best cwnd and its performance.
+    """
+    bdp = bdp_packets(*link_of(mahimahi_cmd))
+    cwnds = np.unique(np.maximum(
+        2, np.round(bdp * np.geomspace(0.25, 8, points)))).astype(int)
+
+    for fine in [False, True]:
+        scores = evaluate(mahimahi_cmd, cwnds, backend, pool)
+        best = int(np.argmax(scores))
+        if fine:
+            break
+
+        lo = cwnds[max(0, best - 1)]
+        hi = cwnds[min(len(cwnds) - 1, best + 1)]
+        cwnds = np.unique(np.round(np.linspace(lo, hi, points))).astype(int)
+
+    return int(cwnds[best]), float(scores[best])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--bandwidth', metavar='Mbps', type=int, nargs='*',
+                        default=[], help='grid bandwidths, with --delay')
+    parser.add_argument('--delay', metavar='MS', type=int, nargs='*',
+                        default=[], help='grid one-way delays')
+    parser.add_argument('--mahimahi-cmd', metavar='CMD', action='append',
+                        default=[], help='other scenario, e.g. "mm-delay '
+                        '28 mm-link a.trace a.trace"')
+    parser.add_argument('--backend', choices=BACKENDS, default='fluid',
+                        help='fluid model, in-process emulator or '
+                        'mahimahi (default: fluid)')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='worker processes of the emulator and '
+                        'mahimahi backends (default: one per CPU)')
+    parser.add_argument('--table', default=DEFAULT_TABLE,
+                        help='table to update (default: %s)' % DEFAULT_TABLE)
+    parser.add_argument('--dry-run', action='store_true',
+                        help='print the best cwnds without saving them')
+    args = parser.parse_args()
+
+    table = BestCwndTable(args.table)
+    trace_cache = TraceCache()
+
+    scenarios = []
+    for bandwidth in args.bandwidth:
+        trace = trace_cache.generated_text(model='constant',
+                                           bandwidth=bandwidth)
+        for delay in args.delay:
+            scenarios.append(((bandwidth, delay),
+                              'mm-delay %d mm-link %s %s' %
+                              (delay, trace, trace)))
+    scenarios += [(None, cmd) for cmd in args.mahimahi_cmd]
+    if not scenarios:
+        parser.error('no scenarios: give --bandwidth and --delay, or '
+                     '--mahimahi-cmd')
+
+    pool = None
+    if args.backend != 'fluid':
+        pool = multiprocessing.Pool(args.jobs)
+
+    try:
+        for point, mahimahi_cmd in scenarios:
+            cwnd, score = sweep(mahimahi_cmd, args.backend, pool)
+            sys.stderr.write('%s: best cwnd %d (performance %.2f)\n' % (
+                point or scenario_key(mahimahi_cmd), cwnd, score))
+
+            if point is not None:
+                table.add(point[0], point[1], cwnd)
+            else:
+                table.add_scenario(mahimahi_cmd, cwnd)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    if not args.dry_run:
+        table.save()
+
+
+if __name__ == '__main__':
+    main()
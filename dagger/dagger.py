@@ -22,6 +22,7 @@ import datetime
 from tensorflow import contrib
 from os import path
 from models import DaggerLSTM
+from numpy_model import export_weights
 from experts import TrueDaggerExpert
 from env.sender import Sender
 from helpers.helpers import (
@@ -37,11 +38,12 @@ class Status:
 
 
 class DaggerLeader(object):
-    def __init__(self, cluster, server, worker_tasks):
+    def __init__(self, cluster, server, worker_tasks, envs_per_worker=1):
         self.cluster = cluster
         self.server = server
         self.worker_tasks = worker_tasks
         self.num_workers = len(worker_tasks)
+        self.envs_per_worker = envs_per_worker
         self.aggregated_states = []
         self.aggregated_actions = []
         self.max_eps = 1000
@@ -77,8 +79,8 @@ class DaggerLeader(object):
 
         # Each element is [[aug_state]], [action]
         self.train_q = tf.FIFOQueue(
-                self.num_workers, [tf.float32, tf.int32],
-                shared_name='training_feed')
+                self.num_workers * self.envs_per_worker,
+                [tf.float32, tf.int32], shared_name='training_feed')
 
         # Keys: worker indices, values: Tensorflow messaging queues
         # Queue Elements: Status message
@@ -112,6 +114,9 @@ class DaggerLeader(object):
         saver.save(self.sess, model_path)
         sys.stderr.write('\nModel saved to param. server at %s\n' % model_path)
 
+        # and the weights for NumpyDaggerLSTM, which checks they match
+        export_weights(model_path, model_path + '.npz')
+
     def setup_tf_ops(self, server):
         """ Sets up Tensorboard operators and tools, such as the optimizer,
         summary values, Tensorboard, and Session.
@@ -325,13 +330,17 @@ class DaggerWorker(object):
         self.action_buf = []
         self.state_dim = env.state_dim
         self.action_cnt = env.action_cnt
+        self.num_envs = env.num_envs
 
         self.aug_state_dim = self.state_dim + self.action_cnt
         self.prev_action = self.action_cnt - 1
 
         self.expert = TrueDaggerExpert(env)
         # Must call env.set_sample_action() before env.rollout()
-        env.set_sample_action(self.sample_action)
+        if self.num_envs > 1:
+            env.set_sample_actions(self.sample_actions)
+        else:
+            env.set_sample_action(self.sample_action)
 
         # Set up Tensorflow for synchronization, training
         self.setup_tf_ops()
@@ -364,7 +373,7 @@ class DaggerWorker(object):
 
         # Build shared queues for training data and synchronization
         self.train_q = tf.FIFOQueue(
-                self.num_workers, [tf.float32, tf.int32],
+                self.num_workers * self.num_envs, [tf.float32, tf.int32],
                 shared_name='training_feed')
 
         self.sync_q = tf.FIFOQueue(3, [tf.int16],
@@ -377,6 +386,13 @@ class DaggerWorker(object):
         self.enqueue_train_op = self.train_q.enqueue(
                 [self.state_data, self.action_data])
 
+        # One sequence per environment of a ParallelEnvironment
+        self.state_batch = tf.placeholder(
+                tf.float32, shape=(None, None, self.aug_state_dim))
+        self.action_batch = tf.placeholder(tf.int32, shape=(None, None))
+        self.enqueue_many_train_op = self.train_q.enqueue_many(
+                [self.state_batch, self.action_batch])
+
         # Sync local network to global network (CPU)
         local_vars = self.local_network.trainable_vars
         global_vars = self.global_network_cpu.trainable_vars
@@ -424,6 +440,52 @@ class DaggerWorker(object):
 
         return action
 
+    def sample_actions(self, env_ids, states):
+        """ Batched sample_action() for the environments of a
+        ParallelEnvironment: one forward pass for all of the states, with
+        separate buffers, previous actions and LSTM states per environment.
+        """
+        rows = np.asarray(env_ids)
+
+        # the expert labels every environment's cwnd at once
+        expert_actions = self.expert.sample_actions(
+            [state[self.state_dim - 1] for state in states]).tolist()
+
+        aug_states = []
+        for env_id, state, expert_action in zip(env_ids, states,
+                                                expert_actions):
+            norm_state = normalize(state)
+            one_hot_action = one_hot(self.prev_actions[env_id],
+                                     self.action_cnt)
+            aug_state = norm_state + one_hot_action
+
+            self.state_bufs[env_id].append(aug_state)
+            self.action_bufs[env_id].append(expert_action)
+
+            aug_states.append([aug_state])
+
+        # Always use the expert on the first episode to get our bearings.
+        if self.curr_ep == 0:
+            self.prev_actions[rows] = expert_actions
+            return expert_actions
+
+        pi = self.local_network
+        feed_dict = {
+            pi.input: aug_states,
+            pi.state_in: [(c[rows], h[rows]) for c, h in self.lstm_states],
+        }
+        ops_to_run = [pi.action_probs, pi.state_out]
+        action_probs, state_out = self.sess.run(ops_to_run, feed_dict)
+
+        # scatter the new LSTM states back to their environments
+        for (c, h), (c_out, h_out) in zip(self.lstm_states, state_out):
+            c[rows] = c_out
+            h[rows] = h_out
+
+        actions = np.argmax(action_probs[:, 0, :], axis=1)
+        self.prev_actions[rows] = actions
+        return actions
+
     def rollout(self):
         """ Start an episode/flow with an empty dataset/environment. """
         self.state_buf = []
@@ -431,9 +493,33 @@ class DaggerWorker(object):
         self.prev_action = self.action_cnt - 1
         self.lstm_state = self.init_state
 
+        if self.num_envs > 1:
+            self.state_bufs = [[] for _ in xrange(self.num_envs)]
+            self.action_bufs = [[] for _ in xrange(self.num_envs)]
+            self.prev_actions = np.full(
+                self.num_envs, self.action_cnt - 1, np.int32)
+            self.lstm_states = self.local_network.zero_init_state(
+                self.num_envs)
+
         self.env.reset()
         self.env.rollout()
 
+    def enqueue_rollout(self):
+        """ Enqueues the episode, or the episodes of all environments in
+        one go, as sequences of [aug_state] and action.
+        """
+        if self.num_envs == 1:
+            self.sess.run(self.enqueue_train_op, feed_dict={
+                self.state_data: self.state_buf,
+                self.action_data: self.action_buf})
+            return
+
+        # sequences are batched by the leader, so cut them to one length
+        seq_len = min(len(buf) for buf in self.state_bufs)
+        self.sess.run(self.enqueue_many_train_op, feed_dict={
+            self.state_batch: [buf[:seq_len] for buf in self.state_bufs],
+            self.action_batch: [buf[:seq_len] for buf in self.action_bufs]})
+
     def run(self, debug=False):
         """Runs for max_ep episodes, each time sending data to the leader."""
 
@@ -461,9 +547,7 @@ class DaggerWorker(object):
                     (self.task_idx, self.curr_ep, queue_size))
 
             # Enqueue a sequence of data into the training queue.
-            self.sess.run(self.enqueue_train_op, feed_dict={
-                self.state_data: self.state_buf,
-                self.action_data: self.action_buf})
+            self.enqueue_rollout()
             self.sess.run(self.sync_q.enqueue(Status.EP_DONE))
 
             if debug:
@@ -13,8 +13,11 @@
 #     limitations under the License.
 
 
+import numpy as np
 from env.sender import Sender
+from env.fluid_env import affine_actions
 from helpers.helpers import apply_op
+from helpers.features import FIELD_SCALES
 
 
 def action_error(actions, idx, cwnd, target):
@@ -27,12 +30,80 @@ def action_error(actions, idx, cwnd, target):
     return abs(apply_op(op, cwnd, val) - target)
 
 
+def best_actions(cwnds, targets, actions=Sender.action_mapping):
+    """ Vectorized get_best_action(): the best action for every cwnd of
+    cwnds, towards the matching target of targets (or one target for all).
+    Ties go to the lowest action index, as with min().
+    """
+    scale, shift = affine_actions(actions)
+    cwnds = np.asarray(cwnds, dtype=np.float64)
+    targets = np.asarray(targets, dtype=np.float64)
+
+    results = cwnds[..., np.newaxis] * scale + shift
+    return np.argmin(np.abs(results - targets[..., np.newaxis]), axis=-1)
+
+
 def get_best_action(actions, cwnd, target):
     """ Returns the best action by finding the action that leads to the
     closest resulting cwnd to target.
     """
-    return min(actions,
-               key=lambda idx: action_error(actions, idx, cwnd, target))
+    return int(best_actions(cwnd, target, actions))
+
+
+class ExpertTable(object):
+    """ The best action of every cwnd for one target, precomputed.
+
+    The error of each action is piecewise linear in cwnd, so the best
+    action only changes where two errors cross or one kinks. Between those
+    breakpoints it is constant: labels() looks cwnds up in the intervals
+    with one searchsorted, and computes cwnds at a breakpoint directly.
+    """
+
+    def __init__(self, target, actions=Sender.action_mapping):
+        self.target = float(target)
+        self.actions = actions
+        scale, shift = affine_actions(actions)
+
+        # |s_i c + h_i - t| == |s_j c + h_j - t|, or s_i c + h_i == t
+        points = list((self.target - shift) / scale)
+        for i in xrange(len(scale)):
+            for j in xrange(i + 1, len(scale)):
+                for ds, dh in [(scale[i] - scale[j], shift[j] - shift[i]),
+                               (scale[i] + scale[j],
+                                2 * self.target - shift[i] - shift[j])]:
+                    if ds != 0:
+                        points.append(dh / ds)
+
+        self.breakpoints = np.unique(np.array(points))
+
+        # one cwnd inside each interval, including both unbounded ones
+        bounds = np.concatenate([[self.breakpoints[0] - 1.0],
+                                 self.breakpoints,
+                                 [self.breakpoints[-1] + 1.0]])
+        self.interval_labels = best_actions(
+            (bounds[:-1] + bounds[1:]) / 2, self.target, actions)
+
+    def labels(self, cwnds):
+        cwnds = np.asarray(cwnds, dtype=np.float64)
+        idx = np.searchsorted(self.breakpoints, cwnds, side='left')
+        labels = self.interval_labels[idx]
+
+        # ties at a breakpoint go to the lowest action index
+        at = self.breakpoints[np.minimum(idx, len(self.breakpoints) - 1)]
+        on_point = at == cwnds
+        if np.any(on_point):
+            labels = np.where(on_point, best_actions(
+                cwnds, self.target, self.actions), labels)
+        return labels
+
+
+def relabel(aug_states, best_cwnd, state_dim=Sender.state_dim):
+    """ Expert actions of a dataset of augmented states, as DaggerWorker
+    builds them, for a new best_cwnd, without a rollout.
+    """
+    aug_states = np.asarray(aug_states)
+    cwnds = aug_states[..., state_dim - 1] * FIELD_SCALES['cwnd']
+    return ExpertTable(best_cwnd).labels(cwnds)
 
 
 class NaiveDaggerExpert(object):
@@ -64,9 +135,12 @@ class TrueDaggerExpert(object):
                                            'given a best cwnd when creating '
                                            'the environment in worker.py.')
         self.best_cwnd = env.best_cwnd
+        self.table = ExpertTable(self.best_cwnd)
 
     def sample_action(self, cwnd):
         # Gets the action that gives the resulting cwnd closest to the
         # best cwnd.
-        action = get_best_action(Sender.action_mapping, cwnd, self.best_cwnd)
-        return action
+        return int(self.table.labels(cwnd))
+
+    def sample_actions(self, cwnds):
+        return self.table.labels(cwnds)
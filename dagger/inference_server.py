@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+"""One policy for every sender on a host: the server loads the DaggerLSTM
+or ActorCriticLSTM model once and samples actions for many senders over a
+Unix socket, keeping the LSTM state of each flow by its flow id.
+
+Requests that arrive close together run as one batch: a batch runs once
+every connected flow has a request in it, it is full, or its oldest
+request has waited the latency budget.
+
+Each connection is a SOCK_SEQPACKET socket. The client sends its flow id
+and the server answers 'OK <state dim>' or 'ERR <reason>'. Then the
+client sends one state per step, as little-endian float32, and receives
+the action as one byte.
+"""
+
+import os
+import sys
+import time
+import errno
+import struct
+import select
+import signal
+import socket
+import argparse
+import numpy as np
+import project_root
+from os import path
+
+
+ACTION = struct.Struct('<B')
+
+
+class InferenceClient(object):
+    """A flow of an InferenceServer. sample_action() is what
+    Sender.set_sample_action() takes.
+    """
+
+    def __init__(self, socket_path, flow_id):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self.sock.connect(socket_path)
+        self.sock.send(str(flow_id))
+
+        reply = self.sock.recv(256).split()
+        if not reply or reply[0] != 'OK':
+            self.sock.close()
+            raise ValueError('%s refused flow %s: %s' % (
+                socket_path, flow_id, ' '.join(reply[1:]) or 'closed'))
+
+        self.request = struct.Struct('<%df' % int(reply[1]))
+
+    def sample_action(self, state):
+        self.sock.send(self.request.pack(*state))
+        reply = self.sock.recv(ACTION.size)
+        if not reply:
+            raise IOError('inference server closed the connection')
+        return ACTION.unpack(reply)[0]
+
+    def close(self):
+        self.sock.close()
+
+
+class Flow(object):
+    def __init__(self, sock):
+        self.sock = sock
+        self.flow_id = None
+        self.row = None  # of the learner's per-flow LSTM states
+        self.state = None  # pending request
+        self.arrival = None  # of the pending request
+
+
+class InferenceServer(object):
+    """Serves learner.sample_actions() to at most max_flows flows at a
+    time. learner has a row of LSTM state per flow, as run_sender.py's
+    learners do with num_flows=max_flows, and reset_flows().
+    """
+
+    def __init__(self, socket_path, learner, state_dim, max_flows,
+                 latency_budget_ms=1.0, max_batch=None):
+        self.socket_path = socket_path
+        self.learner = learner
+        self.state_dim = state_dim
+        self.latency_budget = latency_budget_ms / 1000.0
+        self.max_batch = max_batch or max_flows
+
+        self.free_rows = range(max_flows - 1, -1, -1)
+        self.flows = {}  # fd -> Flow
+        self.flow_ids = set()
+        self.pending = []  # Flows with a request, oldest first
+
+        # batch sizes
+        self.batch_calls = 0
+        self.batch_rows = 0
+
+        if path.exists(socket_path):
+            os.remove(socket_path)
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self.listener.bind(socket_path)
+        self.listener.listen(128)
+        self.listener.setblocking(0)
+
+        self.poller = select.epoll()
+        self.poller.register(self.listener, select.EPOLLIN)
+        self.running = True
+
+    def cleanup(self):
+        for flow in self.flows.values():
+            flow.sock.close()
+        self.poller.close()
+        self.listener.close()
+        if path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    def accept(self):
+        try:
+            sock, _ = self.listener.accept()
+        except socket.error as e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return
+            raise
+
+        self.flows[sock.fileno()] = Flow(sock)
+        self.poller.register(sock, select.EPOLLIN)
+
+    def close(self, flow):
+        self.poller.unregister(flow.sock)
+        del self.flows[flow.sock.fileno()]
+        flow.sock.close()
+
+        if flow.row is not None:
+            self.flow_ids.discard(flow.flow_id)
+            self.free_rows.append(flow.row)
+        if flow.state is not None:
+            self.pending.remove(flow)
+
+    def hello(self, flow, msg):
+        if msg in self.flow_ids:
+            reply = 'ERR flow %s exists' % msg
+        elif not self.free_rows:
+            reply = 'ERR no room for more flows'
+        else:
+            flow.flow_id = msg
+            flow.row = self.free_rows.pop()
+            self.flow_ids.add(msg)
+            self.learner.reset_flows([flow.row])
+            reply = 'OK %d' % self.state_dim
+
+        flow.sock.send(reply)
+        if flow.row is None:
+            self.close(flow)
+
+    def receive(self, flow):
+        try:
+            msg = flow.sock.recv(4096)
+        except socket.error:
+            msg = ''
+        if not msg:
+            self.close(flow)
+            return
+
+        if flow.row is None:
+            self.hello(flow, msg)
+            return
+
+        if len(msg) != 4 * self.state_dim or flow.state is not None:
+            # not a state, or a second request before the answer
+            self.close(flow)
+            return
+
+        flow.state = np.frombuffer(msg, dtype='<f4')
+        flow.arrival = time.time()
+        self.pending.append(flow)
+
+    def batch_due(self):
+        if not self.pending:
+            return False
+        return (len(self.pending) >= self.max_batch or
+                len(self.pending) == len(self.flow_ids) or
+                time.time() - self.pending[0].arrival >=
+                self.latency_budget)
+
+    def run_batch(self):
+        batch = self.pending[:self.max_batch]
+        self.pending = self.pending[self.max_batch:]
+
+        actions = self.learner.sample_actions(
+            [flow.row for flow in batch], [flow.state for flow in batch])
+        self.batch_calls += 1
+        self.batch_rows += len(batch)
+
+        for flow, action in zip(batch, actions):
+            flow.state = None
+            try:
+                flow.sock.send(ACTION.pack(action))
+            except socket.error:
+                self.close(flow)
+
+    def run(self):
+        while self.running:
+            timeout = -1
+            if self.pending:
+                # the oldest request is due first
+                timeout = max(0.0, self.pending[0].arrival +
+                              self.latency_budget - time.time())
+
+            for fd, flag in self.poller.poll(timeout):
+                if fd == self.listener.fileno():
+                    self.accept()
+                elif fd in self.flows:
+                    flow = self.flows[fd]
+                    if flag & (select.EPOLLERR | select.EPOLLHUP):
+                        self.close(flow)
+                    else:
+                        self.receive(flow)
+
+            while self.batch_due():
+                self.run_batch()
+
+
+def create_learner(model, backend, max_flows):
+    """The learner of model, 'dagger' or 'a3c', and its state dimension."""
+    from env.sender import Sender
+
+    if model == 'a3c':
+        from a3c.run_sender import Learner
+        learner = Learner(
+            state_dim=Sender.state_dim,
+            action_cnt=Sender.action_cnt,
+            restore_vars=path.join(project_root.DIR, 'a3c', 'logs', 'model'),
+            num_flows=max_flows)
+    else:
+        from run_sender import create_learner as create_dagger_learner
+        learner = create_dagger_learner(backend, num_flows=max_flows)
+
+    return learner, Sender.state_dim
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='sample actions for many senders from one model')
+    parser.add_argument('socket', help='Unix socket to listen on')
+    parser.add_argument('--model', choices=['dagger', 'a3c'],
+                        default='dagger', help='DaggerLSTM or '
+                        'ActorCriticLSTM (default: dagger)')
+    parser.add_argument('--backend', choices=['tf', 'numpy'],
+                        default='numpy',
+                        help='run DaggerLSTM in TensorFlow, or in NumPy from '
+                        'dagger/model/model.npz (default: numpy)')
+    parser.add_argument('--max-flows', type=int, default=256,
+                        help='flows served at a time (default: 256)')
+    parser.add_argument('--latency-budget-ms', type=float, default=1.0,
+                        help='longest a request waits for a batch to fill '
+                        '(default: 1)')
+    parser.add_argument('--max-batch', type=int,
+                        help='largest batch (default: --max-flows)')
+    args = parser.parse_args()
+
+    learner, state_dim = create_learner(args.model, args.backend,
+                                        args.max_flows)
+    server = InferenceServer(args.socket, learner, state_dim, args.max_flows,
+                             args.latency_budget_ms, args.max_batch)
+    sys.stderr.write('[inference] Serving %s on %s\n' %
+                     (args.model, args.socket))
+
+    # clean up the socket when terminated, too
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    try:
+        server.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if server.batch_calls > 0:
+            sys.stderr.write('[inference] %.1f flows per batch\n' %
+                             (float(server.batch_rows) / server.batch_calls))
+        server.cleanup()
+
+
+if __name__ == '__main__':
+    main()
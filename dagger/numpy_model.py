@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+"""DaggerLSTM inference in NumPy, from weights exported to an .npz file.
+
+One step of a one-layer BasicLSTMCell and the linear layer is a handful
+of small matrix products, far cheaper than a sess.run(). Only exporting
+the weights of a checkpoint, as main() does, needs TensorFlow.
+
+The .npz records a digest of the checkpoint it was exported from. Weights
+at <prefix>.npz next to a checkpoint <prefix> that has changed since are
+refused, rather than silently serving the old model.
+"""
+
+import sys
+import glob
+import hashlib
+import argparse
+import numpy as np
+import project_root
+from os import path
+
+
+DEFAULT_CHECKPOINT = path.join(project_root.DIR, 'dagger', 'model', 'model')
+DEFAULT_WEIGHTS = path.join(project_root.DIR, 'dagger', 'model', 'model.npz')
+
+# checkpoint variables by the suffix of their names, under any scope
+VARIABLES = {
+    'kernel': 'rnn/multi_rnn_cell/cell_0/basic_lstm_cell/kernel',
+    'bias': 'rnn/multi_rnn_cell/cell_0/basic_lstm_cell/bias',
+    'weights': 'fully_connected/weights',
+    'biases': 'fully_connected/biases',
+}
+# BasicLSTMCell's default, added to the forget gate
+FORGET_BIAS = 1.0
+
+
+def checkpoint_digest(checkpoint):
+    """SHA-1 of the data files of a checkpoint, or None if it has none."""
+    data_paths = sorted(glob.glob(checkpoint + '.data-*'))
+    if not data_paths:
+        return None
+
+    sha1 = hashlib.sha1()
+    for data_path in data_paths:
+        with open(data_path, 'rb') as data_file:
+            sha1.update(data_file.read())
+    return sha1.hexdigest()
+
+
+def export_weights(checkpoint=DEFAULT_CHECKPOINT, weights_path=DEFAULT_WEIGHTS):
+    """Writes the DaggerLSTM weights of a checkpoint to weights_path."""
+    import tensorflow as tf
+
+    reader = tf.train.NewCheckpointReader(checkpoint)
+    names = reader.get_variable_to_shape_map().keys()
+
+    arrays = {}
+    for key, suffix in VARIABLES.iteritems():
+        matches = [n for n in names if n == suffix or n.endswith('/' + suffix)]
+        if len(matches) != 1:
+            raise ValueError('%s: expected one variable %s, found %d' %
+                             (checkpoint, suffix, len(matches)))
+        arrays[key] = reader.get_tensor(matches[0]).astype(np.float32)
+
+    np.savez(weights_path, forget_bias=np.float32(FORGET_BIAS),
+             checkpoint_digest=np.array(checkpoint_digest(checkpoint) or ''),
+             **arrays)
+
+
+# sigmoid() of anything beyond is 0 or 1 in float32; clipping keeps exp()
+# from overflowing
+EXP_LIMIT = 80.0
+
+
+def sigmoid_(x):
+    """In-place sigmoid. np.exp() is about twice as fast as np.tanh(), so
+    tanh(x) is computed as 2 * sigmoid(2 * x) - 1 where it is needed.
+    """
+    np.negative(x, out=x)
+    np.clip(x, -EXP_LIMIT, EXP_LIMIT, out=x)
+    np.exp(x, out=x)
+    x += 1.0
+    np.reciprocal(x, out=x)
+
+
+class NumpyDaggerLSTM(object):
+    """The forward pass of DaggerLSTM, one step at a time. Work arrays are
+    allocated once per batch size; LSTM states are (c, h) pairs of arrays
+    of zero_init_state(), updated in place.
+    """
+
+    def __init__(self, weights_path=DEFAULT_WEIGHTS):
+        with np.load(weights_path) as weights:
+            self.kernel = weights['kernel']
+            self.bias = weights['bias']
+            self.weights = weights['weights']
+            self.biases = weights['biases']
+            self.forget_bias = float(weights['forget_bias'])
+            exported_digest = None
+            if 'checkpoint_digest' in weights.files:
+                exported_digest = str(weights['checkpoint_digest'])
+
+        # the checkpoint next to the weights must be the one they came from
+        checkpoint = path.splitext(weights_path)[0]
+        digest = checkpoint_digest(checkpoint)
+        if digest is not None and digest != exported_digest:
+            raise ValueError(
+                '%s is stale: %s changed since it was exported; re-export it '
+                'with dagger/numpy_model.py --checkpoint %s --output %s' % (
+                    weights_path, checkpoint, checkpoint, weights_path))
+
+        self.num_layers = 1
+        self.lstm_dim = self.kernel.shape[1] // 4
+        self.state_dim = self.kernel.shape[0] - self.lstm_dim
+        self.action_cnt = self.weights.shape[1]
+
+        # gates are input, new input, forget and output, in that order.
+        # Fold the forget bias into the bias of the forget gate, and
+        # double the new input gate, whose tanh() comes from a sigmoid()
+        L = self.lstm_dim
+        self.kernel = self.kernel.copy()
+        self.bias = self.bias.copy()
+        self.bias[2 * L:3 * L] += self.forget_bias
+        self.kernel[:, L:2 * L] *= 2.0
+        self.bias[L:2 * L] *= 2.0
+
+        self.work = {}  # batch size -> work arrays
+
+    def zero_init_state(self, batch_size):
+        init_state = []
+        for _ in xrange(self.num_layers):
+            c_init = np.zeros([batch_size, self.lstm_dim], np.float32)
+            h_init = np.zeros([batch_size, self.lstm_dim], np.float32)
+            init_state.append((c_init, h_init))
+
+        return init_state
+
+    def work_arrays(self, batch_size):
+        if batch_size not in self.work:
+            self.work[batch_size] = (
+                np.zeros([batch_size, self.state_dim + self.lstm_dim],
+                         np.float32),
+                np.zeros([batch_size, 4 * self.lstm_dim], np.float32),
+                np.zeros([batch_size, self.action_cnt], np.float32))
+        return self.work[batch_size]
+
+    def input_buffer(self, batch_size):
+        """The input rows of the next step() of batch_size, to fill in
+        place of passing inputs.
+        """
+        return self.work_arrays(batch_size)[0][:, :self.state_dim]
+
+    def step(self, inputs, lstm_state):
+        """Advances lstm_state by one step of inputs, [batch, state_dim]
+        or None if already in input_buffer(). Returns the action
+        probabilities, [batch, action_cnt], valid until the next step.
+        """
+        c, h = lstm_state[0]
+        xh, gates, probs = self.work_arrays(len(c))
+        L = self.lstm_dim
+
+        if inputs is not None:
+            xh[:, :self.state_dim] = inputs
+        xh[:, self.state_dim:] = h
+
+        np.dot(xh, self.kernel, out=gates)
+        gates += self.bias
+        sigmoid_(gates)
+
+        i = gates[:, :L]
+        j = gates[:, L:2 * L]
+        f = gates[:, 2 * L:3 * L]
+        o = gates[:, 3 * L:]
+
+        # j = tanh(new input)
+        j *= 2.0
+        j -= 1.0
+
+        c *= f
+        i *= j
+        c += i
+
+        # h = tanh(c) * o
+        np.multiply(c, 2.0, out=h)
+        sigmoid_(h)
+        h *= 2.0
+        h -= 1.0
+        h *= o
+
+        np.dot(h, self.weights, out=probs)
+        probs += self.biases
+        probs -= probs.max(axis=1)[:, np.newaxis]
+        np.exp(probs, out=probs)
+        probs /= probs.sum(axis=1)[:, np.newaxis]
+        return probs
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='export the weights of a DaggerLSTM checkpoint for '
+        'NumpyDaggerLSTM')
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT,
+                        help='checkpoint prefix (default: %s)' %
+                        DEFAULT_CHECKPOINT)
+    parser.add_argument('--output', default=DEFAULT_WEIGHTS,
+                        help='weights to write (default: %s)' %
+                        DEFAULT_WEIGHTS)
+    args = parser.parse_args()
+
+    export_weights(args.checkpoint, args.output)
+    sys.stderr.write('Exported %s to %s\n' % (args.checkpoint, args.output))
+
+
+if __name__ == '__main__':
+    main()
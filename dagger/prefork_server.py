@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+"""Keeps the DaggerLSTM policy warm for many short flows. The server
+imports the sender and loads the model once; for every flow that
+run_sender.py --server SOCKET asks for, it forks a copy of itself that
+runs the flow, so the flow starts with its policy ready.
+
+A client sends one JSON line, {"port": ..., "sender_args": {...}}, and
+waits for the exit status of its flow. The flow ends when it does or
+when the client goes away, e.g. killed at the end of an experiment.
+"""
+
+import os
+import sys
+import json
+import signal
+import socket
+import argparse
+import threading
+import project_root
+from os import path
+
+
+def run_remote(socket_path, port, sender_args):
+    """Runs a flow on port in the server at socket_path; returns its exit
+    status once it ends.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+        sock.sendall(json.dumps({'port': port,
+                                 'sender_args': sender_args}) + '\n')
+        status = sock.makefile('r').readline()
+    finally:
+        sock.close()
+
+    return int(status) if status else 1
+
+
+def exit_on_hangup(conn):
+    """Ends this flow once its client closes the connection."""
+    def watch():
+        while conn.recv(4096):
+            pass
+        os._exit(1)
+
+    watcher = threading.Thread(target=watch)
+    watcher.daemon = True
+    watcher.start()
+
+
+def run_flow(conn, create_sender, learner):
+    """Runs the flow that the client on conn asks for, in a forked copy of
+    the server. Returns its exit status.
+    """
+    request = json.loads(conn.makefile('r').readline())
+    exit_on_hangup(conn)
+
+    sender = create_sender(request['port'], **request['sender_args'])
+    sender.set_sample_action(learner.sample_action)
+
+    try:
+        sender.handshake()
+        sender.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sender.cleanup()
+
+    return 0
+
+
+class PreforkServer(object):
+    def __init__(self, socket_path, backend='numpy'):
+        self.socket_path = socket_path
+        self.backend = backend
+
+        # everything a flow needs before its first packet, loaded once
+        from env.sender import Sender
+        from run_sender import create_learner
+        self.create_sender = Sender
+        self.create_learner = create_learner
+
+        self.learner = None
+        if backend == 'numpy':
+            self.learner = create_learner(backend)
+        else:
+            # TF sessions do not survive fork(); every flow restores its
+            # own, but the import, most of the startup, happens once
+            import tensorflow
+
+        if path.exists(socket_path):
+            os.remove(socket_path)
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(socket_path)
+        self.listener.listen(128)
+
+    def cleanup(self):
+        self.listener.close()
+        if path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    def run(self):
+        # flows are reaped by the kernel
+        signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+        sys.stderr.write('[prefork] Serving %s flows on %s\n' %
+                         (self.backend, self.socket_path))
+
+        while True:
+            conn, _ = self.listener.accept()
+
+            if os.fork() == 0:
+                self.listener.close()
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                status = 1
+                try:
+                    learner = self.learner
+                    if learner is None:
+                        learner = self.create_learner(self.backend)
+                    status = run_flow(conn, self.create_sender, learner)
+                except Exception as e:
+                    sys.stderr.write('[prefork] Flow failed: %s\n' % e)
+                finally:
+                    try:
+                        conn.sendall('%d\n' % status)
+                    finally:
+                        os._exit(status)
+
+            conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='serve warm DaggerLSTM senders to run_sender.py --server')
+    parser.add_argument('socket', help='Unix socket to listen on')
+    parser.add_argument('--backend', choices=['tf', 'numpy'],
+                        default='numpy',
+                        help='run the model in TensorFlow, or in NumPy from '
+                        'dagger/model/model.npz (default: numpy)')
+    args = parser.parse_args()
+
+    server = PreforkServer(args.socket, args.backend)
+    # clean up the socket when terminated, too
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.cleanup()
+
+
+if __name__ == '__main__':
+    main()
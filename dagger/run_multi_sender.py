@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+import sys
+import argparse
+import project_root
+from env.sender import Sender
+from env.multi_sender import MultiSender
+from run_sender import create_learner
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='run many DaggerLSTM flows in one process, batching '
+        'the inference of all flows whose steps end in the same tick')
+    parser.add_argument('ports', metavar='PORT', type=int, nargs='+')
+    parser.add_argument('--batch-io', action='store_true',
+                        help='use batched datagram I/O (sendmmsg/recvmmsg)')
+    parser.add_argument('--wire-format', choices=['protobuf', 'struct'],
+                        default='protobuf',
+                        help='preferred wire format (default: protobuf)')
+    parser.add_argument('--backend', choices=['tf', 'numpy'],
+                        default='numpy',
+                        help='run the model in TensorFlow, or in NumPy from '
+                        'dagger/model/model.npz (default: numpy)')
+    args = parser.parse_args()
+
+    senders = [Sender(port, batch_io=args.batch_io,
+                      wire_format=args.wire_format) for port in args.ports]
+
+    learner = create_learner(args.backend, num_flows=len(senders))
+
+    multi_sender = MultiSender(senders, learner.sample_actions)
+
+    try:
+        multi_sender.handshake()
+        multi_sender.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if multi_sender.batch_calls > 0:
+            sys.stderr.write('[multi-sender] %.1f flows per forward pass\n' %
+                             (float(multi_sender.batch_rows) /
+                              multi_sender.batch_calls))
+        multi_sender.cleanup()
+
+
+if __name__ == '__main__':
+    main()
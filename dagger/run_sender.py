@@ -15,18 +15,26 @@
 #     limitations under the License.
 
 
+import sys
 import argparse
 import project_root
 import numpy as np
-import tensorflow as tf
 from os import path
-from env.sender import Sender
-from models import DaggerLSTM
+from numpy_model import NumpyDaggerLSTM, DEFAULT_WEIGHTS
 from helpers.helpers import normalize, one_hot, softmax
+from helpers.features import STATE_SCALES
+
+
+# TensorFlow, and the protobuf behind Sender, are imported where they are
+# first needed: most of the startup of a flow is importing them, and the
+# numpy backend and prefork_server.py clients need neither
 
 
 class Learner(object):
-    def __init__(self, state_dim, action_cnt, restore_vars):
+    def __init__(self, state_dim, action_cnt, restore_vars, num_flows=1):
+        import tensorflow as tf
+        from models import DaggerLSTM
+
         self.aug_state_dim = state_dim + action_cnt
         self.action_cnt = action_cnt
         self.prev_action = action_cnt - 1
@@ -37,6 +45,11 @@ class Learner(object):
 
         self.lstm_state = self.model.zero_init_state(1)
 
+        # per-flow LSTM states and previous actions for sample_actions(),
+        # one row per flow
+        self.flow_lstm_state = self.model.zero_init_state(num_flows)
+        self.flow_prev_action = np.full(num_flows, action_cnt - 1, np.int32)
+
         self.sess = tf.Session()
 
         # restore saved variables
@@ -73,23 +86,178 @@ class Learner(object):
         # action = np.argmax(np.random.multinomial(1, temp_probs - 1e-5))
         return action
 
+    def sample_actions(self, flow_ids, states):
+        """Batched sample_action() for many flows in one forward pass,
+        carrying each flow's LSTM state separately.
+        """
+        rows = np.asarray(flow_ids)
+
+        state_dim = len(STATE_SCALES)
+        aug_states = np.zeros([len(rows), 1, self.aug_state_dim], np.float32)
+        aug_states[:, 0, :state_dim] = np.asarray(states) / STATE_SCALES
+        aug_states[np.arange(len(rows)), 0,
+                   state_dim + self.flow_prev_action[rows]] = 1.0
+
+        pi = self.model
+        feed_dict = {
+            pi.input: aug_states,
+            pi.state_in: [(c[rows], h[rows]) for c, h in self.flow_lstm_state],
+        }
+        ops_to_run = [pi.action_probs, pi.state_out]
+        action_probs, state_out = self.sess.run(ops_to_run, feed_dict)
+
+        # scatter the new LSTM states back to their flows
+        for (c, h), (c_out, h_out) in zip(self.flow_lstm_state, state_out):
+            c[rows] = c_out
+            h[rows] = h_out
+
+        actions = np.argmax(action_probs[:, 0, :], axis=1)
+        self.flow_prev_action[rows] = actions
+        return actions
+
+    def reset_flows(self, flow_ids):
+        """Starts flow_ids over, from a zero LSTM state and no previous
+        action, as a new flow.
+        """
+        rows = np.asarray(flow_ids)
+        for c, h in self.flow_lstm_state:
+            c[rows] = 0.0
+            h[rows] = 0.0
+        self.flow_prev_action[rows] = self.action_cnt - 1
+
+
+class NumpyLearner(object):
+    """Learner on NumpyDaggerLSTM: the same actions without TensorFlow
+    sessions, from the weights that numpy_model.py exports.
+    """
+
+    def __init__(self, state_dim, action_cnt, weights_path=DEFAULT_WEIGHTS,
+                 num_flows=1):
+        self.state_dim = state_dim
+        self.action_cnt = action_cnt
+        self.prev_action = action_cnt - 1
+
+        self.model = NumpyDaggerLSTM(weights_path)
+        if self.model.state_dim != state_dim + action_cnt:
+            raise ValueError('%s has inputs of %d, not %d' % (
+                weights_path, self.model.state_dim, state_dim + action_cnt))
+
+        self.lstm_state = self.model.zero_init_state(1)
+        self.flow_lstm_state = self.model.zero_init_state(num_flows)
+        self.flow_prev_action = np.full(num_flows, action_cnt - 1, np.int32)
+
+    def sample_action(self, state):
+        aug_state = self.model.input_buffer(1)
+        aug_state[0, :self.state_dim] = state
+        aug_state[0, :self.state_dim] /= STATE_SCALES
+        aug_state[0, self.state_dim:] = 0.0
+        aug_state[0, self.state_dim + self.prev_action] = 1.0
+
+        action_probs = self.model.step(None, self.lstm_state)
+
+        action = np.argmax(action_probs[0])
+        self.prev_action = action
+        return action
+
+    def sample_actions(self, flow_ids, states):
+        rows = np.asarray(flow_ids)
+
+        aug_states = self.model.input_buffer(len(rows))
+        aug_states[:, :self.state_dim] = np.asarray(states) / STATE_SCALES
+        aug_states[:, self.state_dim:] = 0.0
+        aug_states[np.arange(len(rows)),
+                   self.state_dim + self.flow_prev_action[rows]] = 1.0
+
+        # step the LSTM states of the flows, then scatter them back
+        lstm_state = [(c[rows], h[rows]) for c, h in self.flow_lstm_state]
+        action_probs = self.model.step(None, lstm_state)
+        for (c, h), (c_out, h_out) in zip(self.flow_lstm_state, lstm_state):
+            c[rows] = c_out
+            h[rows] = h_out
+
+        actions = np.argmax(action_probs, axis=1)
+        self.flow_prev_action[rows] = actions
+        return actions
+
+    def reset_flows(self, flow_ids):
+        """Starts flow_ids over, from a zero LSTM state and no previous
+        action, as a new flow.
+        """
+        rows = np.asarray(flow_ids)
+        for c, h in self.flow_lstm_state:
+            c[rows] = 0.0
+            h[rows] = 0.0
+        self.flow_prev_action[rows] = self.action_cnt - 1
+
+
+def create_learner(backend, num_flows=1):
+    """The Learner of backend, 'tf' or 'numpy', on the shipped model."""
+    from env.sender import Sender
+
+    if backend == 'numpy':
+        return NumpyLearner(
+            state_dim=Sender.state_dim,
+            action_cnt=Sender.action_cnt,
+            num_flows=num_flows)
+
+    model_path = path.join(project_root.DIR, 'dagger', 'model', 'model')
+    return Learner(
+        state_dim=Sender.state_dim,
+        action_cnt=Sender.action_cnt,
+        restore_vars=model_path,
+        num_flows=num_flows)
+
+
+def sender_args(args):
+    """Keyword arguments of Sender from the options of main()."""
+    return {'debug': args.debug, 'batch_io': args.batch_io,
+            'wire_format': args.wire_format, 'io_backend': args.io_backend,
+            'async_inference': args.async_inference}
+
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('port', type=int)
     parser.add_argument('--debug', action='store_true')
+    parser.add_argument('--batch-io', action='store_true',
+                        help='use batched datagram I/O (sendmmsg/recvmmsg)')
+    parser.add_argument('--wire-format', choices=['protobuf', 'struct'],
+                        default='protobuf',
+                        help='preferred wire format (default: protobuf)')
+    parser.add_argument('--io-backend', choices=['poll', 'epoll'],
+                        default='poll',
+                        help='event loop backend (default: poll)')
+    parser.add_argument('--async-inference', action='store_true',
+                        help='sample actions off the packet loop')
+    parser.add_argument('--backend', choices=['tf', 'numpy'],
+                        default='numpy',
+                        help='run the model in TensorFlow, or in NumPy from '
+                        'dagger/model/model.npz (default: numpy)')
+    parser.add_argument('--server', metavar='SOCKET',
+                        help='run the flow in a warm copy of the '
+                        'prefork_server.py listening on SOCKET, whose '
+                        'backend overrides --backend')
+    parser.add_argument('--inference-socket', metavar='SOCKET',
+                        help='sample actions from the inference_server.py '
+                        'listening on SOCKET instead of loading the model')
     args = parser.parse_args()
 
-    sender = Sender(args.port, debug=args.debug)
-
-    model_path = path.join(project_root.DIR, 'dagger', 'model', 'model')
+    if args.server is not None:
+        from prefork_server import run_remote
+        sys.exit(run_remote(args.server, args.port, sender_args(args)))
 
-    learner = Learner(
-        state_dim=Sender.state_dim,
-        action_cnt=Sender.action_cnt,
-        restore_vars=model_path)
+    from env.sender import Sender
+    sender = Sender(args.port, **sender_args(args))
 
-    sender.set_sample_action(learner.sample_action)
+    client = None
+    if args.inference_socket is not None:
+        from inference_server import InferenceClient
+        # ports are unique among the senders of a host
+        client = InferenceClient(args.inference_socket, 'port-%d' % args.port)
+        sender.set_sample_action(client.sample_action)
+    else:
+        learner = create_learner(args.backend)
+        sender.set_sample_action(learner.sample_action)
 
     try:
         sender.handshake()
@@ -98,6 +266,8 @@ def main():
         pass
     finally:
         sender.cleanup()
+        if client is not None:
+            client.close()
 
 
 if __name__ == '__main__':
@@ -24,6 +24,8 @@ import project_root
 from os import path
 from subprocess import Popen, call
 from helpers.helpers import get_open_udp_port
+from helpers.trace_index import TraceIndex
+from best_cwnd import BestCwndTable
 
 
 def run(args):
@@ -40,6 +42,16 @@ def run(args):
                    '--worker-hosts', args['worker_hosts'],
                    '--job-name', job_name,
                    '--task-index', str(i)]
+            if args['persistent_env']:
+                cmd.append('--persistent-env')
+            if args['emulate']:
+                cmd.append('--emulate')
+            cmd += ['--envs-per-worker', str(args['envs_per_worker'])]
+            if job_name == 'worker' and args['scenarios']:
+                trace, delay, best_cwnd = (
+                    args['scenarios'][i % len(args['scenarios'])])
+                cmd += ['--trace', trace, '--delay', str(delay),
+                        '--best-cwnd', str(best_cwnd)]
 
             cmd = ssh_cmd + cmd
 
@@ -94,10 +106,44 @@ def construct_args(prog_args):
 
     args['ps_procs'] = []
     args['worker_procs'] = []
+    args['persistent_env'] = prog_args.persistent_env
+    args['emulate'] = prog_args.emulate
+    args['envs_per_worker'] = prog_args.envs_per_worker
+    args['scenarios'] = select_scenarios(prog_args)
 
     return args
 
 
+def select_scenarios(prog_args):
+    """(trace, delay, best cwnd) of the traces of the trace index that
+    satisfy --scenarios, with the best cwnd interpolated at their mean
+    rate and --delay.
+    """
+    if prog_args.scenarios is None:
+        return []
+    if prog_args.trace_index is None:
+        sys.exit('--scenarios requires --trace-index')
+
+    index = TraceIndex(prog_args.trace_index)
+    try:
+        trace_paths = index.query(prog_args.scenarios)
+    except ValueError as e:
+        sys.exit(str(e))
+    if not trace_paths:
+        sys.exit('No trace satisfies %s' % prog_args.scenarios)
+
+    best_cwnds = BestCwndTable()
+    scenarios = []
+    for trace_path in trace_paths:
+        mean_mbps = index.row(trace_path)['mean_mbps']
+        scenarios.append((trace_path, prog_args.delay,
+                          best_cwnds.lookup(mean_mbps, prog_args.delay)))
+
+    sys.stderr.write('%d scenarios satisfy %s\n' %
+                     (len(scenarios), prog_args.scenarios))
+    return scenarios
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument(
@@ -112,6 +158,25 @@ def main():
     parser.add_argument(
         '--rlcc-dir', metavar='DIR', default='/home/ubuntu/RLCC',
         help='absolute path to RLCC/ (default: /home/ubuntu/RLCC)')
+    parser.add_argument(
+        '--persistent-env', action='store_true',
+        help='keep mahimahi and the receiver alive across episodes')
+    parser.add_argument(
+        '--emulate', action='store_true',
+        help='emulate the mahimahi shells in process, in virtual time')
+    parser.add_argument(
+        '--envs-per-worker', metavar='K', type=int, default=1,
+        help='environments each worker runs in parallel (default: 1)')
+    parser.add_argument(
+        '--trace-index', metavar='PATH',
+        help='index of traces built by helpers/trace_index.py')
+    parser.add_argument(
+        '--scenarios', metavar='QUERY',
+        help="train workers, in turn, on the indexed traces that satisfy "
+        "QUERY, e.g. 'p10_mbps < 5 and cov > 0.5'")
+    parser.add_argument(
+        '--delay', metavar='MS', type=int, default=25,
+        help='one-way delay of the --scenarios (default: 25)')
     prog_args = parser.parse_args()
     args = construct_args(prog_args)
 
@@ -16,33 +16,30 @@
 
 
 import sys
-import yaml
 import argparse
 import project_root
 import numpy as np
 import tensorflow as tf
-from subprocess import check_call
 from os import path
 from dagger import DaggerLeader, DaggerWorker
 from env.environment import Environment
+from env.parallel_environment import ParallelEnvironment
 from env.sender import Sender
+from best_cwnd import BestCwndTable
+from helpers.trace_cache import TraceCache
+
+
+TRACE_CACHE = TraceCache()
+BEST_CWNDS = BestCwndTable()
 
 
 def prepare_traces(bandwidth):
     trace_dir = path.join(project_root.DIR, 'env')
 
     if type(bandwidth) == int:
-        trace_path = path.join(trace_dir, '%dmbps.trace' % bandwidth)
-
-        if not path.exists(trace_path):
-            gen_trace = path.join(project_root.DIR, 'helpers',
-                                  'generate_trace.py')
-            cmd = ['python', gen_trace, '--output-dir', trace_dir,
-                   '--bandwidth', str(bandwidth)]
-            sys.stderr.write('$ %s\n' % ' '.join(cmd))
-            check_call(cmd)
-
-        uplink_trace = trace_path
+        # generated once, then shared by every worker through the cache
+        uplink_trace = TRACE_CACHE.generated_text(model='constant',
+                                                  bandwidth=bandwidth)
         downlink_trace = uplink_trace
     else:
         trace_path = path.join(trace_dir, bandwidth)
@@ -53,27 +50,28 @@ def prepare_traces(bandwidth):
     return uplink_trace, downlink_trace
 
 
-def create_env(task_index):
+def create_env(task_index, persistent=False, emulate=False, num_envs=1,
+               scenario=None):
     """ Creates and returns an Environment which contains a single
     sender-receiver connection. The environment is run inside mahimahi
     shells. The environment knows the best cwnd to pass to the expert policy.
+    scenario, a (trace, one-way delay, best cwnd) tuple, replaces the
+    scenario of task_index; its best cwnd may be None to look it up.
     """
 
-    best_cwnds_file = path.join(project_root.DIR, 'dagger', 'best_cwnds.yml')
-    best_cwnd_map = yaml.load(open(best_cwnds_file))
-
-    if task_index == 0:
+    best_cwnd = None
+    if scenario is not None:
+        trace_path, delay, best_cwnd = scenario
+        mm_cmd = 'mm-delay %d mm-link %s %s' % (delay, trace_path, trace_path)
+    elif task_index == 0:
         trace_path = path.join(project_root.DIR, 'env', '0.57mbps-poisson.trace')
         mm_cmd = 'mm-delay 28 mm-loss uplink 0.0477 mm-link %s %s --uplink-queue=droptail --uplink-queue-args=packets=14' % (trace_path, trace_path)
-        best_cwnd = 5
     elif task_index == 1:
         trace_path = path.join(project_root.DIR, 'env', '2.64mbps-poisson.trace')
         mm_cmd = 'mm-delay 88 mm-link %s %s --uplink-queue=droptail --uplink-queue-args=packets=130' % (trace_path, trace_path)
-        best_cwnd = 40
     elif task_index == 2:
         trace_path = path.join(project_root.DIR, 'env', '3.04mbps-poisson.trace')
         mm_cmd = 'mm-delay 130 mm-link %s %s --uplink-queue=droptail --uplink-queue-args=packets=426' % (trace_path, trace_path)
-        best_cwnd = 70
     elif task_index <= 18:
         bandwidth = [5, 10, 20, 50]
         delay = [10, 20, 40, 80]
@@ -83,19 +81,16 @@ def create_env(task_index):
 
         uplink_trace, downlink_trace = prepare_traces(bandwidth)
         mm_cmd = 'mm-delay %d mm-link %s %s' % (delay, uplink_trace, downlink_trace)
-        best_cwnd = best_cwnd_map[bandwidth][delay]
+        best_cwnd = BEST_CWNDS.lookup(bandwidth, delay)
     elif task_index == 19:
         trace_path = path.join(project_root.DIR, 'env', '100.42mbps.trace')
         mm_cmd = 'mm-delay 27 mm-link %s %s --uplink-queue=droptail --uplink-queue-args=packets=173' % (trace_path, trace_path)
-        best_cwnd = 500
     elif task_index == 20:
         trace_path = path.join(project_root.DIR, 'env', '77.72mbps.trace')
         mm_cmd = 'mm-delay 51 mm-loss uplink 0.0006 mm-link %s %s --uplink-queue=droptail --uplink-queue-args=packets=94' % (trace_path, trace_path)
-        best_cwnd = 690
     elif task_index == 21:
         trace_path = path.join(project_root.DIR, 'env', '114.68mbps.trace')
         mm_cmd = 'mm-delay 45 mm-link %s %s --uplink-queue=droptail --uplink-queue-args=packets=450' % (trace_path, trace_path)
-        best_cwnd = 870
     elif task_index <= 29:
         bandwidth = [100, 200]
         delay = [10, 20, 40, 80]
@@ -105,9 +100,17 @@ def create_env(task_index):
 
         uplink_trace, downlink_trace = prepare_traces(bandwidth)
         mm_cmd = 'mm-delay %d mm-link %s %s' % (delay, uplink_trace, downlink_trace)
-        best_cwnd = best_cwnd_map[bandwidth][delay]
+        best_cwnd = BEST_CWNDS.lookup(bandwidth, delay)
+
+    if best_cwnd is None:
+        # the table's entry for the scenario, or the grid's at its rate
+        best_cwnd = BEST_CWNDS.for_cmd(mm_cmd)
 
-    env = Environment(mm_cmd)
+    if num_envs > 1:
+        env = ParallelEnvironment([mm_cmd] * num_envs, persistent=persistent,
+                                  emulate=emulate)
+    else:
+        env = Environment(mm_cmd, persistent=persistent, emulate=emulate)
     env.best_cwnd = best_cwnd
 
     return env
@@ -132,7 +135,8 @@ def run(args):
     if job_name == 'ps':
         # Sets up the queue, shared variables, and global classifier.
         worker_tasks = set([idx for idx in xrange(num_workers)])
-        leader = DaggerLeader(cluster, server, worker_tasks)
+        leader = DaggerLeader(cluster, server, worker_tasks,
+                              args.envs_per_worker)
         try:
             leader.run(debug=True)
         except KeyboardInterrupt:
@@ -142,7 +146,11 @@ def run(args):
 
     elif job_name == 'worker':
         # Sets up the env, shared variables (sync, classifier, queue, etc)
-        env = create_env(task_index)
+        scenario = None
+        if args.trace is not None:
+            scenario = (args.trace, args.delay, args.best_cwnd)
+        env = create_env(task_index, args.persistent_env, args.emulate,
+                         args.envs_per_worker, scenario)
         learner = DaggerWorker(cluster, server, task_index, env)
         try:
             learner.run(debug=True)
@@ -164,6 +172,23 @@ def main():
                         required=True, help='ps or worker')
     parser.add_argument('--task-index', metavar='N', type=int, required=True,
                         help='index of task')
+    parser.add_argument('--persistent-env', action='store_true',
+                        help='keep mahimahi and the receiver alive across '
+                        'episodes')
+    parser.add_argument('--emulate', action='store_true',
+                        help='emulate the mahimahi shells in process, in '
+                        'virtual time')
+    parser.add_argument('--envs-per-worker', metavar='K', type=int, default=1,
+                        help='environments each worker runs in parallel, '
+                        'in child processes (default: 1)')
+    parser.add_argument('--trace', metavar='PATH',
+                        help='trace to train on instead of the scenario of '
+                        '--task-index, with --delay and --best-cwnd')
+    parser.add_argument('--delay', metavar='MS', type=int, default=25,
+                        help='one-way delay with --trace (default: 25)')
+    parser.add_argument('--best-cwnd', metavar='N', type=int,
+                        help='best cwnd of the expert with --trace '
+                        '(default: from dagger/best_cwnds.yml)')
     args = parser.parse_args()
 
     # run parameter servers and workers
@@ -0,0 +1,157 @@
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+import Queue
+import threading
+
+
+class AsyncActionSampler(object):
+    """Runs a policy's sample_action() off the packet loop.
+
+    The sender submits the state at a step boundary and keeps sending on
+    its current cwnd; poll() returns the action once it is ready. At most
+    one request is in flight at a time. session.run() and NumPy release the
+    GIL, so a thread is enough to overlap inference with packet I/O.
+    """
+
+    def __init__(self, sample_action):
+        self.sample_action = sample_action
+        self.requests = Queue.Queue()
+        self.results = Queue.Queue()
+        self.pending = False
+
+        self.thread = threading.Thread(target=self.loop)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def loop(self):
+        while True:
+            state = self.requests.get()
+            if state is None:
+                return
+
+            # hand exceptions back to the packet loop that polls
+            try:
+                action = self.sample_action(state)
+            except Exception as e:
+                action = e
+
+            self.results.put(action)
+
+    def submit(self, state):
+        assert not self.pending
+        self.pending = True
+        self.requests.put(state)
+
+    def poll(self):
+        """Returns the action of the pending request if ready, else None."""
+        if not self.pending:
+            return None
+
+        try:
+            action = self.results.get_nowait()
+        except Queue.Empty:
+            return None
+
+        self.pending = False
+
+        if isinstance(action, Exception):
+            raise action
+        return action
+
+    def cancel(self):
+        """Waits out the pending request, if any, and drops its action."""
+        if self.pending:
+            self.results.get()
+            self.pending = False
+
+    def stop(self):
+        self.requests.put(None)
+        self.thread.join()
+
+
+class BatchedActionSampler(object):
+    """Gathers the step states of many flows that come due in the same tick
+    and samples all of their actions with one sample_actions(flow_ids,
+    states) call, i.e. a single forward pass over a batch of flows.
+    """
+
+    def __init__(self, sample_actions):
+        self.sample_actions = sample_actions
+        self.flow_ids = []
+        self.states = []
+        self.results = {}
+
+    def flow(self, flow_id):
+        """Returns the sampler for one flow, to pass to a Sender."""
+        return FlowActionSampler(self, flow_id)
+
+    def flush(self):
+        """Runs the batch gathered so far. Returns the flow ids served."""
+        flow_ids = self.flow_ids
+        if not flow_ids:
+            return flow_ids
+
+        actions = self.sample_actions(flow_ids, self.states)
+        for flow_id, action in zip(flow_ids, actions):
+            self.results[flow_id] = action
+
+        self.flow_ids = []
+        self.states = []
+        return flow_ids
+
+
+class FlowActionSampler(object):
+    """One flow's slot in a BatchedActionSampler, with the same interface as
+    AsyncActionSampler.
+    """
+
+    def __init__(self, batch, flow_id):
+        self.batch = batch
+        self.flow_id = flow_id
+        self.pending = False
+
+    def submit(self, state):
+        assert not self.pending
+        self.pending = True
+        self.batch.flow_ids.append(self.flow_id)
+        self.batch.states.append(state)
+
+    def poll(self):
+        if not self.pending:
+            return None
+
+        action = self.batch.results.pop(self.flow_id, None)
+        if action is None:
+            return None
+
+        self.pending = False
+        return action
+
+    def cancel(self):
+        """Drops the pending request, whether batched yet or not."""
+        if not self.pending:
+            return
+
+        batch = self.batch
+        if self.flow_id in batch.flow_ids:
+            i = batch.flow_ids.index(self.flow_id)
+            del batch.flow_ids[i]
+            del batch.states[i]
+        batch.results.pop(self.flow_id, None)
+        self.pending = False
+
+    def stop(self):
+        pass
@@ -0,0 +1,270 @@
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+"""In-process, discrete-event emulation of a mahimahi shell.
+
+Understands the mm-delay, mm-loss and mm-link shells of the commands built
+by create_env() in dagger/worker.py and a3c/worker.py, including droptail
+queues limited in packets. As in Environment, the sender is outside the
+shells and the receiver inside, so data travels the downlink and ACKs the
+uplink, through the shells in command order and back.
+
+Every stage is FIFO and packets enter it in time order, so the time a
+datagram reaches the receiver, and the time its ACK gets back, are known
+when it is sent. The emulator only has to keep a heap of ACK arrivals and
+jump the sender's clock from one to the next.
+"""
+
+import math
+import heapq
+import shlex
+import numpy as np
+from receiver import construct_ack_from_data
+import project_root
+from helpers.clock import SimulatedClock
+from helpers.trace_cache import TraceCache
+
+
+# mahimahi delivers this many bytes per trace line
+MTU = 1504
+# IPv4 and UDP headers on top of each datagram
+HEADER_BYTES = 28
+
+TRACE_CACHE = TraceCache()
+
+
+def open_trace(trace_path):
+    """Returns the delivery opportunities (ms) of one period of a text or
+    binary trace, and their cumulative counts by ms, memory-mapped from
+    the trace cache.
+    """
+    return TRACE_CACHE.open(trace_path)
+
+
+def load_trace(trace_path):
+    """Returns the delivery opportunities (ms) of one trace period."""
+    return open_trace(trace_path)[0]
+
+
+class Link(object):
+    """One direction of mm-link: a trace-driven bottleneck behind a FIFO
+    queue, infinite unless limited to queue_packets (droptail).
+
+    Each trace line is an opportunity to deliver MTU bytes; a packet may
+    span opportunities, and an opportunity may finish one packet and start
+    the next. Opportunities with nothing queued are lost.
+    """
+
+    def __init__(self, trace, queue_packets=None):
+        self.trace = trace
+        self.period = int(trace[-1])
+        self.queue_packets = queue_packets
+
+        self.opp = -1  # index of the opportunity used last, across periods
+        self.bytes_left = 0  # unused bytes of that opportunity
+        self.departures = []  # heap of departure times of queued packets
+
+    def opp_time(self, opp):
+        periods, idx = divmod(opp, len(self.trace))
+        return periods * self.period + self.trace[idx]
+
+    def first_opp(self, t):
+        """Index of the first opportunity at or after time t."""
+        # the period whose (start, end] holds t; trace[-1] == period
+        periods = max(0, int(math.ceil(float(t) / self.period)) - 1)
+        idx = np.searchsorted(self.trace, t - periods * self.period)
+        return periods * len(self.trace) + idx
+
+    def enqueue(self, t, size):
+        """Returns the time a packet of size bytes that arrives at t leaves
+        the link, or None if the queue drops it.
+        """
+        departures = self.departures
+        while departures and departures[0] <= t:
+            heapq.heappop(departures)
+
+        if (self.queue_packets is not None and
+                len(departures) >= self.queue_packets):
+            return None
+
+        # share the last opportunity only if it is still ahead
+        if self.bytes_left == 0 or self.opp_time(self.opp) < t:
+            self.opp = max(self.opp + 1, self.first_opp(t))
+            self.bytes_left = MTU
+
+        while size > self.bytes_left:
+            size -= self.bytes_left
+            self.opp += 1
+            self.bytes_left = MTU
+        self.bytes_left -= size
+
+        departure = self.opp_time(self.opp)
+        heapq.heappush(departures, departure)
+        return departure
+
+
+def parse_mahimahi_cmd(mahimahi_cmd):
+    """Returns the shells of a mahimahi command, outermost first, as
+    ('delay', ms), ('loss', 'uplink' or 'downlink', rate) and
+    ('link', uplink_trace, downlink_trace, uplink_queue_packets,
+    downlink_queue_packets) tuples. Raises ValueError on anything the
+    emulator does not model.
+    """
+    tokens = shlex.split(mahimahi_cmd)
+    shells = []
+
+    i = 0
+    while i < len(tokens):
+        shell = tokens[i]
+
+        if shell == 'mm-delay':
+            shells.append(('delay', float(tokens[i + 1])))
+            i += 2
+        elif shell == 'mm-loss':
+            direction = tokens[i + 1]
+            if direction not in ['uplink', 'downlink']:
+                raise ValueError('mm-loss direction: %s' % direction)
+            shells.append(('loss', direction, float(tokens[i + 2])))
+            i += 3
+        elif shell == 'mm-link':
+            traces = tokens[i + 1:i + 3]
+            queues = {'uplink': None, 'downlink': None}
+            i += 3
+
+            while i < len(tokens) and tokens[i].startswith('--'):
+                key, _, value = tokens[i][2:].partition('=')
+                i += 1
+
+                direction, _, option = key.partition('-')
+                if direction not in queues or option.endswith('log'):
+                    raise ValueError('mm-link option: %s' % key)
+
+                if option == 'queue':
+                    if value not in ['droptail', 'infinite']:
+                        raise ValueError('mm-link queue: %s' % value)
+                elif option == 'queue-args':
+                    name, _, packets = value.partition('=')
+                    if name != 'packets':
+                        raise ValueError('mm-link queue args: %s' % value)
+                    queues[direction] = int(packets)
+                else:
+                    raise ValueError('mm-link option: %s' % key)
+
+            shells.append(('link', traces[0], traces[1],
+                           queues['uplink'], queues['downlink']))
+        else:
+            raise ValueError('unsupported mahimahi shell: %s' % shell)
+
+    return shells
+
+
+class LinkEmulator(object):
+    """Runs a Sender's episode over an emulated mahimahi shell, in virtual
+    time. Build a new one for each episode.
+    """
+
+    def __init__(self, mahimahi_cmd, seed=None, traces=None):
+        """traces caches loaded traces by path across emulators."""
+        self.rng = np.random.RandomState(seed)
+        traces = {} if traces is None else traces
+
+        # (stage, arg) pairs along the downlink and along the uplink
+        self.downlink = []
+        self.uplink = []
+
+        for shell in parse_mahimahi_cmd(mahimahi_cmd):
+            if shell[0] == 'delay':
+                self.downlink.append(('delay', shell[1]))
+                self.uplink.append(('delay', shell[1]))
+            elif shell[0] == 'loss':
+                stages = self.uplink if shell[1] == 'uplink' else self.downlink
+                stages.append(('loss', shell[2]))
+            else:
+                _, up_trace, down_trace, up_queue, down_queue = shell
+                for trace_path in [up_trace, down_trace]:
+                    if trace_path not in traces:
+                        traces[trace_path] = load_trace(trace_path)
+
+                self.uplink.append(
+                    ('link', Link(traces[up_trace], up_queue)))
+                self.downlink.append(
+                    ('link', Link(traces[down_trace], down_queue)))
+
+        # the uplink leaves the innermost shell first
+        self.uplink.reverse()
+
+        self.now = 0.0  # ms
+        self.clock = SimulatedClock()
+        self.acks = []  # heap of (arrival time, seq, serialized ACK)
+        self.ack_cnt = 0
+
+    def traverse(self, stages, t, size):
+        """Returns when a packet sent at t gets through, or None if lost."""
+        for stage, arg in stages:
+            if stage == 'delay':
+                t += arg
+            elif stage == 'loss':
+                if self.rng.random_sample() < arg:
+                    return None
+            else:
+                t = arg.enqueue(t, size)
+                if t is None:
+                    return None
+        return t
+
+    def transmit(self, serialized_data):
+        """Sends a datagram now and schedules its ACK, unless either one
+        is lost on the way.
+        """
+        t = self.traverse(self.downlink, self.now,
+                          len(serialized_data) + HEADER_BYTES)
+        if t is None:
+            return
+
+        serialized_ack = construct_ack_from_data(serialized_data)
+        t = self.traverse(self.uplink, t,
+                          len(serialized_ack) + HEADER_BYTES)
+        if t is None:
+            return
+
+        heapq.heappush(self.acks, (t, self.ack_cnt, serialized_ack))
+        self.ack_cnt += 1
+
+    def run(self, sender):
+        """Like Sender.run(): returns the result of the sender's last step
+        end, i.e. the episode's performance in train mode.
+        """
+        TIMEOUT = 1000  # ms
+
+        sender.clock = self.clock
+        sender.wire_format = sender.preferred_wire_format
+
+        r = -1
+        while sender.running:
+            while sender.window_is_open():
+                self.transmit(sender.construct_data())
+
+            if self.acks:
+                self.now, _, serialized_ack = heapq.heappop(self.acks)
+                self.clock.set(self.now * 1000)
+                sender.update_state([sender.parse_ack(serialized_ack)])
+                r = sender.check_step_end()
+            else:
+                # nothing in flight will be acked
+                self.now += TIMEOUT
+                self.clock.set(self.now * 1000)
+                self.transmit(sender.construct_data())
+
+        return r
@@ -4,13 +4,37 @@ import sys
 import signal
 from subprocess import Popen
 from sender import Sender
+from emulator import LinkEmulator, parse_mahimahi_cmd
 import project_root
-from helpers.helpers import get_open_udp_port
+from helpers.clock import monotonic
+from helpers.helpers import get_open_udp_port, QuantileSketch
 
 
 class Environment(object):
-    def __init__(self, mahimahi_cmd):
+    # how long the sender waits for the receiver's hello, and how many
+    # times the shell is started over when it does not come
+    HANDSHAKE_TIMEOUT = 5000  # ms
+    RESTARTS = 3
+
+    def __init__(self, mahimahi_cmd, persistent=False, emulate=False):
         self.mahimahi_cmd = mahimahi_cmd
+
+        # run episodes over an in-process emulation of mahimahi_cmd, in
+        # virtual time, instead of real mahimahi shells
+        self.emulate = emulate
+        self.emulator = None
+        self.traces = {}
+
+        # keep the mahimahi shell, the receiver and the sender's socket
+        # across episodes, and reset them with a control message instead
+        self.persistent = persistent
+        self.reset_time = None  # seconds spent in the last reset()
+        self.num_envs = 1
+
+        # seconds per phase of the last reset(), e.g. 'port', 'spawn' and
+        # 'handshake' of a restart, and the distribution across resets
+        self.reset_timings = {}
+        self.reset_sketches = {}
         self.state_dim = Sender.state_dim
         self.action_cnt = Sender.action_cnt
 
@@ -26,31 +50,116 @@ class Environment(object):
     def reset(self):
         """Must be called before running rollout()."""
 
-        self.cleanup()
+        start = monotonic()
+        self.reset_timings = {}
+
+        if self.emulate:
+            self.restart_emulated()
+        elif not (self.persistent and self.resync()):
+            self.restart()
+
+        self.reset_time = monotonic() - start
+
+        for phase, seconds in self.reset_timings.iteritems():
+            if phase not in self.reset_sketches:
+                self.reset_sketches[phase] = QuantileSketch()
+            self.reset_sketches[phase].add(seconds)
+
+        sys.stderr.write('Reset took %.3f s (%s)\n' % (
+            self.reset_time, ', '.join(
+                '%s %.3f s' % (phase, seconds) for phase, seconds in
+                sorted(self.reset_timings.iteritems()))))
+
+    def time_phase(self, phase, start):
+        """Adds the time since start to phase of this reset; returns now."""
+        now = monotonic()
+        self.reset_timings[phase] = (self.reset_timings.get(phase, 0.0) +
+                                     now - start)
+        return now
+
+    def reset_summary(self, percentiles=(50, 99)):
+        """Returns {phase: [percentiles of its seconds]} over all resets."""
+        return {phase: [sketch.percentile(q) for q in percentiles]
+                for phase, sketch in self.reset_sketches.iteritems()}
 
-        self.port = get_open_udp_port()
+    def resync(self):
+        """Start a new episode on the running receiver. Returns False if
+        there is none or it does not answer.
+        """
+        if self.sender is None or self.receiver.poll() is not None:
+            return False
 
-        # start sender as an instance of Sender class
-        sys.stderr.write('Starting sender...\n')
-        self.sender = Sender(self.port, train=True)
+        start = monotonic()
+        self.sender.reset_episode()
         self.sender.set_sample_action(self.sample_action)
+        ret = self.sender.resync()
+        self.time_phase('resync', start)
+        return ret
+
+    def restart_emulated(self):
+        """Start a new sender and a new emulated link."""
+        self.cleanup()
+
+        start = monotonic()
+        self.sender = Sender(train=True)
+        self.sender.set_sample_action(self.sample_action)
+        self.emulator = LinkEmulator(self.mahimahi_cmd, traces=self.traces)
+        self.time_phase('emulator', start)
+
+    def restart(self):
+        """Start a new sender, mahimahi shell and receiver."""
+        for _ in xrange(self.RESTARTS):
+            self.cleanup()
+
+            start = monotonic()
+            self.port = get_open_udp_port()
+
+            # start sender as an instance of Sender class
+            sys.stderr.write('Starting sender...\n')
+            self.sender = Sender(self.port, train=True)
+            self.sender.set_sample_action(self.sample_action)
+            start = self.time_phase('port', start)
+
+            # start receiver in a subprocess
+            sys.stderr.write('Starting receiver...\n')
+            receiver_src = path.join(
+                project_root.DIR, 'env', 'run_receiver.py')
+            recv_cmd = 'python %s $MAHIMAHI_BASE %s --min-retry-ms %d' % (
+                receiver_src, self.port, self.min_rtt_ms())
+            cmd = "%s -- sh -c '%s'" % (self.mahimahi_cmd, recv_cmd)
+            sys.stderr.write('$ %s\n' % cmd)
+            self.receiver = Popen(cmd, preexec_fn=os.setsid, shell=True)
+            start = self.time_phase('spawn', start)
+
+            # sender completes the handshake sent from receiver, which
+            # greets again within milliseconds if it raced the sender
+            ready = self.sender.handshake(self.HANDSHAKE_TIMEOUT)
+            self.time_phase('handshake', start)
+            if ready:
+                return
+
+            sys.stderr.write('Receiver did not come up, restarting...\n')
 
-        # start receiver in a subprocess
-        sys.stderr.write('Starting receiver...\n')
-        receiver_src = path.join(
-            project_root.DIR, 'env', 'run_receiver.py')
-        recv_cmd = 'python %s $MAHIMAHI_BASE %s' % (receiver_src, self.port)
-        cmd = "%s -- sh -c '%s'" % (self.mahimahi_cmd, recv_cmd)
-        sys.stderr.write('$ %s\n' % cmd)
-        self.receiver = Popen(cmd, preexec_fn=os.setsid, shell=True)
+        sys.exit('Environment failed to start %d times' % self.RESTARTS)
 
-        # sender completes the handshake sent from receiver
-        self.sender.handshake()
+    def min_rtt_ms(self):
+        """RTT of the mahimahi shell's delays, or 0 if it cannot be told.
+        The receiver greets no faster than that, as each hello that is
+        answered late would reach the sender during the episode.
+        """
+        try:
+            shells = parse_mahimahi_cmd(self.mahimahi_cmd)
+        except ValueError:
+            return 0
+        return int(sum(2 * shell[1] for shell in shells
+                       if shell[0] == 'delay'))
 
     def rollout(self):
         """Run sender in env, get final reward of an episode, reset sender."""
 
         sys.stderr.write('Obtaining an episode from environment...\n')
+        if self.emulate:
+            return self.emulator.run(self.sender)
         return self.sender.run()
 
     def cleanup(self):
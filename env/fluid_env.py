@@ -0,0 +1,252 @@
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+"""Fluid model of many independent bottleneck links, advanced in lockstep.
+
+Each link has its own mahimahi trace, one-way delay, droptail queue and
+loss rate, and carries one window-limited flow. Every step of
+step_len_ms moves cwnd / RTT worth of bytes into the queue, drains what
+the trace can deliver in the step, and drops what overflows the queue,
+for all links at once with NumPy.
+
+The states have the columns of Sender.features in the same units: the
+per-step delay, delivery rate and send rate samples are reduced as
+Sender's are, each step yielding one sample per field. Like Sender, rates
+and rewards count datagram bytes; IPv4 and UDP headers only take up room
+in the queue and on the link. Unlike Sender, a step observes the link in
+that step rather than ACKs one RTT old.
+
+It is not wired into the A3C or DaggerWorker rollouts, which run Senders
+against Environment; dagger/best_cwnd.py uses it to sweep fixed cwnds.
+"""
+
+import numpy as np
+import wire
+from sender import Sender
+from emulator import MTU, HEADER_BYTES, open_trace, parse_mahimahi_cmd
+import project_root
+from helpers.helpers import apply_op
+
+
+# a Sender datagram, struct header and payload, as Sender counts bytes
+DATAGRAM_BYTES = wire.DATA_HEADER.size + 1400
+# and on the wire, with IPv4 and UDP headers
+PACKET_BYTES = DATAGRAM_BYTES + HEADER_BYTES
+
+
+def affine_actions(action_mapping):
+    """Returns (scale, shift) arrays so that action a maps cwnd to
+    cwnd * scale[a] + shift[a], as apply_op() does one cwnd at a time.
+    """
+    action_cnt = len(action_mapping)
+    scale = np.empty(action_cnt)
+    shift = np.empty(action_cnt)
+
+    for a in xrange(action_cnt):
+        op, val = action_mapping[a]
+        shift[a] = apply_op(op, 0.0, val)
+        scale[a] = apply_op(op, 1.0, val) - shift[a]
+
+    return scale, shift
+
+
+class FluidBatchEnv(object):
+    """num_envs simulated links. reset() returns the first states, and
+    step(actions) applies one action per link and returns the next states,
+    shaped [num_envs, state_dim].
+    """
+
+    def __init__(self, traces, delays, queues=None, loss_rates=None,
+                 features=Sender.features, step_len_ms=10,
+                 max_steps=Sender.max_steps, trace_cache=None):
+        """
+        Args:
+            traces: downlink trace path of each link.
+            delays: one-way delay (ms) of each link.
+            queues: droptail queue (packets) of each link, None or inf for
+                an infinite queue.
+            loss_rates: random loss rate of each link.
+            trace_cache: dict that caches opened traces by path.
+        """
+        self.num_envs = len(traces)
+        self.features = features
+        self.step_len_ms = step_len_ms
+        self.max_steps = max_steps
+
+        n = self.num_envs
+        self.base_rtt = 2.0 * np.asarray(delays, dtype=np.float64)
+
+        if queues is None:
+            queues = [None] * n
+        self.queue_limit = np.array(
+            [np.inf if q is None else q * PACKET_BYTES for q in queues])
+
+        if loss_rates is None:
+            loss_rates = np.zeros(n)
+        self.loss_rate = np.asarray(loss_rates, dtype=np.float64)
+
+        self.load_traces(traces, {} if trace_cache is None else trace_cache)
+
+        self.scale, self.shift = affine_actions(Sender.action_mapping)
+        self.reset()
+
+    @classmethod
+    def from_mahimahi_cmds(cls, mahimahi_cmds, **kwargs):
+        """Links described by mahimahi commands as built by create_env(),
+        with data on the downlink as in Environment.
+        """
+        traces, delays, queues, loss_rates = [], [], [], []
+
+        for mahimahi_cmd in mahimahi_cmds:
+            delay, loss_rate = 0.0, 0.0
+            trace = queue = None
+
+            for shell in parse_mahimahi_cmd(mahimahi_cmd):
+                if shell[0] == 'delay':
+                    delay += shell[1]
+                elif shell[0] == 'loss':
+                    if shell[1] == 'downlink':
+                        loss_rate = 1 - (1 - loss_rate) * (1 - shell[2])
+                elif trace is None:
+                    _, _, trace, _, queue = shell
+                else:
+                    raise ValueError('more than one mm-link: %s' %
+                                     mahimahi_cmd)
+
+            if trace is None:
+                raise ValueError('no mm-link: %s' % mahimahi_cmd)
+
+            traces.append(trace)
+            delays.append(delay)
+            queues.append(queue)
+            loss_rates.append(loss_rate)
+
+        return cls(traces, delays, queues, loss_rates, **kwargs)
+
+    def load_traces(self, trace_paths, trace_cache):
+        """Lays the cumulative delivery opportunities of every distinct
+        trace out in one array, so that opportunities() can look up all
+        links with one fancy index.
+        """
+        offsets = {}
+        cums = []
+        size = 0
+
+        for trace_path in trace_paths:
+            if trace_path in offsets:
+                continue
+            if trace_path not in trace_cache:
+                trace_cache[trace_path] = open_trace(trace_path)
+            # cum[t]: opportunities at or before t ms into a period
+            trace, cum = trace_cache[trace_path]
+
+            offsets[trace_path] = (size, trace[-1], len(trace))
+            cums.append(cum)
+            size += len(cum)
+
+        self.cum = np.concatenate(cums)
+        self.cum_offset, self.period, self.period_opps = [
+            np.array(col, dtype=np.int64)
+            for col in zip(*[offsets[p] for p in trace_paths])]
+
+        # average delivery rate in bytes per ms
+        self.avg_rate = (self.period_opps * MTU /
+                         self.period.astype(np.float64))
+
+    def opportunities(self, t):
+        """Delivery opportunities of each link in (0, t] ms."""
+        periods, rem = np.divmod(t, self.period)
+        return periods * self.period_opps + self.cum[self.cum_offset + rem]
+
+    def reset(self):
+        """Starts a new episode on every link; returns the first states."""
+        n = self.num_envs
+
+        self.step_cnt = 0
+        self.now = 0
+        self.cwnd = np.full(n, 10.0)
+        self.queue = np.zeros(n)
+        self.min_rtt = self.base_rtt.copy()
+
+        self.delivered = np.zeros(n)
+        self.step_rtts = []
+
+        self.samples = {
+            'delay': np.zeros(n),
+            'delivery_rate': np.zeros(n),
+            'send_rate': np.zeros(n),
+        }
+        return self.states()
+
+    def states(self):
+        state = np.empty([self.num_envs, len(self.features)])
+        for i, f in enumerate(self.features):
+            state[:, i] = self.cwnd if f.field == 'cwnd' else \
+                self.samples[f.field]
+        return state
+
+    def step(self, actions):
+        """Applies actions (indices into Sender.action_mapping) and advances
+        every link by one step.
+
+        Returns:
+            states, rewards and done. rewards are all 0 but at the episode's
+            last step, where they are Sender.compute_performance() of each
+            link: 10 * throughput (Mbps) - 95th percentile RTT (ms).
+        """
+        actions = np.asarray(actions)
+        self.cwnd = np.maximum(
+            2.0, self.cwnd * self.scale[actions] + self.shift[actions])
+
+        dt = self.step_len_ms
+        capacity = MTU * (self.opportunities(self.now + dt) -
+                                 self.opportunities(self.now))
+        self.now += dt
+
+        # window-limited sending at the RTT the queue builds up; the queue
+        # and the link carry whole packets, headers included
+        rtt = self.base_rtt + self.queue / self.avg_rate
+        packets = self.cwnd * dt / rtt
+
+        backlog = self.queue + PACKET_BYTES * packets
+        served = np.minimum(backlog, capacity)
+        queue = np.minimum(backlog - served, self.queue_limit)
+
+        # Sender counts datagram bytes, without IPv4 and UDP headers
+        sent = DATAGRAM_BYTES * packets
+        delivered = (DATAGRAM_BYTES / float(PACKET_BYTES) * served *
+                     (1 - self.loss_rate))
+        self.delivered += delivered
+
+        # samples at the average queue of the step
+        rtt = self.base_rtt + 0.5 * (self.queue + queue) / self.avg_rate
+        self.queue = queue
+        self.min_rtt = np.minimum(self.min_rtt, rtt)
+        self.step_rtts.append(rtt)
+
+        self.samples['delay'] = rtt - self.min_rtt
+        self.samples['delivery_rate'] = 0.008 * delivered / dt
+        self.samples['send_rate'] = 0.008 * sent / dt
+
+        self.step_cnt += 1
+        done = self.step_cnt >= self.max_steps
+
+        rewards = np.zeros(self.num_envs)
+        if done:
+            tput = 0.008 * self.delivered / self.now
+            perc_delay = np.percentile(self.step_rtts, 95, axis=0)
+            rewards = 10 * tput - perc_delay
+
+        return self.states(), rewards, done
@@ -0,0 +1,185 @@
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+import sys
+import socket
+import select
+import wire
+from receiver import handshake_backoff, ack_data, flush_due_ack
+from helpers.batch_io import would_block
+from helpers.clock import DEFAULT_CLOCK
+from helpers.helpers import (
+    LoopStats, EPOLL_ERR_FLAGS, EPOLL_READ_FLAGS)
+
+
+class Peer(object):
+    """Handshake and ACK state of one sender served by a MultiReceiver."""
+
+    def __init__(self, addr, coalescer=None, min_retry_ms=0):
+        self.addr = addr
+        self.coalescer = coalescer
+
+        self.established = False
+        self.backoff = handshake_backoff(min_retry_ms)
+        self.next_hello_us = 0  # greet right away
+
+
+class MultiReceiver(object):
+    """Serves many senders from one socket and one event loop.
+
+    Datagrams are demultiplexed by source address. Each peer has its own
+    handshake state, with the same greeting and backoff as
+    Receiver.handshake(), and its own ACK coalescer. ACKs are built by the
+    same functions Receiver uses.
+    """
+
+    def __init__(self, ack_count=1, ack_delay_us=1000, min_retry_ms=0,
+                 clock=None):
+        self.ack_count = ack_count
+        self.ack_delay_us = ack_delay_us
+        self.min_retry_ms = min_retry_ms
+        self.clock = clock or DEFAULT_CLOCK
+
+        self.peers = {}
+        # peers with a pending hello or coalesced ACK
+        self.timed = set()
+
+        # wakeups and idle time of the event loop
+        self.loop_stats = LoopStats()
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.setblocking(0)  # non-blocking UDP socket
+
+    def cleanup(self):
+        self.sock.close()
+
+    def add_peer(self, ip, port):
+        """Start serving the sender at (ip, port)."""
+        coalescer = None
+        if self.ack_count > 1:
+            coalescer = wire.AckCoalescer(self.ack_count, self.ack_delay_us)
+
+        peer = Peer((ip, port), coalescer, self.min_retry_ms)
+        self.peers[peer.addr] = peer
+        self.timed.add(peer)
+
+    def remove_peer(self, ip, port):
+        peer = self.peers.pop((ip, port), None)
+        self.timed.discard(peer)
+
+    def greet(self, peer):
+        # offer the struct wire format; protobuf senders ignore it
+        self.send(wire.WIRE_OFFER, peer.addr)
+        self.send(wire.HELLO, peer.addr)
+
+    def send(self, msg, addr):
+        try:
+            self.sock.sendto(msg, addr)
+        except socket.error as e:
+            # a full socket buffer drops the datagram like a lossy link would
+            if not would_block(e):
+                raise
+
+    def run_timers(self):
+        """Greets peers whose handshake is due and sends due coalesced ACKs.
+        Returns the seconds until the next timer, or -1 if none is pending.
+        """
+        now_us = self.clock.now_us()
+        next_us = None
+
+        for peer in list(self.timed):
+            if not peer.established:
+                if now_us >= peer.next_hello_us:
+                    wait_ms = peer.backoff.next_ms()
+                    if wait_ms is None:
+                        sys.stderr.write(
+                            '[receiver] Handshake with %s:%s failed after '
+                            '%d retries\n' % (peer.addr + (
+                                peer.backoff.attempts,)))
+                        self.remove_peer(*peer.addr)
+                        continue
+
+                    self.greet(peer)
+                    peer.next_hello_us = now_us + 1000 * wait_ms
+
+                timeout_us = peer.next_hello_us - now_us
+            else:
+                ack, timeout_us = flush_due_ack(peer.coalescer, self.clock)
+                if ack is not None:
+                    self.send(ack, peer.addr)
+                if timeout_us is None:
+                    self.timed.discard(peer)
+                    continue
+
+            next_us = timeout_us if next_us is None else min(next_us,
+                                                             timeout_us)
+
+        if next_us is None:
+            return -1
+        # epoll waits whole milliseconds, so round up
+        return (next_us + 999) // 1000 / 1000.0
+
+    def run(self):
+        """Edge-triggered epoll event loop over the shared socket."""
+        self.loop_stats.reset()
+
+        epoller = select.epoll()
+        epoller.register(self.sock, EPOLL_READ_FLAGS)
+
+        try:
+            while True:
+                timeout = self.run_timers()
+
+                self.loop_stats.wait_begin()
+                events = epoller.poll(timeout)
+                self.loop_stats.wait_end()
+
+                for fd, flag in events:
+                    if flag & EPOLL_ERR_FLAGS:
+                        sys.exit('Channel closed or error occurred')
+
+                    if flag & select.EPOLLIN:
+                        self.drain()
+        finally:
+            epoller.close()
+
+    def drain(self):
+        while True:
+            try:
+                msg, addr = self.sock.recvfrom(1600)
+            except socket.error as e:
+                if would_block(e):
+                    return
+                raise
+
+            peer = self.peers.get(addr)
+            if peer is None:
+                continue
+
+            if not peer.established:
+                peer.established = True
+                self.timed.discard(peer)
+
+            if msg == 'Hello from sender':
+                continue
+
+            # 'Hello from sender' was presumably lost if this is the first
+            # datagram from the peer; ack the data either way
+            ack = ack_data(msg, peer.coalescer, self.clock)
+            if ack is not None:
+                self.send(ack, addr)
+            else:  # held by the coalescer
+                self.timed.add(peer)
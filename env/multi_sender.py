@@ -0,0 +1,151 @@
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+import sys
+import select
+from action_sampler import BatchedActionSampler
+from helpers.clock import monotonic
+from helpers.helpers import (
+    LoopStats, READ_FLAGS, ERR_FLAGS, READ_ERR_FLAGS,
+    EPOLL_ERR_FLAGS, EPOLL_READ_FLAGS, EPOLL_ALL_FLAGS)
+
+
+class MultiSender(object):
+    """Hosts many Senders in one process and one event loop.
+
+    The step states of all flows that come due in the same tick are sampled
+    with one sample_actions(flow_ids, states) call, where flow ids are the
+    indices into senders, and the actions are applied right after.
+    """
+
+    def __init__(self, senders, sample_actions):
+        self.senders = senders
+        self.batch = BatchedActionSampler(sample_actions)
+
+        self.fd_map = {}
+        for flow_id, sender in enumerate(senders):
+            sender.set_action_sampler(self.batch.flow(flow_id))
+            self.fd_map[sender.sock.fileno()] = sender
+
+        # forward passes and the flows served by them
+        self.batch_calls = 0
+        self.batch_rows = 0
+        self.loop_stats = LoopStats()
+
+    def cleanup(self):
+        for sender in self.senders:
+            sender.cleanup()
+
+    def handshake(self):
+        """Handshake with every peer receiver. Must be called before run()."""
+        poller = select.poll()
+        for fd in self.fd_map:
+            poller.register(fd, READ_ERR_FLAGS)
+
+        waiting = len(self.fd_map)
+        while waiting > 0:
+            for fd, flag in poller.poll():
+                if flag & ERR_FLAGS:
+                    sys.exit('Error occurred to the channel')
+
+                if flag & READ_FLAGS:
+                    sender = self.fd_map[fd]
+                    msg, addr = sender.sock.recvfrom(1600)
+
+                    if sender.handle_handshake_msg(msg, addr):
+                        sender.sock.setblocking(0)
+                        poller.unregister(fd)
+                        waiting -= 1
+
+    def run(self):
+        """Edge-triggered epoll loop over all flows, as in Sender.run_epoll().
+        Returns when no sender is running anymore.
+        """
+        TIMEOUT = 1.0  # s
+
+        epoller = select.epoll()
+        for fd in self.fd_map:
+            epoller.register(fd, EPOLL_READ_FLAGS)
+
+        write_armed = set()
+        ready = self.fd_map.keys()
+
+        last_check = monotonic()
+        acks_seen = [sender.acks_processed for sender in self.senders]
+        self.loop_stats.reset()
+
+        try:
+            while any(sender.running for sender in self.senders):
+                # fill the windows of flows that got ACKs or became writable
+                for fd in ready:
+                    sender = self.fd_map[fd]
+                    if not sender.running or fd in write_armed:
+                        continue
+
+                    if not sender.fill_window():
+                        epoller.modify(fd, EPOLL_ALL_FLAGS)
+                        write_armed.add(fd)
+
+                self.loop_stats.wait_begin()
+                events = epoller.poll(TIMEOUT)
+                self.loop_stats.wait_end()
+
+                # like Sender.run(), send one datagram to recover a flow that
+                # got no ACK for TIMEOUT, even while other flows are busy
+                now = monotonic()
+                if now - last_check >= TIMEOUT:
+                    for i, sender in enumerate(self.senders):
+                        if (sender.running and
+                                sender.acks_processed == acks_seen[i] and
+                                not sender.try_send()):
+                            # buffer full: fill the window once writable
+                            fd = sender.sock.fileno()
+                            if fd not in write_armed:
+                                epoller.modify(fd, EPOLL_ALL_FLAGS)
+                                write_armed.add(fd)
+                        acks_seen[i] = sender.acks_processed
+                    last_check = now
+
+                ready = []
+                for fd, flag in events:
+                    sender = self.fd_map[fd]
+
+                    if flag & EPOLL_ERR_FLAGS:
+                        sys.exit('Error occurred to the channel')
+
+                    if flag & select.EPOLLIN:
+                        sender.drain_acks()
+
+                    if flag & select.EPOLLOUT:
+                        epoller.modify(fd, EPOLL_READ_FLAGS)
+                        write_armed.discard(fd)
+
+                    ready.append(fd)
+
+                self.run_batch()
+        finally:
+            epoller.close()
+
+    def run_batch(self):
+        """One forward pass for every flow whose step ended this tick."""
+        flow_ids = self.batch.flush()
+        if not flow_ids:
+            return
+
+        self.batch_calls += 1
+        self.batch_rows += len(flow_ids)
+
+        for flow_id in flow_ids:
+            self.senders[flow_id].apply_pending_action()
@@ -0,0 +1,162 @@
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+import sys
+import select
+import signal
+import multiprocessing
+from sender import Sender
+from environment import Environment
+import project_root
+from helpers.helpers import READ_ERR_FLAGS, ERR_FLAGS
+
+
+def serve_environment(conn, mahimahi_cmd, persistent, emulate):
+    """Runs one Environment in a child process, on the commands of a
+    ParallelEnvironment, asking it for every action.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the parent cleans up
+
+    env = Environment(mahimahi_cmd, persistent=persistent, emulate=emulate)
+
+    def sample_action(state):
+        conn.send(('state', state))
+        return conn.recv()
+
+    env.set_sample_action(sample_action)
+
+    try:
+        while True:
+            cmd = conn.recv()
+            if cmd == 'reset':
+                env.reset()
+                conn.send(('reset', (env.reset_time, env.reset_timings)))
+            elif cmd == 'rollout':
+                conn.send(('done', env.rollout()))
+            else:  # 'stop'
+                break
+    finally:
+        env.cleanup()
+
+
+class ParallelEnvironment(object):
+    """num_envs Environments run in child processes, each with its own
+    port, mahimahi shell and receiver, and stepped at the same time.
+
+    The states that reach the parent together are sampled with one
+    sample_actions(env_ids, states) call, where env ids are indices into
+    mahimahi_cmds, so the policy and its TensorFlow session stay in the
+    parent.
+    """
+
+    def __init__(self, mahimahi_cmds, persistent=False, emulate=False):
+        self.num_envs = len(mahimahi_cmds)
+        self.state_dim = Sender.state_dim
+        self.action_cnt = Sender.action_cnt
+        self.reset_time = None
+        self.reset_timings = {}
+
+        self.conns = []
+        self.procs = []
+        for mahimahi_cmd in mahimahi_cmds:
+            conn, child_conn = multiprocessing.Pipe()
+            proc = multiprocessing.Process(
+                target=serve_environment,
+                args=(child_conn, mahimahi_cmd, persistent, emulate))
+            proc.daemon = True
+            proc.start()
+            child_conn.close()
+
+            self.conns.append(conn)
+            self.procs.append(proc)
+
+    def set_sample_actions(self, sample_actions):
+        """Set the batched policy. Must be called before calling rollout()."""
+
+        self.sample_actions = sample_actions
+
+    def reset(self):
+        """Resets every environment in parallel. Must be called before
+        running rollout().
+        """
+        for conn in self.conns:
+            conn.send('reset')
+
+        # environments reset in parallel, so the slowest one counts
+        self.reset_time = 0.0
+        self.reset_timings = {}
+        for conn in self.conns:
+            reset_time, reset_timings = conn.recv()[1]
+            self.reset_time = max(self.reset_time, reset_time)
+            for phase, seconds in reset_timings.iteritems():
+                self.reset_timings[phase] = max(
+                    self.reset_timings.get(phase, 0.0), seconds)
+        sys.stderr.write('Reset of %d environments took %.3f s\n' %
+                         (self.num_envs, self.reset_time))
+
+    def rollout(self):
+        """Runs an episode in every environment; returns their final
+        rewards, by env id.
+        """
+        sys.stderr.write('Obtaining %d episodes from environments...\n' %
+                         self.num_envs)
+
+        poller = select.poll()
+        fd_map = {}
+        for env_id, conn in enumerate(self.conns):
+            poller.register(conn.fileno(), READ_ERR_FLAGS)
+            fd_map[conn.fileno()] = env_id
+            conn.send('rollout')
+
+        rewards = [None] * self.num_envs
+        running = self.num_envs
+        while running > 0:
+            env_ids = []
+            states = []
+
+            for fd, flag in poller.poll():
+                env_id = fd_map[fd]
+                if flag & ERR_FLAGS:
+                    sys.exit('Environment %d exited' % env_id)
+
+                msg, value = self.conns[env_id].recv()
+                if msg == 'state':
+                    env_ids.append(env_id)
+                    states.append(value)
+                else:  # 'done'
+                    rewards[env_id] = value
+                    poller.unregister(fd)
+                    running -= 1
+
+            if env_ids:
+                actions = self.sample_actions(env_ids, states)
+                for env_id, action in zip(env_ids, actions):
+                    self.conns[env_id].send(action)
+
+        return rewards
+
+    def cleanup(self):
+        for conn, proc in zip(self.conns, self.procs):
+            try:
+                conn.send('stop')
+            except IOError:
+                pass
+
+            proc.join(10)
+            if proc.is_alive():
+                proc.terminate()
+
+        self.conns = []
+        self.procs = []
@@ -18,13 +18,95 @@ import json
 import socket
 import select
 import datagram_pb2
+import wire
 import project_root
-from helpers.helpers import READ_FLAGS, ERR_FLAGS, READ_ERR_FLAGS, ALL_FLAGS
+from helpers.batch_io import would_block
+from helpers.clock import DEFAULT_CLOCK
+from helpers.helpers import (
+    Backoff, LoopStats, READ_FLAGS, ERR_FLAGS, READ_ERR_FLAGS, ALL_FLAGS,
+    EPOLL_ERR_FLAGS, EPOLL_READ_FLAGS)
+
+
+# initial, maximum and total wait (ms) between hellos of the handshake
+HANDSHAKE_BACKOFF = (5, 1000, 10000)
+
+
+def handshake_backoff(min_retry_ms=0):
+    """Backoff between hellos that never greets again sooner than
+    min_retry_ms, e.g. the RTT, after which a reply could have come.
+    """
+    initial_ms, max_ms, total_ms = HANDSHAKE_BACKOFF
+    return Backoff(max(initial_ms, min_retry_ms),
+                   max(max_ms, min_retry_ms), total_ms)
+
+
+def construct_ack_from_data(serialized_data):
+    """Construct a serialized ACK that acks a serialized datagram."""
+    if wire.is_struct(serialized_data):
+        return wire.construct_ack(serialized_data)
+
+    data = datagram_pb2.Data()
+    data.ParseFromString(serialized_data)
+
+    ack = datagram_pb2.Ack()
+    ack.seq_num = data.seq_num
+    ack.send_ts = data.send_ts
+    ack.sent_bytes = data.sent_bytes
+    ack.delivered_time = data.delivered_time
+    ack.delivered = data.delivered
+    ack.ack_bytes = len(serialized_data)
+
+    return ack.SerializeToString()
+
+
+def ack_data(serialized_data, coalescer=None, clock=DEFAULT_CLOCK):
+    """Returns the ACK to send for a datagram now, or None if it is held
+    for a coalesced ACK. A reset request drops the held ACK, which belongs
+    to the previous episode, and is answered at once.
+    """
+    if wire.is_reset(serialized_data):
+        if coalescer:
+            coalescer.reset()
+        return wire.reset_ack(serialized_data)
+
+    if coalescer and wire.is_struct(serialized_data):
+        now_us = clock.now_us()
+        if coalescer.add(serialized_data, now_us):
+            return coalescer.flush(now_us)
+        return None
+
+    return construct_ack_from_data(serialized_data)
+
+
+def flush_due_ack(coalescer, clock=DEFAULT_CLOCK):
+    """Returns the coalesced ACK if its time is up, or None, and the
+    microseconds until the next one is due, or None if none is pending.
+    """
+    now_us = clock.now_us()
+    timeout_us = coalescer.timeout_us(now_us)
+    if timeout_us == 0:
+        return coalescer.flush(now_us), None
+    return None, timeout_us
 
 
 class Receiver(object):
-    def __init__(self, ip, port):
+    def __init__(self, ip, port, io_backend='blocking', ack_count=1,
+                 ack_delay_us=1000, min_retry_ms=0, clock=None):
         self.peer_addr = (ip, port)
+        self.io_backend = io_backend
+        self.clock = clock or DEFAULT_CLOCK
+
+        # do not greet again before a reply to the last hello could arrive
+        self.min_retry_ms = min_retry_ms
+
+        # delayed ACKs: one coalesced ACK per ack_count struct datagrams or
+        # per ack_delay_us, whichever comes first; protobuf is acked at once
+        self.coalescer = None
+        if ack_count > 1:
+            self.coalescer = wire.AckCoalescer(ack_count, ack_delay_us)
+
+        # wakeups and idle time of the event loop
+        self.loop_stats = LoopStats()
 
         # UDP socket and poller
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -38,44 +120,31 @@ class Receiver(object):
 
     def construct_ack_from_data(self, serialized_data):
         """Construct a serialized ACK that acks a serialized datagram."""
-
-        data = datagram_pb2.Data()
-        data.ParseFromString(serialized_data)
-
-        ack = datagram_pb2.Ack()
-        ack.seq_num = data.seq_num
-        ack.send_ts = data.send_ts
-        ack.sent_bytes = data.sent_bytes
-        ack.delivered_time = data.delivered_time
-        ack.delivered = data.delivered
-        ack.ack_bytes = len(serialized_data)
-
-        return ack.SerializeToString()
+        return construct_ack_from_data(serialized_data)
 
     def handshake(self):
         """Handshake with peer sender. Must be called before run()."""
 
         self.sock.setblocking(0)  # non-blocking UDP socket
 
-        TIMEOUT = 1000  # ms
-
-        retry_times = 0
+        # greet again soon if the sender was not listening yet, then back off
+        backoff = handshake_backoff(self.min_retry_ms)
         self.poller.modify(self.sock, READ_ERR_FLAGS)
 
         while True:
-            self.sock.sendto('Hello from receiver', self.peer_addr)
-            events = self.poller.poll(TIMEOUT)
+            timeout = backoff.next_ms()
+            if timeout is None:
+                sys.stderr.write('[receiver] Handshake failed after %d '
+                                 'retries\n' % backoff.attempts)
+                return
+
+            # offer the struct wire format; protobuf senders ignore it
+            self.sock.sendto(wire.WIRE_OFFER, self.peer_addr)
+            self.sock.sendto(wire.HELLO, self.peer_addr)
+            events = self.poller.poll(timeout)
 
             if not events:  # timed out
-                retry_times += 1
-                if retry_times > 10:
-                    sys.stderr.write(
-                        '[receiver] Handshake failed after 10 retries\n')
-                    return
-                else:
-                    sys.stderr.write(
-                        '[receiver] Handshake timed out and retrying...\n')
-                    continue
+                continue
 
             for fd, flag in events:
                 assert self.sock.fileno() == fd
@@ -96,12 +165,95 @@ class Receiver(object):
                         return
 
     def run(self):
+        if self.io_backend == 'epoll':
+            return self.run_epoll()
+
         self.sock.setblocking(1)  # blocking UDP socket
+        self.loop_stats.reset()
 
+        timeout = None
         while True:
-            serialized_data, addr = self.sock.recvfrom(1600)
+            # wake up in time for a pending coalesced ACK
+            if self.coalescer:
+                ack, timeout_us = flush_due_ack(self.coalescer, self.clock)
+                if ack is not None:
+                    self.sock.sendto(ack, self.peer_addr)
+
+                new_timeout = None if timeout_us is None else timeout_us / 1e6
+                if new_timeout != timeout:
+                    timeout = new_timeout
+                    self.sock.settimeout(timeout)
+
+            self.loop_stats.wait_begin()
+            try:
+                serialized_data, addr = self.sock.recvfrom(1600)
+            except socket.timeout:
+                continue
+            finally:
+                self.loop_stats.wait_end()
 
             if addr == self.peer_addr:
-                ack = self.construct_ack_from_data(serialized_data)
+                ack = self.ack_data(serialized_data)
                 if ack is not None:
                     self.sock.sendto(ack, self.peer_addr)
+
+    def ack_data(self, serialized_data):
+        return ack_data(serialized_data, self.coalescer, self.clock)
+
+    def run_epoll(self):
+        """Edge-triggered epoll event loop that acks every datagram readable
+        at each wakeup before waiting again.
+        """
+        self.sock.setblocking(0)  # non-blocking UDP socket
+        self.loop_stats.reset()
+
+        epoller = select.epoll()
+        epoller.register(self.sock, EPOLL_READ_FLAGS)
+
+        try:
+            while True:
+                timeout = -1
+                if self.coalescer:
+                    ack, timeout_us = flush_due_ack(self.coalescer, self.clock)
+                    if ack is not None:
+                        self.send_ack(ack)
+                    if timeout_us is not None:
+                        # epoll waits whole milliseconds, so round up
+                        timeout = (timeout_us + 999) // 1000 / 1000.0
+
+                self.loop_stats.wait_begin()
+                events = epoller.poll(timeout)
+                self.loop_stats.wait_end()
+
+                for fd, flag in events:
+                    if flag & EPOLL_ERR_FLAGS:
+                        sys.exit('Channel closed or error occurred')
+
+                    if flag & select.EPOLLIN:
+                        self.drain()
+        finally:
+            epoller.close()
+
+    def drain(self):
+        while True:
+            try:
+                serialized_data, addr = self.sock.recvfrom(1600)
+            except socket.error as e:
+                if would_block(e):
+                    return
+                raise
+
+            if addr != self.peer_addr:
+                continue
+
+            ack = self.ack_data(serialized_data)
+            if ack is not None:
+                self.send_ack(ack)
+
+    def send_ack(self, ack):
+        try:
+            self.sock.sendto(ack, self.peer_addr)
+        except socket.error as e:
+            # a full socket buffer drops the ACK like a lossy link would
+            if not would_block(e):
+                raise
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+import sys
+import argparse
+from multi_receiver import MultiReceiver
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('ip', metavar='IP')
+    parser.add_argument('ports', metavar='PORT', type=int, nargs='+',
+                        help='ports of the senders to serve')
+    parser.add_argument('--ack-count', type=int, default=1,
+                        help='coalesce ACKs of up to this many struct '
+                        'datagrams (default: 1, i.e. ack every datagram)')
+    parser.add_argument('--ack-delay-us', type=int, default=1000,
+                        help='max time to hold a coalesced ACK '
+                        '(default: 1000)')
+    parser.add_argument('--min-retry-ms', type=int, default=0,
+                        help='never greet the sender again sooner than '
+                        'this, e.g. the RTT (default: 0)')
+    args = parser.parse_args()
+
+    receiver = MultiReceiver(ack_count=args.ack_count,
+                             ack_delay_us=args.ack_delay_us,
+                             min_retry_ms=args.min_retry_ms)
+    for port in args.ports:
+        receiver.add_peer(args.ip, port)
+
+    try:
+        receiver.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stats = receiver.loop_stats.summary()
+        sys.stderr.write('[receiver] %.0f wakeups/s, %.1f%% idle\n' %
+                         (stats['wakeups_per_sec'], 100 * stats['idle_frac']))
+        receiver.cleanup()
+
+
+if __name__ == '__main__':
+    main()
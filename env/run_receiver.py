@@ -15,6 +15,7 @@
 #     limitations under the License.
 
 
+import sys
 import argparse
 from receiver import Receiver
 
@@ -23,9 +24,24 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('ip', metavar='IP')
     parser.add_argument('port', type=int)
+    parser.add_argument('--io-backend', choices=['blocking', 'epoll'],
+                        default='blocking',
+                        help='event loop backend (default: blocking)')
+    parser.add_argument('--ack-count', type=int, default=1,
+                        help='coalesce ACKs of up to this many struct '
+                        'datagrams (default: 1, i.e. ack every datagram)')
+    parser.add_argument('--ack-delay-us', type=int, default=1000,
+                        help='max time to hold a coalesced ACK '
+                        '(default: 1000)')
+    parser.add_argument('--min-retry-ms', type=int, default=0,
+                        help='never greet the sender again sooner than '
+                        'this, e.g. the RTT (default: 0)')
     args = parser.parse_args()
 
-    receiver = Receiver(args.ip, args.port)
+    receiver = Receiver(args.ip, args.port, io_backend=args.io_backend,
+                        ack_count=args.ack_count,
+                        ack_delay_us=args.ack_delay_us,
+                        min_retry_ms=args.min_retry_ms)
 
     try:
         receiver.handshake()
@@ -33,6 +49,9 @@ def main():
     except KeyboardInterrupt:
         pass
     finally:
+        stats = receiver.loop_stats.summary()
+        sys.stderr.write('[receiver] %.0f wakeups/s, %.1f%% idle\n' %
+                         (stats['wakeups_per_sec'], 100 * stats['idle_frac']))
         receiver.cleanup()
 
 
@@ -6,10 +6,17 @@ import select
 from os import path
 import numpy as np
 import datagram_pb2
+import wire
 import project_root
+from action_sampler import AsyncActionSampler
+from helpers.batch_io import BatchSocketIO
+from helpers.clock import DEFAULT_CLOCK, monotonic
+from helpers.features import STATE_FEATURES, StepFeatures
 from helpers.helpers import (
-    curr_ts_ms, apply_op,
-    READ_FLAGS, ERR_FLAGS, READ_ERR_FLAGS, WRITE_FLAGS, ALL_FLAGS)
+    apply_op, LoopStats, RingBuffer, QuantileSketch,
+    READ_FLAGS, ERR_FLAGS, READ_ERR_FLAGS, WRITE_FLAGS, ALL_FLAGS,
+    EPOLL_ERR_FLAGS, EPOLL_READ_FLAGS, EPOLL_ALL_FLAGS)
+from helpers.batch_io import would_block
 
 
 def format_actions(action_list):
@@ -26,16 +33,27 @@ def format_actions(action_list):
 class Sender(object):
     # RL exposed class/static variables
     max_steps = 1000
-    state_dim = 4
+    features = STATE_FEATURES
+    state_dim = len(features)
     action_mapping = format_actions(["/2.0", "-10.0", "+0.0", "+10.0", "*2.0"])
     action_cnt = len(action_mapping)
 
-    def __init__(self, port=0, train=False, debug=False):
+    def __init__(self, port=0, train=False, debug=False, batch_io=False,
+                 wire_format='protobuf', io_backend='poll',
+                 async_inference=False, clock=None):
         self.train = train
         self.debug = debug
+        self.batch_io = batch_io
+        self.io_backend = io_backend
+        self.async_inference = async_inference
+
+        # preferred wire format; protobuf unless the receiver offers struct
+        self.preferred_wire_format = wire_format
+        self.wire_format = 'protobuf'
 
         # UDP socket and poller
         self.peer_addr = None
+        self.offered_addrs = set()
 
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
@@ -48,99 +66,201 @@ class Sender(object):
 
         self.dummy_payload = 'x' * 1400
 
+        # drain ACKs and fill the window with vectorized syscalls
+        if self.batch_io:
+            self.batch_sock = BatchSocketIO(self.sock)
+
+        # one reusable datagram per packet that can be in flight in a batch
+        self.data_writer = wire.DataWriter(
+            self.dummy_payload,
+            self.batch_sock.max_batch if self.batch_io else 1)
+
         if self.debug:
             self.sampling_file = open(path.join(project_root.DIR, 'env', 'sampling_time'), 'w', 0)
 
+        self.step_len_ms = 10
+        self.async_sampler = None
+
+        # source of every timestamp; the link emulator's is simulated
+        self.clock = clock or DEFAULT_CLOCK
+
+        # wakeups and idle time of the event loop
+        self.loop_stats = LoopStats()
+
+        self.episode = 0
+        self.reset_episode()
+
+    def reset_episode(self):
+        """Reset the congestion control and per-episode state, keeping the
+        socket, the peer and the wire format, to start another episode.
+        """
+        if self.async_sampler:
+            self.async_sampler.cancel()
+
         # congestion control related
         self.seq_num = 0
         self.next_ack = 0
         self.cwnd = 10.0
-        self.step_len_ms = 10
 
         # state variables for RLCC
         self.delivered_time = 0
         self.delivered = 0
         self.sent_bytes = 0
 
-        self.min_rtt = float('inf')
-        self.delay_ewma = None
-        self.send_rate_ewma = None
-        self.delivery_rate_ewma = None
+        # ACK fields of the current step, reduced to the state at step end
+        self.step_features = StepFeatures(Sender.features)
 
         self.step_start_ms = None
         self.running = True
 
+        # off-loop inference: ACKs processed between requesting an action
+        # and applying it, for the most recent steps
+        self.acks_processed = 0
+        self.request_acks = 0
+        self.skipped_steps = 0
+        self.staleness = RingBuffer(Sender.max_steps)
+
         if self.train:
             self.step_cnt = 0
 
             self.ts_first = None
-            self.rtt_buf = []
+            self.rtt_sketch = QuantileSketch()
 
     def cleanup(self):
+        if self.async_sampler:
+            self.async_sampler.stop()
         if self.debug and self.sampling_file:
             self.sampling_file.close()
         self.sock.close()
 
-    def handshake(self):
-        """Handshake with peer receiver. Must be called before run()."""
+    def handshake(self, timeout_ms=None):
+        """Handshake with peer receiver. Must be called before run().
+
+        Waits for the receiver's hello for up to timeout_ms, or forever if
+        it is None. Returns False if the wait timed out.
+        """
+        deadline = None
+        if timeout_ms is not None:
+            deadline = monotonic() + timeout_ms / 1000.0
 
+        self.poller.modify(self.sock, READ_ERR_FLAGS)
         while True:
-            msg, addr = self.sock.recvfrom(1600)
+            wait_ms = -1
+            if deadline is not None:
+                wait_ms = max(0, int(1000 * (deadline - monotonic())))
+
+            events = self.poller.poll(wait_ms)
+            if not events:
+                sys.stderr.write('[sender] No hello from a receiver in '
+                                 '%d ms\n' % timeout_ms)
+                return False
+
+            for fd, flag in events:
+                if flag & ERR_FLAGS:
+                    sys.exit('Channel closed or error occurred')
 
-            if msg == 'Hello from receiver' and self.peer_addr is None:
-                self.peer_addr = addr
-                self.sock.sendto('Hello from sender', self.peer_addr)
-                sys.stderr.write('[sender] Handshake success! '
-                                 'Receiver\'s address is %s:%s\n' % addr)
+            msg, addr = self.sock.recvfrom(1600)
+            if self.handle_handshake_msg(msg, addr):
                 break
 
         self.sock.setblocking(0)  # non-blocking UDP socket
+        return True
+
+    def resync(self):
+        """Start a new episode with the receiver of the previous one.
+
+        Sends the receiver a reset request until it answers, discarding
+        every datagram that arrives before the answer. The path is FIFO, so
+        the ACKs of the previous episode, and the datagrams still queued
+        towards the receiver, are all gone by then. Answers to the retries
+        that come later are dropped by recv(). Returns False if the
+        receiver does not answer.
+        """
+        TIMEOUT = 100  # ms
+        RETRIES = 50
+
+        self.episode += 1
+        request = wire.RESET_FORMAT % self.episode
+        expected = wire.reset_ack(request)
+
+        self.poller.modify(self.sock, READ_ERR_FLAGS)
+        for _ in xrange(RETRIES):
+            self.sock.sendto(request, self.peer_addr)
+
+            while self.poller.poll(TIMEOUT):
+                try:
+                    msg, addr = self.sock.recvfrom(1600)
+                except socket.error as e:
+                    if would_block(e):
+                        break
+                    raise
+
+                if addr == self.peer_addr and msg == expected:
+                    return True
+
+        sys.stderr.write('[sender] Receiver did not answer the reset\n')
+        return False
+
+    def handle_handshake_msg(self, msg, addr):
+        """Process one handshake datagram. Returns True once the peer
+        receiver is known and has been greeted.
+        """
+        # receivers that parse the struct format offer it before hello
+        if msg == wire.WIRE_OFFER:
+            self.offered_addrs.add(addr)
+            return False
+
+        if msg == wire.HELLO and self.peer_addr is None:
+            self.peer_addr = addr
+            if (self.preferred_wire_format == 'struct' and
+                    addr in self.offered_addrs):
+                self.wire_format = 'struct'
+
+            self.sock.sendto('Hello from sender', self.peer_addr)
+            sys.stderr.write('[sender] Handshake success! '
+                             'Receiver\'s address is %s:%s\n' % addr)
+            sys.stderr.write('[sender] Using %s wire format\n' %
+                             self.wire_format)
+            return True
+
+        return False
+
+    def set_action_sampler(self, action_sampler):
+        """Use an external sampler with the AsyncActionSampler interface,
+        e.g. one flow's slot in a cross-flow inference batch.
+        """
+        self.async_sampler = action_sampler
 
     def set_sample_action(self, sample_action):
         """Set the policy. Must be called before run()."""
 
         self.sample_action = sample_action
 
-    def update_state(self, ack):
-        """ Update the state variables listed in __init__() """
-        self.next_ack = max(self.next_ack, ack.seq_num + 1)
-        curr_time_ms = curr_ts_ms()
+        if self.async_inference:
+            if self.async_sampler:
+                self.async_sampler.stop()
+            self.async_sampler = AsyncActionSampler(sample_action)
 
-        # Update RTT
-        rtt = float(curr_time_ms - ack.send_ts)
-        self.min_rtt = min(self.min_rtt, rtt)
+    def update_state(self, acks):
+        """ Update the state variables listed in __init__() with a batch of
+        env.wire.Ack tuples received in the same wakeup.
+        """
+        curr_time_ms = self.clock.now_ms()
+        self.acks_processed += len(acks)
 
-        if self.train:
-            if self.ts_first is None:
-                self.ts_first = curr_time_ms
-            self.rtt_buf.append(rtt)
+        if self.train and self.ts_first is None:
+            self.ts_first = curr_time_ms
 
-        delay = rtt - self.min_rtt
-        if self.delay_ewma is None:
-            self.delay_ewma = delay
-        else:
-            self.delay_ewma = 0.875 * self.delay_ewma + 0.125 * delay
+        for ack in acks:
+            self.next_ack = max(self.next_ack, ack.seq_num + 1)
+            self.delivered += ack.ack_bytes
 
-        # Update BBR's delivery rate
-        self.delivered += ack.ack_bytes
-        self.delivered_time = curr_time_ms
-        delivery_rate = (0.008 * (self.delivered - ack.delivered) /
-                         max(1, self.delivered_time - ack.delivered_time))
-
-        if self.delivery_rate_ewma is None:
-            self.delivery_rate_ewma = delivery_rate
-        else:
-            self.delivery_rate_ewma = (
-                0.875 * self.delivery_rate_ewma + 0.125 * delivery_rate)
-
-        # Update Vegas sending rate
-        send_rate = 0.008 * (self.sent_bytes - ack.sent_bytes) / max(1, rtt)
+            if self.train:
+                self.rtt_sketch.add(float(curr_time_ms - ack.send_ts))
 
-        if self.send_rate_ewma is None:
-            self.send_rate_ewma = send_rate
-        else:
-            self.send_rate_ewma = (
-                0.875 * self.send_rate_ewma + 0.125 * send_rate)
+        if acks:
+            self.delivered_time = curr_time_ms
+            self.step_features.add_acks(acks, curr_time_ms, self.sent_bytes)
 
     def take_action(self, action_idx):
         old_cwnd = self.cwnd
@@ -152,59 +272,165 @@ class Sender(object):
     def window_is_open(self):
         return self.seq_num - self.next_ack < self.cwnd
 
-    def send(self):
-        data = datagram_pb2.Data()
-        data.seq_num = self.seq_num
-        data.send_ts = curr_ts_ms()
-        data.sent_bytes = self.sent_bytes
-        data.delivered_time = self.delivered_time
-        data.delivered = self.delivered
-        data.payload = self.dummy_payload
+    def construct_data(self):
+        """Serialize the next datagram and advance seq_num and sent_bytes."""
+        if self.wire_format == 'struct':
+            serialized_data = self.data_writer.pack(
+                self.seq_num, self.clock.now_ms(), self.sent_bytes,
+                self.delivered_time, self.delivered)
+        else:
+            data = datagram_pb2.Data()
+            data.seq_num = self.seq_num
+            data.send_ts = self.clock.now_ms()
+            data.sent_bytes = self.sent_bytes
+            data.delivered_time = self.delivered_time
+            data.delivered = self.delivered
+            data.payload = self.dummy_payload
 
-        serialized_data = data.SerializeToString()
-        self.sock.sendto(serialized_data, self.peer_addr)
+            serialized_data = data.SerializeToString()
 
         self.seq_num += 1
         self.sent_bytes += len(serialized_data)
+        return serialized_data
+
+    def send(self):
+        seq_num, sent_bytes = self.seq_num, self.sent_bytes
+        serialized_data = self.construct_data()
+
+        try:
+            self.sock.sendto(serialized_data, self.peer_addr)
+        except socket.error:
+            # the datagram was not sent
+            self.seq_num, self.sent_bytes = seq_num, sent_bytes
+            raise
+
+    def try_send(self):
+        """send(), unless the socket buffer is full. Returns False if so,
+        with nothing sent, to try again on the next writable event.
+        """
+        try:
+            self.send()
+        except socket.error as e:
+            if would_block(e):
+                return False
+            raise
+
+        return True
+
+    def send_batch(self):
+        """Fill the whole open window with vectorized sends."""
+        max_batch = self.batch_sock.max_batch
+
+        while self.window_is_open():
+            seq_num = self.seq_num
+            sent_bytes = [self.sent_bytes]
+
+            batch = []
+            while self.window_is_open() and len(batch) < max_batch:
+                batch.append(self.construct_data())
+                sent_bytes.append(self.sent_bytes)
+
+            sent = self.batch_sock.send_batch(batch, self.peer_addr)
+
+            # roll back datagrams that did not fit in the socket buffer
+            self.seq_num = seq_num + sent
+            self.sent_bytes = sent_bytes[sent]
+
+            if sent < len(batch):
+                break
+
+    def parse_ack(self, serialized_ack):
+        if wire.is_struct(serialized_ack):
+            return wire.parse_ack(serialized_ack)
+
+        ack = datagram_pb2.Ack()
+        ack.ParseFromString(serialized_ack)
+        return wire.Ack(ack.seq_num, ack.send_ts, ack.sent_bytes,
+                        ack.delivered_time, ack.delivered, ack.ack_bytes)
 
     def recv(self):
         serialized_ack, addr = self.sock.recvfrom(1600)
-        k=-1
 
-        if addr != self.peer_addr:
+        if addr != self.peer_addr or wire.is_control(serialized_ack):
             return
 
-        ack = datagram_pb2.Ack()
-        ack.ParseFromString(serialized_ack)
+        self.update_state([self.parse_ack(serialized_ack)])
+        return self.check_step_end()
+
+    def recv_batch(self):
+        """Drain every readable ACK and process them as one batch."""
+        acks = []
+        while True:
+            datagrams = self.batch_sock.recv_batch()
+
+            for serialized_ack, addr in datagrams:
+                if (addr == self.peer_addr and
+                        not wire.is_control(serialized_ack)):
+                    acks.append(self.parse_ack(serialized_ack))
 
-        self.update_state(ack)
+            if len(datagrams) < self.batch_sock.max_batch:
+                break
+
+        if not acks:
+            return -1
+
+        self.update_state(acks)
+        return self.check_step_end()
+
+    def request_action(self, state):
+        """Hand the state to the background sampler unless the previous
+        request is still running, in which case this step's state is
+        dropped and the current cwnd is kept.
+        """
+        if self.async_sampler.pending:
+            self.skipped_steps += 1
+            return
+
+        self.request_acks = self.acks_processed
+        self.async_sampler.submit(state)
+
+    def apply_pending_action(self):
+        action = self.async_sampler.poll()
+        if action is None:
+            return
+
+        self.take_action(action)
+
+        staleness = self.acks_processed - self.request_acks
+        self.staleness.append(staleness)
+        if self.debug:
+            self.sampling_file.write('staleness %d acks\n' % staleness)
+
+    def check_step_end(self):
+        k = -1
+
+        if self.async_sampler:
+            self.apply_pending_action()
 
         if self.step_start_ms is None:
-            self.step_start_ms = curr_ts_ms()
+            self.step_start_ms = self.clock.now_ms()
 
         # At each step end, feed the state:
-        if curr_ts_ms() - self.step_start_ms > self.step_len_ms:  # step's end
-            state = [self.delay_ewma,
-                     self.delivery_rate_ewma,
-                     self.send_rate_ewma,
-                     self.cwnd]
+        if self.clock.now_ms() - self.step_start_ms > self.step_len_ms:  # step's end
+            state = self.step_features.compute(cwnd=self.cwnd)
 
-            # time how long it takes to get an action from the NN
-            if self.debug:
-                start_sample = time.time()
+            if self.async_sampler:
+                self.request_action(state)
+            else:
+                # time how long it takes to get an action from the NN
+                if self.debug:
+                    start_sample = time.time()
 
-            action = self.sample_action(state)
+                action = self.sample_action(state)
 
-            if self.debug:
-                self.sampling_file.write('%.2f ms\n' % ((time.time() - start_sample) * 1000))
+                if self.debug:
+                    self.sampling_file.write('%.2f ms\n' % ((time.time() - start_sample) * 1000))
 
-            self.take_action(action)
+                self.take_action(action)
 
-            self.delay_ewma = None
-            self.delivery_rate_ewma = None
-            self.send_rate_ewma = None
+            self.step_features.reset(self.delivered)
 
-            self.step_start_ms = curr_ts_ms()
+            self.step_start_ms = self.clock.now_ms()
 
             if self.train:
                 self.step_cnt += 1
@@ -216,11 +442,15 @@ class Sender(object):
         return k
 
     def run(self):
+        if self.io_backend == 'epoll':
+            return self.run_epoll()
+
         TIMEOUT = 1000  # ms
 
         self.poller.modify(self.sock, ALL_FLAGS)
         curr_flags = ALL_FLAGS
         r = -1
+        self.loop_stats.reset()
 
         while self.running:
             #print("while self.running")
@@ -233,10 +463,12 @@ class Sender(object):
                     self.poller.modify(self.sock, READ_ERR_FLAGS)
                     curr_flags = READ_ERR_FLAGS
 
+            self.loop_stats.wait_begin()
             events = self.poller.poll(TIMEOUT)
+            self.loop_stats.wait_end()
 
             if not events:  # timed out
-                self.send()
+                self.try_send()
 
             for fd, flag in events:
                 assert self.sock.fileno() == fd
@@ -245,18 +477,108 @@ class Sender(object):
                     sys.exit('Error occurred to the channel')
 
                 if flag & READ_FLAGS:
-                    r = self.recv()
+                    if self.batch_io:
+                        r = self.recv_batch()
+                    else:
+                        r = self.recv()
 
                 if flag & WRITE_FLAGS:
                     if self.window_is_open():
-                        self.send()
+                        if self.batch_io:
+                            self.send_batch()
+                        else:
+                            self.try_send()
         return r
 
+    def fill_window(self):
+        """Send until the window closes. Returns False if the socket buffer
+        filled up first.
+        """
+        if self.batch_io:
+            self.send_batch()
+            return not self.window_is_open()
+
+        while self.window_is_open():
+            if not self.try_send():
+                return False
+
+        return True
+
+    def drain_acks(self):
+        """Read until EAGAIN, as an edge-triggered poller requires."""
+        if self.batch_io:
+            return self.recv_batch()
+
+        r = -1
+        while self.running:
+            try:
+                k = self.recv()
+            except socket.error as e:
+                if would_block(e):
+                    return r
+                raise
+
+            if k is not None:
+                r = k
+
+        return r
+
+    def run_epoll(self):
+        """Edge-triggered epoll event loop.
+
+        UDP sockets are almost always writable, so the loop fills the window
+        right after every batch of ACKs instead of waking up on POLLOUT, and
+        only arms EPOLLOUT when a send hits EAGAIN.
+        """
+        TIMEOUT = 1.0  # s
+
+        epoller = select.epoll()
+        epoller.register(self.sock, EPOLL_READ_FLAGS)
+        write_armed = False
+        r = -1
+        self.loop_stats.reset()
+
+        try:
+            while self.running:
+                if not write_armed and not self.fill_window():
+                    epoller.modify(self.sock, EPOLL_ALL_FLAGS)
+                    write_armed = True
+
+                self.loop_stats.wait_begin()
+                events = epoller.poll(TIMEOUT)
+                self.loop_stats.wait_end()
+
+                # timed out: send one anyway, or once writable again
+                if not events and not self.try_send() and not write_armed:
+                    epoller.modify(self.sock, EPOLL_ALL_FLAGS)
+                    write_armed = True
+
+                for fd, flag in events:
+                    assert self.sock.fileno() == fd
+
+                    if flag & EPOLL_ERR_FLAGS:
+                        sys.exit('Error occurred to the channel')
+
+                    if flag & select.EPOLLIN:
+                        r = self.drain_acks()
+
+                    if flag & select.EPOLLOUT:
+                        epoller.modify(self.sock, EPOLL_READ_FLAGS)
+                        write_armed = False
+        finally:
+            epoller.close()
+
+        return r
+
+    def rtt_percentiles(self, qs=(50, 95, 99)):
+        """Percentiles of the RTTs seen so far in the episode (train only)."""
+        return [self.rtt_sketch.percentile(q) for q in qs]
+
     def compute_performance(self):
         print("****************IN COMPUTE_PERFORMANCE*********************")
-        duration = curr_ts_ms() - self.ts_first
+        duration = self.clock.now_ms() - self.ts_first
         tput = 0.008 * self.delivered / duration
-        perc_delay = np.percentile(self.rtt_buf, 95)
+        perc_delay = self.rtt_sketch.percentile(95)
         print(tput)
         print(perc_delay)
         return 10*tput - perc_delay
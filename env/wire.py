@@ -0,0 +1,198 @@
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+"""Fixed-layout binary wire format, an alternative to datagram.proto.
+
+Every datagram starts with MAGIC, which is never a valid first byte of a
+serialized protobuf message, so a receiver can tell the two formats apart
+per datagram. The sender only switches to this format after the receiver
+offered it with WIRE_OFFER during the handshake.
+
+A receiver that coalesces ACKs acknowledges several struct datagrams with
+one coalesced ACK, which starts with COALESCED_MAGIC instead.
+"""
+
+import struct
+from collections import namedtuple
+
+
+MAGIC = '\xff'
+COALESCED_MAGIC = '\xfe'
+WIRE_OFFER = 'Wire formats: struct'
+HELLO = 'Hello from receiver'
+
+# control message that starts a new episode on a kept-alive receiver
+RESET_FORMAT = 'Reset episode %d'
+RESET_ACK = 'Done: Reset episode '
+
+# magic, seq_num, send_ts, sent_bytes, delivered_time, delivered
+DATA_HEADER = struct.Struct('!cIIQIQ')
+# magic, seq_num, send_ts, sent_bytes, delivered_time, delivered, ack_bytes
+ACK_FORMAT = struct.Struct('!cIIQIQI')
+# magic, then seq_num, send_ts, sent_bytes, delivered_time, delivered of the
+# newest datagram, summed ack_bytes, ack_delay_us, number of ranges
+COALESCED_ACK_HEADER = struct.Struct('!cIIQIQIIH')
+# first and last seq_num of a range of acked datagrams
+ACK_RANGE = struct.Struct('!II')
+
+Ack = namedtuple('Ack', ['seq_num', 'send_ts', 'sent_bytes',
+                         'delivered_time', 'delivered', 'ack_bytes'])
+
+
+def is_struct(datagram):
+    return datagram[:1] in (MAGIC, COALESCED_MAGIC)
+
+
+def is_control(datagram):
+    """True for the handshake datagrams of the receiver and its answers to
+    reset requests. Copies of retried hellos and answers to retried reset
+    requests may still arrive during the following episode.
+    """
+    return datagram in (WIRE_OFFER, HELLO) or datagram.startswith(RESET_ACK)
+
+
+def is_reset(datagram):
+    return datagram.startswith('Reset episode ')
+
+
+def reset_ack(reset):
+    """The receiver's answer to a reset request."""
+    return 'Done: ' + reset
+
+
+class DataWriter(object):
+    """Preallocated datagrams whose header fields are patched in place.
+
+    pack() hands out the next of `count` buffers in round-robin order, so up
+    to `count` datagrams may be in flight in one batch before a buffer is
+    overwritten.
+    """
+
+    def __init__(self, payload, count=1):
+        size = DATA_HEADER.size + len(payload)
+        self.bufs = []
+        for _ in xrange(count):
+            buf = bytearray(size)
+            buf[DATA_HEADER.size:] = payload
+            self.bufs.append(buf)
+
+        self.index = 0
+
+    def pack(self, seq_num, send_ts, sent_bytes, delivered_time, delivered):
+        buf = self.bufs[self.index]
+        self.index = (self.index + 1) % len(self.bufs)
+
+        DATA_HEADER.pack_into(buf, 0, MAGIC, seq_num, send_ts, sent_bytes,
+                              delivered_time, delivered)
+        return buf
+
+
+def construct_ack(serialized_data):
+    """Construct a serialized ACK from the header of a struct datagram,
+    without touching its payload.
+    """
+    header = DATA_HEADER.unpack_from(serialized_data)
+    return ACK_FORMAT.pack(*(header + (len(serialized_data),)))
+
+
+def parse_ack(serialized_ack):
+    """Parses a struct ACK or a coalesced ACK. For a coalesced ACK, seq_num
+    is the highest seq_num acked, and send_ts and delivered_time are moved
+    later by the time the receiver held the ACK, rounded to whole ms, as if
+    it was sent at once. Timestamps stay integer ms either way.
+    """
+    if serialized_ack[:1] == MAGIC:
+        return Ack._make(ACK_FORMAT.unpack(serialized_ack)[1:])
+
+    ack, ack_delay_us, ranges = parse_coalesced_ack(serialized_ack)
+    ack_delay_ms = (ack_delay_us + 500) // 1000
+    return ack._replace(
+        seq_num=max(last for _, last in ranges),
+        send_ts=ack.send_ts + ack_delay_ms,
+        delivered_time=ack.delivered_time + ack_delay_ms)
+
+
+def parse_coalesced_ack(serialized_ack):
+    """Returns the Ack fields as sent, ack_delay_us and the acked ranges."""
+    fields = COALESCED_ACK_HEADER.unpack_from(serialized_ack)
+    ack = Ack._make(fields[1:7])
+    ack_delay_us, range_cnt = fields[7:]
+
+    ranges = [ACK_RANGE.unpack_from(
+        serialized_ack, COALESCED_ACK_HEADER.size + i * ACK_RANGE.size)
+        for i in xrange(range_cnt)]
+    return ack, ack_delay_us, ranges
+
+
+class AckCoalescer(object):
+    """Acknowledges every max_count struct datagrams or every max_delay_us
+    microseconds, whichever comes first, with one coalesced ACK.
+
+    The coalesced ACK carries the header fields of the newest datagram, the
+    ack_bytes of all datagrams it covers, the ranges of their seq_nums, and
+    how long the newest datagram was held. The sender removes the hold time
+    from its RTT and delivery-rate samples.
+    """
+
+    MAX_RANGES = 16
+
+    def __init__(self, max_count, max_delay_us):
+        self.max_count = max_count
+        self.max_delay_us = max_delay_us
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.ack_bytes = 0
+        self.ranges = []
+        self.header = None
+        self.deadline_us = None
+
+    def add(self, serialized_data, now_us):
+        """Records a struct datagram. Returns True if the ACK is due now."""
+        self.header = DATA_HEADER.unpack_from(serialized_data)
+        self.newest_us = now_us
+        if self.count == 0:
+            self.deadline_us = now_us + self.max_delay_us
+
+        self.count += 1
+        self.ack_bytes += len(serialized_data)
+
+        seq_num = self.header[1]
+        if self.ranges and self.ranges[-1][1] + 1 == seq_num:
+            self.ranges[-1][1] = seq_num
+        else:
+            self.ranges.append([seq_num, seq_num])
+
+        return (self.count >= self.max_count or
+                len(self.ranges) >= self.MAX_RANGES)
+
+    def timeout_us(self, now_us):
+        """Microseconds until the pending ACK is due; None if none pending."""
+        if self.count == 0:
+            return None
+        return max(0, self.deadline_us - now_us)
+
+    def flush(self, now_us):
+        """Returns the coalesced ACK of the pending datagrams."""
+        parts = [COALESCED_ACK_HEADER.pack(
+            COALESCED_MAGIC, *(self.header[1:] + (
+                self.ack_bytes, int(now_us - self.newest_us),
+                len(self.ranges))))]
+        for first, last in self.ranges:
+            parts.append(ACK_RANGE.pack(first, last))
+
+        self.reset()
+        return ''.join(parts)
@@ -0,0 +1,219 @@
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+import errno
+import socket
+import ctypes
+import ctypes.util
+
+
+MSG_DONTWAIT = 0x40
+
+
+class iovec(ctypes.Structure):
+    _fields_ = [('iov_base', ctypes.c_void_p),
+                ('iov_len', ctypes.c_size_t)]
+
+
+class msghdr(ctypes.Structure):
+    _fields_ = [('msg_name', ctypes.c_void_p),
+                ('msg_namelen', ctypes.c_uint32),
+                ('msg_iov', ctypes.POINTER(iovec)),
+                ('msg_iovlen', ctypes.c_size_t),
+                ('msg_control', ctypes.c_void_p),
+                ('msg_controllen', ctypes.c_size_t),
+                ('msg_flags', ctypes.c_int)]
+
+
+class mmsghdr(ctypes.Structure):
+    _fields_ = [('msg_hdr', msghdr),
+                ('msg_len', ctypes.c_uint)]
+
+
+class sockaddr_in(ctypes.Structure):
+    _fields_ = [('sin_family', ctypes.c_ushort),
+                ('sin_port', ctypes.c_ubyte * 2),
+                ('sin_addr', ctypes.c_ubyte * 4),
+                ('sin_zero', ctypes.c_ubyte * 8)]
+
+
+def load_libc():
+    """Returns libc if it exposes sendmmsg() and recvmmsg(), else None."""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        libc.sendmmsg
+        libc.recvmmsg
+    except (OSError, AttributeError):
+        return None
+
+    return libc
+
+
+libc = load_libc()
+
+
+def buffer_address(data):
+    """Returns the address of the bytes of a str or bytearray."""
+    if isinstance(data, bytearray):
+        return ctypes.addressof((ctypes.c_char * len(data)).from_buffer(data))
+
+    return ctypes.cast(ctypes.c_char_p(data), ctypes.c_void_p).value
+
+
+def would_block(e):
+    return e.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.ENOBUFS)
+
+
+class BatchSocketIO(object):
+    """Vectorized datagram I/O on a non-blocking UDP socket.
+
+    recv_batch() drains up to max_batch datagrams and send_batch() sends a
+    list of datagrams to one peer, each with a single recvmmsg()/sendmmsg()
+    syscall when libc provides them. Otherwise falls back to a loop of
+    recvfrom()/sendto() that stops at EAGAIN, which still saves one poll()
+    per packet.
+    """
+
+    def __init__(self, sock, max_batch=64, buf_size=1600):
+        self.sock = sock
+        self.max_batch = max_batch
+        self.buf_size = buf_size
+        self.vectorized = libc is not None
+
+        if self.vectorized:
+            self.setup_buffers()
+
+    def setup_buffers(self):
+        n = self.max_batch
+
+        # preallocated receive buffers and source addresses
+        self.recv_bufs = (ctypes.c_char * self.buf_size * n)()
+        self.recv_addrs = (sockaddr_in * n)()
+        self.recv_iovs = (iovec * n)()
+        self.recv_msgs = (mmsghdr * n)()
+
+        for i in xrange(n):
+            self.recv_iovs[i].iov_base = ctypes.addressof(self.recv_bufs[i])
+            self.recv_iovs[i].iov_len = self.buf_size
+
+            hdr = self.recv_msgs[i].msg_hdr
+            hdr.msg_name = ctypes.addressof(self.recv_addrs[i])
+            hdr.msg_namelen = ctypes.sizeof(sockaddr_in)
+            hdr.msg_iov = ctypes.pointer(self.recv_iovs[i])
+            hdr.msg_iovlen = 1
+
+        # send vectors are refilled per batch, destination set per peer
+        self.send_iovs = (iovec * n)()
+        self.send_msgs = (mmsghdr * n)()
+        self.send_addr = sockaddr_in()
+        self.send_peer = None
+
+        for i in xrange(n):
+            hdr = self.send_msgs[i].msg_hdr
+            hdr.msg_name = ctypes.addressof(self.send_addr)
+            hdr.msg_namelen = ctypes.sizeof(sockaddr_in)
+            hdr.msg_iov = ctypes.pointer(self.send_iovs[i])
+            hdr.msg_iovlen = 1
+
+    def set_send_peer(self, addr):
+        ip, port = addr
+        self.send_addr.sin_family = socket.AF_INET
+        self.send_addr.sin_port[:] = [(port >> 8) & 0xff, port & 0xff]
+        self.send_addr.sin_addr[:] = [ord(c) for c in socket.inet_aton(ip)]
+        self.send_peer = addr
+
+    def recv_batch(self):
+        """Returns a list of (datagram, addr) read without blocking."""
+        if not self.vectorized:
+            return self.recv_loop()
+
+        cnt = libc.recvmmsg(self.sock.fileno(), self.recv_msgs,
+                            self.max_batch, MSG_DONTWAIT, None)
+        if cnt < 0:
+            err = ctypes.get_errno()
+            if err in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return []
+            raise socket.error(err, 'recvmmsg failed')
+
+        ret = []
+        for i in xrange(cnt):
+            # the kernel overwrites msg_namelen on return
+            self.recv_msgs[i].msg_hdr.msg_namelen = ctypes.sizeof(sockaddr_in)
+
+            addr = self.recv_addrs[i]
+            ip = '%d.%d.%d.%d' % tuple(addr.sin_addr)
+            port = (addr.sin_port[0] << 8) | addr.sin_port[1]
+            data = ctypes.string_at(ctypes.addressof(self.recv_bufs[i]),
+                                    self.recv_msgs[i].msg_len)
+            ret.append((data, (ip, port)))
+
+        return ret
+
+    def recv_loop(self):
+        ret = []
+        while len(ret) < self.max_batch:
+            try:
+                ret.append(self.sock.recvfrom(self.buf_size))
+            except socket.error as e:
+                if would_block(e):
+                    break
+                raise
+
+        return ret
+
+    def send_batch(self, datagrams, addr):
+        """Sends datagrams to addr in order. Returns how many were sent."""
+        if not self.vectorized:
+            return self.send_loop(datagrams, addr)
+
+        if addr != self.send_peer:
+            self.set_send_peer(addr)
+
+        sent = 0
+        while sent < len(datagrams):
+            n = min(self.max_batch, len(datagrams) - sent)
+
+            # datagrams must stay referenced until sendmmsg() returns
+            for i in xrange(n):
+                data = datagrams[sent + i]
+                self.send_iovs[i].iov_base = buffer_address(data)
+                self.send_iovs[i].iov_len = len(data)
+
+            cnt = libc.sendmmsg(self.sock.fileno(), self.send_msgs, n,
+                                MSG_DONTWAIT)
+            if cnt < 0:
+                err = ctypes.get_errno()
+                if err in (errno.EAGAIN, errno.EWOULDBLOCK, errno.ENOBUFS):
+                    break
+                raise socket.error(err, 'sendmmsg failed')
+
+            sent += cnt
+            if cnt < n:
+                break
+
+        return sent
+
+    def send_loop(self, datagrams, addr):
+        sent = 0
+        for data in datagrams:
+            try:
+                self.sock.sendto(data, addr)
+            except socket.error as e:
+                if would_block(e):
+                    break
+                raise
+            sent += 1
+
+        return sent
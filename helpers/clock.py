@@ -0,0 +1,131 @@
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+"""Clocks that Sender, Receiver and the helpers read time from.
+
+Every clock counts integer microseconds from an epoch of its own, so the
+millisecond timestamps on the wire stay small. MonotonicClock is the
+default; SimulatedClock only moves when its owner, e.g. the link
+emulator, moves it, which makes episodes reproducible and lets them run
+as fast as the CPU allows.
+"""
+
+import time
+import ctypes
+import ctypes.util
+
+
+CLOCK_MONOTONIC = 1  # from <linux/time.h>
+
+
+class timespec(ctypes.Structure):
+    _fields_ = [('tv_sec', ctypes.c_long),
+                ('tv_nsec', ctypes.c_long)]
+
+
+def load_clock_gettime():
+    """Returns clock_gettime() of libc or librt, or None if neither has it
+    (Python 2 has no time.monotonic()).
+    """
+    for name in ['c', 'rt']:
+        try:
+            lib = ctypes.CDLL(ctypes.util.find_library(name), use_errno=True)
+            clock_gettime = lib.clock_gettime
+        except (OSError, AttributeError):
+            continue
+
+        clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+        return clock_gettime
+
+    return None
+
+
+clock_gettime = load_clock_gettime()
+
+
+def monotonic_us():
+    """Microseconds of CLOCK_MONOTONIC, or of the wall clock if that is
+    unavailable.
+    """
+    if clock_gettime is None:
+        return int(time.time() * 1e6)
+
+    ts = timespec()
+    if clock_gettime(CLOCK_MONOTONIC, ctypes.byref(ts)) != 0:
+        raise OSError(ctypes.get_errno(), 'clock_gettime failed')
+    return ts.tv_sec * 1000000 + ts.tv_nsec // 1000
+
+
+def monotonic():
+    """Seconds of CLOCK_MONOTONIC, for measuring intervals."""
+    return monotonic_us() / 1e6
+
+
+class Clock(object):
+    """Integer time since the clock was created."""
+
+    def __init__(self):
+        self.epoch_us = self.source_us()
+
+    def source_us(self):
+        raise NotImplementedError
+
+    def now_us(self):
+        return self.source_us() - self.epoch_us
+
+    def now_ms(self):
+        return self.now_us() // 1000
+
+
+class WallClock(Clock):
+    """time.time(); jumps when the system time is set."""
+
+    def source_us(self):
+        return int(time.time() * 1e6)
+
+
+class MonotonicClock(Clock):
+    """CLOCK_MONOTONIC, in microseconds."""
+
+    def source_us(self):
+        return monotonic_us()
+
+
+class SimulatedClock(Clock):
+    """Stands still until set() or advance() moves it."""
+
+    def __init__(self, start_us=0):
+        self.time_us = start_us
+        super(SimulatedClock, self).__init__()
+
+    def source_us(self):
+        return self.time_us
+
+    def set(self, time_us):
+        """Moves to time_us since the epoch; time never goes back."""
+        self.time_us = max(self.time_us, self.epoch_us + int(time_us))
+
+    def advance(self, delta_us):
+        self.time_us += int(delta_us)
+
+
+CLOCKS = {
+    'wall': WallClock,
+    'monotonic': MonotonicClock,
+    'simulated': SimulatedClock,
+}
+
+# shared by everything not given a clock of its own
+DEFAULT_CLOCK = MonotonicClock()
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+import argparse
+from trace_cache import is_binary_trace, binary_to_text, text_to_binary
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='convert a mahimahi trace between text and binary, '
+        'in whichever direction the input needs')
+    parser.add_argument('input', help='text or binary trace')
+    parser.add_argument('output', help='converted trace')
+    args = parser.parse_args()
+
+    if is_binary_trace(args.input):
+        binary_to_text(args.input, args.output)
+    else:
+        text_to_binary(args.input, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+"""Per-step state features, declared once for training and inference.
+
+A feature reduces one per-ACK sample series of a step ('delay',
+'delivery_rate' or 'send_rate') to a number, or reads a sender variable
+('cwnd') at the step end. StepFeatures collects the raw ACK fields of a
+step into preallocated arrays and computes every feature in one
+vectorized pass when the step ends.
+"""
+
+import itertools
+import collections
+import numpy as np
+
+
+# reducer is one of 'ewma' (arg: alpha), 'min', 'max', 'mean',
+# 'percentile' (arg: 0-100) or 'value' for sender variables
+Feature = collections.namedtuple('Feature', ['name', 'field', 'reducer', 'arg'])
+
+# normalization scale of each sample field and sender variable
+FIELD_SCALES = {
+    'delay': 200.0,
+    'delivery_rate': 200.0,
+    'send_rate': 200.0,
+    'cwnd': 5000.0,
+}
+
+# fields that normalize_state_buf() compresses with log(max(1, x))
+LOG_FIELDS = ['delay']
+
+# a3c feeds its models the EWMA across the entries of a step's state,
+# in training and inference alike; they were trained with a span of 3
+A3C_STATE_ALPHA = 0.5
+
+# the state fed to the models; Sender.state_dim == len(STATE_FEATURES)
+STATE_FEATURES = [
+    Feature('delay_ewma', 'delay', 'ewma', 0.125),
+    Feature('delivery_rate_ewma', 'delivery_rate', 'ewma', 0.125),
+    Feature('send_rate_ewma', 'send_rate', 'ewma', 0.125),
+    Feature('cwnd', 'cwnd', 'value', None),
+]
+
+
+def scales(features=STATE_FEATURES):
+    return np.array([FIELD_SCALES[f.field] for f in features])
+
+
+STATE_SCALES = scales()
+
+
+def multi_timescale(field, alphas):
+    """EWMA features of one sample field at several timescales."""
+    return [Feature('%s_ewma_%g' % (field, alpha), field, 'ewma', alpha)
+            for alpha in alphas]
+
+
+def normalize(state, features=STATE_FEATURES):
+    return [x / FIELD_SCALES[f.field] for x, f in zip(state, features)]
+
+
+def ewma_last(data, alpha):
+    """Last value of the EWMA of data that starts at data[0], i.e.
+    x = (1 - alpha) * x + alpha * data[i] for i >= 1, without a Python loop.
+    """
+    n = len(data)
+    weights = alpha * (1.0 - alpha) ** np.arange(n - 1, -1, -1)
+    weights[0] = (1.0 - alpha) ** (n - 1)
+    return float(np.dot(weights, data))
+
+
+def ewma(data, alpha):
+    """Every value of the EWMA of data that starts at data[0], as in
+    ewma_last(); a span of n is alpha = 2 / (n + 1).
+    """
+    alpha_rev = 1 - alpha
+    n = data.shape[0]
+
+    pows = alpha_rev**(np.arange(n + 1))
+
+    scale_arr = 1 / pows[:-1]
+    offset = data[0] * pows[1:]
+    pw0 = alpha * alpha_rev**(n - 1)
+
+    mult = data * pw0 * scale_arr
+    cumsums = mult.cumsum()
+    out = offset + cumsums * scale_arr[::-1]
+    return out
+
+
+def a3c_state(step_state_buf):
+    """The input of the a3c models for the state of a step."""
+    # ravel() is a faster flatten()
+    return ewma(np.asarray(step_state_buf, dtype=np.float32).ravel(),
+                A3C_STATE_ALPHA)
+
+
+def normalize_state_buf(step_state_buf, features=STATE_FEATURES):
+    """Rows of states of features, with the LOG_FIELDS columns in log
+    scale.
+    """
+    norm_state_buf = np.array(step_state_buf, dtype=np.float32)
+    cols = [i for i, f in enumerate(features) if f.field in LOG_FIELDS]
+    norm_state_buf[:, cols] = np.log(np.maximum(norm_state_buf[:, cols], 1.0))
+
+    return norm_state_buf
+
+
+class StepFeatures(object):
+    """Raw ACK fields of the current step and the features computed
+    from them. Handling an ACK only appends it to a list; the step's ACKs
+    are copied into a preallocated array with one NumPy call at step end.
+    """
+
+    # columns of the per-ACK array: the fields of env.wire.Ack, then the
+    # time and the sender's sent_bytes when the ACK was handled
+    (SEQ_NUM, SEND_TS, SENT_BYTES, DELIVERED_TIME, DELIVERED, ACK_BYTES,
+     NOW, SENDER_SENT_BYTES) = range(8)
+    ACK_COLS = 6
+
+    def __init__(self, features=STATE_FEATURES, capacity=1024):
+        self.features = features
+        self.buf = np.empty([capacity, self.ACK_COLS + 2])
+
+        self.min_rtt = float('inf')
+        self.reset(0)
+
+    def __len__(self):
+        return len(self.acks)
+
+    def reset(self, delivered):
+        """Start a new step; delivered is the sender's count at this point."""
+        self.acks = []
+        self.wakeups = []
+        self.delivered = delivered
+
+    def add_acks(self, acks, now_ms, sent_bytes):
+        """Record the ACKs handled in one wakeup.
+
+        Args:
+            acks: env.wire.Ack tuples, in ACK order.
+            now_ms: time the ACKs are handled at.
+            sent_bytes: the sender's sent_bytes at that time.
+        """
+        self.acks.extend(acks)
+        self.wakeups.append((len(acks), now_ms, sent_bytes))
+
+    def fill(self):
+        """Copies the step's ACKs into the per-ACK array and returns it."""
+        n = len(self.acks)
+        if n > len(self.buf):
+            self.buf = np.empty([2 * n, self.buf.shape[1]])
+
+        # fromiter is much faster than converting a list of namedtuples
+        buf = self.buf[:n]
+        buf[:, :self.ACK_COLS] = np.fromiter(
+            itertools.chain.from_iterable(self.acks), float,
+            n * self.ACK_COLS).reshape(n, self.ACK_COLS)
+
+        counts, nows, sent_bytes = zip(*self.wakeups)
+        buf[:, self.NOW] = np.repeat(nows, counts)
+        buf[:, self.SENDER_SENT_BYTES] = np.repeat(sent_bytes, counts)
+        return buf
+
+    def samples(self):
+        """Per-ACK delay, delivery rate and send rate of the step so far."""
+        buf = self.fill()
+        now = buf[:, self.NOW]
+
+        rtt = now - buf[:, self.SEND_TS]
+        min_rtt = np.minimum(np.minimum.accumulate(rtt), self.min_rtt)
+
+        # BBR's delivery rate
+        delivered = self.delivered + np.cumsum(buf[:, self.ACK_BYTES])
+        delivery_rate = (0.008 * (delivered - buf[:, self.DELIVERED]) /
+                         np.maximum(1, now - buf[:, self.DELIVERED_TIME]))
+
+        # Vegas sending rate
+        send_rate = (0.008 * (buf[:, self.SENDER_SENT_BYTES] -
+                              buf[:, self.SENT_BYTES]) / np.maximum(1, rtt))
+
+        return {'delay': rtt - min_rtt,
+                'delivery_rate': delivery_rate,
+                'send_rate': send_rate}, min_rtt
+
+    def compute(self, **values):
+        """State of the step that ends now: one entry per feature, None for
+        sample features of a step without ACKs. values holds the sender
+        variables, e.g. cwnd. Also carries min_rtt over to the next step.
+        """
+        n = len(self.acks)
+        if n > 0:
+            samples, min_rtt = self.samples()
+            self.min_rtt = float(min_rtt[-1])
+
+        state = []
+        for f in self.features:
+            if f.reducer == 'value':
+                state.append(values[f.field])
+            elif n == 0:
+                state.append(None)
+            elif f.reducer == 'ewma':
+                state.append(ewma_last(samples[f.field], f.arg))
+            elif f.reducer == 'percentile':
+                state.append(float(np.percentile(samples[f.field], f.arg)))
+            else:
+                state.append(float(getattr(np, f.reducer)(samples[f.field])))
+
+        return state
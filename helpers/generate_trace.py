@@ -16,31 +16,62 @@
 
 
 import argparse
-import numpy as np
 from os import path
 from helpers import make_sure_path_exists
+from traces import MODELS, generate, write_trace, family, generate_files
+
+
+def parse_param(param):
+    """'key=value' with a number or a comma-separated list of numbers."""
+    key, _, value = param.partition('=')
+    values = [float(v) for v in value.split(',')]
+    return key, values if ',' in value else values[0]
 
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument('--bandwidth', metavar='Mbps', required=True,
+    parser.add_argument('--bandwidth', metavar='Mbps',
                         help='constant bandwidth (Mbps)')
     parser.add_argument('--output-dir', metavar='DIR', required=True,
                         help='directory to output trace')
+    parser.add_argument('--model', choices=sorted(MODELS.keys()),
+                        help='bandwidth model, with --param for each of its '
+                        'arguments, instead of --bandwidth')
+    parser.add_argument('--param', metavar='KEY=VALUE[,VALUE...]',
+                        action='append', default=[],
+                        help='argument of the model, e.g. on_mbps=12')
+    parser.add_argument('--duration-ms', type=int, default=60000,
+                        help='length of the trace (default: 60000)')
+    parser.add_argument('--poisson', action='store_true',
+                        help='draw opportunities as a Poisson process')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the first trace (default: 0)')
+    parser.add_argument('--count', type=int, default=1,
+                        help='traces to generate, with consecutive seeds')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='worker processes (default: one per CPU)')
     args = parser.parse_args()
 
-    # number of packets in 60 seconds
-    num_packets = int(float(args.bandwidth) * 5000)
-    ts_list = np.linspace(0, 60000, num=num_packets, endpoint=False)
-
-    # trace path
     make_sure_path_exists(args.output_dir)
-    trace_path = path.join(args.output_dir, '%smbps.trace' % args.bandwidth)
 
-    # write timestamps to trace
-    with open(trace_path, 'w') as trace:
-        for ts in ts_list:
-            trace.write('%d\n' % ts)
+    if args.model is None:
+        if args.bandwidth is None:
+            parser.error('either --bandwidth or --model is required')
+
+        # trace path
+        trace_path = path.join(args.output_dir,
+                               '%smbps.trace' % args.bandwidth)
+        write_trace(trace_path, generate(
+            'constant', args.duration_ms, poisson=args.poisson,
+            seed=args.seed, bandwidth=float(args.bandwidth)))
+        return
+
+    params = dict(parse_param(p) for p in args.param)
+    specs = family(args.model, args.count, args.output_dir, args.seed,
+                   duration_ms=args.duration_ms, poisson=args.poisson,
+                   **params)
+    for trace_path in generate_files(specs, args.jobs):
+        print trace_path
 
 
 if __name__ == '__main__':
@@ -14,12 +14,16 @@
 
 
 import os
+import math
 import time
 import errno
 import select
 import socket
+import resource
 import numpy as np
 import operator
+from features import normalize
+from clock import DEFAULT_CLOCK, monotonic
 
 
 READ_FLAGS = select.POLLIN | select.POLLPRI
@@ -28,6 +32,11 @@ ERR_FLAGS = select.POLLERR | select.POLLHUP | select.POLLNVAL
 READ_ERR_FLAGS = READ_FLAGS | ERR_FLAGS
 ALL_FLAGS = READ_FLAGS | WRITE_FLAGS | ERR_FLAGS
 
+# edge-triggered epoll flags; EPOLLOUT is only armed after EAGAIN
+EPOLL_ERR_FLAGS = select.EPOLLERR | select.EPOLLHUP
+EPOLL_READ_FLAGS = select.EPOLLIN | select.EPOLLET | EPOLL_ERR_FLAGS
+EPOLL_ALL_FLAGS = EPOLL_READ_FLAGS | select.EPOLLOUT
+
 math_ops = {
     '+': operator.add,
     '-': operator.sub,
@@ -41,10 +50,13 @@ def apply_op(op, op1, op2):
 
 
 def curr_ts_ms():
-    if not hasattr(curr_ts_ms, 'epoch'):
-        curr_ts_ms.epoch = time.time()
+    return DEFAULT_CLOCK.now_ms()
+
 
-    return int((time.time() - curr_ts_ms.epoch) * 1000)
+def cpu_time():
+    """Returns user + system CPU seconds consumed by this process."""
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
 
 
 def make_sure_path_exists(path):
@@ -65,11 +77,6 @@ def get_open_udp_port():
     return port
 
 
-def normalize(state):
-    return [state[0] / 200.0, state[1] / 200.0,
-            state[2] / 200.0, state[3] / 5000.0]
-
-
 def one_hot(action, action_cnt):
     ret = [0.0] * action_cnt
     ret[action] = 1.0
@@ -160,3 +167,134 @@ class MeanVarHistory(object):
         self.mean = 0.0
         self.square_mean = 0.0
         self.var = 0.0
+
+
+class Backoff(object):
+    """Exponential backoff: waits of initial_ms, doubling up to max_ms,
+    for as long as they add up to at most total_ms.
+    """
+
+    def __init__(self, initial_ms=5, max_ms=1000, total_ms=10000):
+        self.initial_ms = initial_ms
+        self.max_ms = max_ms
+        self.total_ms = total_ms
+        self.reset()
+
+    def reset(self):
+        self.wait_ms = self.initial_ms
+        self.waited_ms = 0
+        self.attempts = 0
+
+    def next_ms(self):
+        """Returns the next wait, or None once the total is spent."""
+        if self.waited_ms + self.wait_ms > self.total_ms:
+            return None
+
+        wait_ms = self.wait_ms
+        self.waited_ms += wait_ms
+        self.wait_ms = min(2 * self.wait_ms, self.max_ms)
+        self.attempts += 1
+        return wait_ms
+
+
+class LoopStats(object):
+    """Counts event loop wakeups and the time spent blocked waiting."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.wakeups = 0
+        self.idle_time = 0.0
+        self.start_time = monotonic()
+        self.start_cpu = cpu_time()
+        self.wait_start = None
+
+    def wait_begin(self):
+        self.wait_start = monotonic()
+
+    def wait_end(self):
+        self.wakeups += 1
+        self.idle_time += monotonic() - self.wait_start
+
+    def summary(self):
+        """Returns wakeups per second, and the fractions of wall time spent
+        idle in the poller and burning CPU.
+        """
+        elapsed = max(monotonic() - self.start_time, 1e-6)
+        return {'wakeups_per_sec': self.wakeups / elapsed,
+                'idle_frac': self.idle_time / elapsed,
+                'cpu_frac': (cpu_time() - self.start_cpu) / elapsed}
+
+
+class QuantileSketch(object):
+    """Bounded-memory streaming percentiles of a series of values.
+
+    Values are counted exactly, so results match np.percentile, until more
+    than max_bins distinct values are seen. The counts are then merged into
+    logarithmic buckets that keep every percentile within a relative error
+    of rel_err. Integer-millisecond RTTs rarely leave the exact mode.
+    """
+
+    def __init__(self, max_bins=4096, rel_err=0.005):
+        self.max_bins = max_bins
+        self.gamma = (1.0 + rel_err) / (1.0 - rel_err)
+        self.log_gamma = math.log(self.gamma)
+        self.reset()
+
+    def reset(self):
+        self.counts = {}
+        self.count = 0
+        self.exact = True
+
+    def bucket(self, x):
+        if x <= 0:
+            return None  # non-positive values share a bucket valued at 0
+        return int(math.ceil(math.log(x) / self.log_gamma))
+
+    def bucket_value(self, key):
+        if key is None:
+            return 0.0
+        return 2.0 * self.gamma ** key / (self.gamma + 1.0)
+
+    def add(self, x):
+        if not self.exact:
+            x = self.bucket(x)
+
+        self.counts[x] = self.counts.get(x, 0) + 1
+        self.count += 1
+
+        if self.exact and len(self.counts) > self.max_bins:
+            self.collapse()
+
+    def collapse(self):
+        counts = {}
+        for x, cnt in self.counts.iteritems():
+            key = self.bucket(x)
+            counts[key] = counts.get(key, 0) + cnt
+
+        self.counts = counts
+        self.exact = False
+
+    def percentile(self, q):
+        """Returns the q-th percentile (0 <= q <= 100), interpolated linearly
+        between closest ranks like np.percentile. None if no values.
+        """
+        if self.count == 0:
+            return None
+
+        keys = sorted(self.counts)  # the None bucket sorts first
+        cum_counts = np.cumsum([self.counts[k] for k in keys])
+        if self.exact:
+            values = keys
+        else:
+            values = [self.bucket_value(k) for k in keys]
+
+        rank = q / 100.0 * (self.count - 1)
+        lo = int(np.floor(rank))
+        hi = min(lo + 1, self.count - 1)
+
+        # the value at a 0-based rank r is the first whose cum_count > r
+        v_lo = values[np.searchsorted(cum_counts, lo, side='right')]
+        v_hi = values[np.searchsorted(cum_counts, hi, side='right')]
+        return v_lo + (rank - lo) * (v_hi - v_lo)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+"""Cuts raw traces into mahimahi traces: keeps a window of each, splits it
+into segments, resamples them and keeps those within a range of rates,
+one input trace per worker process.
+"""
+
+import os
+import sys
+import glob
+import argparse
+import multiprocessing
+from os import path
+from helpers import make_sure_path_exists
+from traces import rate_mbps, window, segments, resample, write_trace
+from trace_cache import load_any_trace, write_binary_trace
+
+
+def find_traces(inputs):
+    """Trace files among inputs, which are files, directories or globs."""
+    trace_paths = []
+    for pattern in inputs:
+        if path.isdir(pattern):
+            trace_paths += [path.join(pattern, name)
+                            for name in sorted(os.listdir(pattern))
+                            if not name.startswith('.')]
+        else:
+            trace_paths += sorted(glob.glob(pattern))
+
+    return [p for p in trace_paths if path.isfile(p)]
+
+
+def preprocess(trace_path, output_dir, start_ms=0, end_ms=None,
+               segment_ms=None, hop_ms=None, scale=1.0, bin_ms=1,
+               min_mbps=None, max_mbps=None, binary=False):
+    """Writes the segments of one trace to output_dir as
+    <name>-<start_ms>.trace (or .bin if binary). Returns the paths written
+    and the number of segments filtered out by rate.
+    """
+    trace = load_any_trace(trace_path)
+    if end_ms is None:
+        end_ms = int(trace[-1]) + 1
+
+    if segment_ms is None:
+        # one segment: the window, starting at its first opportunity as
+        # shift_cut_trace.py did
+        trace = window(trace, start_ms, end_ms + 1)
+        if len(trace) == 0:
+            return [], 0
+        parts = [(start_ms, trace - trace[0])]
+    else:
+        parts = segments(trace, segment_ms, start_ms, end_ms, hop_ms)
+
+    name = path.splitext(path.basename(trace_path))[0]
+    ext = '.bin' if binary else '.trace'
+    written = []
+    filtered = 0
+
+    for start, part in parts:
+        if len(part) == 0:
+            filtered += 1
+            continue
+        duration_ms = segment_ms or int(part[-1]) + 1
+
+        try:
+            part = resample(part, duration_ms, scale, bin_ms)
+        except ValueError:  # nothing left after 0 ms
+            filtered += 1
+            continue
+
+        mbps = rate_mbps(part, duration_ms)
+        if ((min_mbps is not None and mbps < min_mbps) or
+                (max_mbps is not None and mbps > max_mbps) or
+                part[-1] == 0):
+            filtered += 1
+            continue
+
+        output_path = path.join(output_dir, '%s-%d%s' % (name, start, ext))
+        if binary:
+            write_binary_trace(output_path, part)
+        else:
+            write_trace(output_path, part)
+        written.append(output_path)
+
+    return written, filtered
+
+
+def preprocess_job(job):
+    trace_path, kwargs = job
+    try:
+        return preprocess(trace_path, **kwargs)
+    except ValueError as e:
+        sys.stderr.write('Skipping %s: %s\n' % (trace_path, e))
+        return [], 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('inputs', metavar='INPUT', nargs='+',
+                        help='raw trace, directory of traces or glob')
+    parser.add_argument('--output-dir', metavar='DIR', required=True,
+                        help='directory to output traces')
+    parser.add_argument('--start-s', type=float, default=0,
+                        help='start of the window to keep (default: 0)')
+    parser.add_argument('--end-s', type=float,
+                        help='end of the window (default: end of trace)')
+    parser.add_argument('--segment-s', type=float,
+                        help='split the window into segments of this '
+                        'length (default: keep the window whole)')
+    parser.add_argument('--hop-s', type=float,
+                        help='distance between segment starts '
+                        '(default: --segment-s)')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='multiply bandwidth by this (default: 1)')
+    parser.add_argument('--bin-ms', type=int, default=1,
+                        help='average bandwidth over bins of this many ms')
+    parser.add_argument('--min-mbps', type=float,
+                        help='drop segments with a lower average rate')
+    parser.add_argument('--max-mbps', type=float,
+                        help='drop segments with a higher average rate')
+    parser.add_argument('--binary', action='store_true',
+                        help='write binary traces instead of text')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='worker processes (default: one per CPU)')
+    args = parser.parse_args()
+
+    def ms(seconds):
+        return None if seconds is None else int(round(seconds * 1000))
+
+    trace_paths = find_traces(args.inputs)
+    if not trace_paths:
+        sys.exit('No traces found')
+    make_sure_path_exists(args.output_dir)
+
+    kwargs = {
+        'output_dir': args.output_dir, 'start_ms': ms(args.start_s),
+        'end_ms': ms(args.end_s), 'segment_ms': ms(args.segment_s),
+        'hop_ms': ms(args.hop_s), 'scale': args.scale,
+        'bin_ms': args.bin_ms, 'min_mbps': args.min_mbps,
+        'max_mbps': args.max_mbps, 'binary': args.binary,
+    }
+    jobs = [(trace_path, kwargs) for trace_path in trace_paths]
+
+    pool = multiprocessing.Pool(args.jobs)
+    try:
+        results = pool.map(preprocess_job, jobs, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+    written = sum(len(paths) for paths, _ in results)
+    filtered = sum(cnt for _, cnt in results)
+    sys.stderr.write('Wrote %d traces from %d inputs (%d segments filtered '
+                     'out) to %s\n' % (written, len(trace_paths), filtered,
+                                       args.output_dir))
+
+
+if __name__ == '__main__':
+    main()
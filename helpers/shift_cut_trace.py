@@ -16,6 +16,8 @@
 
 
 import argparse
+from traces import window, write_trace
+from trace_cache import load_text_trace
 
 
 def main():
@@ -29,29 +31,10 @@ def main():
         help='output trace file after shifting and cutting')
     args = parser.parse_args()
 
-    input_trace = open(args.input_trace)
-    output_trace = open(args.output_trace, 'w')
-
-    starter_ts = None
-    while True:
-        line = input_trace.readline()
-        if not line:
-            break
-
-        ts = int(line)
-        if ts < 10000:
-            continue
-
-        if starter_ts is None:
-            starter_ts = ts
-
-        if ts <= 70000:
-            output_trace.write('%d\n' % (ts - starter_ts))
-        else:
-            break
-
-    input_trace.close()
-    output_trace.close()
+    # keep [10 s, 70 s], starting from the first timestamp kept; see
+    # preprocess_traces.py for other windows and many traces at once
+    trace = window(load_text_trace(args.input_trace), 10000, 70001)
+    write_trace(args.output_trace, trace - trace[0])
 
 
 if __name__ == '__main__':
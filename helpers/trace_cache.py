@@ -0,0 +1,212 @@
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+"""Binary, memory-mapped mahimahi traces, in a content-addressed cache.
+
+A binary trace is a header, the opportunities (ms) of one period as
+little-endian uint32, and an index of uint32 cum[t], the opportunities at
+or before t ms, for t in [0, period]. Both arrays are memory-mapped
+read-only, so every process that opens a trace shares the page cache
+rather than parsing text into its own copy.
+
+The cache keys a binary trace by the SHA-1 of its source: the generator
+arguments of helpers/traces.py, or the bytes of a text trace. mahimahi
+itself still reads text traces, which the cache writes next to the
+binary on demand.
+"""
+
+import os
+import json
+import struct
+import hashlib
+import tempfile
+import numpy as np
+from os import path
+from helpers import make_sure_path_exists
+from traces import generate, write_trace
+
+
+MAGIC = 'MMTR'
+VERSION = 1
+# magic, version, reserved, opportunity count, period (ms)
+HEADER = struct.Struct('<4sHHII')
+DTYPE = np.dtype('<u4')
+
+DEFAULT_CACHE_DIR = path.join(
+    path.dirname(path.dirname(path.abspath(__file__))), 'env', 'trace_cache')
+
+
+def is_binary_trace(trace_path):
+    with open(trace_path, 'rb') as trace_file:
+        return trace_file.read(len(MAGIC)) == MAGIC
+
+
+def publish(tmp_path, final_path):
+    """Moves a finished temporary file into place, readable by all."""
+    os.chmod(tmp_path, 0644)
+    os.rename(tmp_path, final_path)
+
+
+def write_binary_trace(trace_path, trace):
+    """Writes trace, one period of opportunities (ms), atomically, so that
+    processes racing to write the same trace never see a partial one.
+    """
+    trace = np.asarray(trace)
+    if (len(trace) == 0 or trace[0] < 0 or trace[-1] <= 0 or
+            trace[-1] > np.iinfo(DTYPE).max or np.any(np.diff(trace) < 0)):
+        raise ValueError('not a valid mahimahi trace')
+
+    period = int(trace[-1])
+    cum = np.searchsorted(trace, np.arange(period + 1), side='right')
+
+    trace_dir = path.dirname(path.abspath(trace_path))
+    fd, tmp_path = tempfile.mkstemp(dir=trace_dir)
+    try:
+        with os.fdopen(fd, 'wb') as trace_file:
+            trace_file.write(
+                HEADER.pack(MAGIC, VERSION, 0, len(trace), period))
+            trace_file.write(trace.astype(DTYPE).tobytes())
+            trace_file.write(cum.astype(DTYPE).tobytes())
+        publish(tmp_path, trace_path)
+    except:
+        os.remove(tmp_path)
+        raise
+
+
+def load_binary_trace(trace_path):
+    """Memory-maps a binary trace; returns (trace, cum), read-only."""
+    with open(trace_path, 'rb') as trace_file:
+        magic, version, _, count, period = HEADER.unpack(
+            trace_file.read(HEADER.size))
+
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('%s is not a binary trace of version %d' %
+                         (trace_path, VERSION))
+
+    data = np.memmap(trace_path, dtype=DTYPE, mode='r', offset=HEADER.size,
+                     shape=(count + period + 1,))
+    return data[:count], data[count:]
+
+
+def parse_text_trace(text):
+    """Opportunities of the text of a trace, one integer per line."""
+    trace = np.fromstring(text, dtype=np.int64, sep='\n')
+
+    # fromstring() stops quietly at the first bad line
+    text = text.strip()
+    if len(trace) != (text.count('\n') + 1 if text else 0):
+        trace = np.array(text.split(), dtype=np.int64)
+    return trace
+
+
+def load_text_trace(trace_path):
+    with open(trace_path) as trace_file:
+        try:
+            trace = parse_text_trace(trace_file.read())
+        except ValueError:
+            raise ValueError('%s is not a valid mahimahi trace' % trace_path)
+    if len(trace) == 0 or trace[-1] <= 0 or np.any(np.diff(trace) < 0):
+        raise ValueError('%s is not a valid mahimahi trace' % trace_path)
+    return trace
+
+
+def load_any_trace(trace_path):
+    """Opportunities of a text or binary trace, without the cache."""
+    if is_binary_trace(trace_path):
+        return load_binary_trace(trace_path)[0]
+    return load_text_trace(trace_path)
+
+
+def binary_to_text(binary_path, text_path):
+    """Converts a binary trace back to mahimahi's text format."""
+    write_trace(text_path, load_binary_trace(binary_path)[0])
+
+
+def text_to_binary(text_path, binary_path):
+    write_binary_trace(binary_path, load_text_trace(text_path))
+
+
+def spec_key(spec):
+    """Cache key of the generate() arguments in spec, defaults filled in."""
+    spec = dict({'duration_ms': 60000, 'seed': 0, 'poisson': False}, **spec)
+    spec.pop('path', None)
+    return hashlib.sha1(json.dumps(spec, sort_keys=True)).hexdigest()
+
+
+def file_key(trace_path):
+    digest = hashlib.sha1()
+    with open(trace_path, 'rb') as trace_file:
+        for chunk in iter(lambda: trace_file.read(1 << 20), ''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class TraceCache(object):
+    """Binary traces, and their text versions, under cache_dir by key.
+    Safe to share between processes: entries are written atomically and
+    never change once written.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.mapped = {}  # key -> (trace, cum) mapped by this process
+
+    def binary_path(self, key):
+        return path.join(self.cache_dir, key + '.bin')
+
+    def text_path(self, key):
+        return path.join(self.cache_dir, key + '.trace')
+
+    def put(self, key, make_trace):
+        """Writes the binary trace of key, from make_trace(), unless it
+        is cached. Returns its path.
+        """
+        binary_path = self.binary_path(key)
+        if not path.exists(binary_path):
+            make_sure_path_exists(self.cache_dir)
+            write_binary_trace(binary_path, make_trace())
+        return binary_path
+
+    def load(self, key, make_trace):
+        if key not in self.mapped:
+            self.mapped[key] = load_binary_trace(self.put(key, make_trace))
+        return self.mapped[key]
+
+    def generated(self, **spec):
+        """(trace, cum) of the trace that generate(**spec) returns."""
+        return self.load(spec_key(spec), lambda: generate(**spec))
+
+    def generated_text(self, **spec):
+        """Path of the text trace of generate(**spec), for mahimahi."""
+        key = spec_key(spec)
+        text_path = self.text_path(key)
+
+        if not path.exists(text_path):
+            binary_path = self.put(key, lambda: generate(**spec))
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir)
+            os.close(fd)
+            binary_to_text(binary_path, tmp_path)
+            publish(tmp_path, text_path)
+
+        return text_path
+
+    def open(self, trace_path):
+        """(trace, cum) of a binary trace, or of a text trace by content,
+        converting it on first use.
+        """
+        if is_binary_trace(trace_path):
+            return load_binary_trace(trace_path)
+        return self.load(file_key(trace_path),
+                         lambda: load_text_trace(trace_path))
@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+"""Statistics of many traces in one small file, to select scenarios by
+query without loading the traces, e.g.
+
+    trace_index.py build traces/ --index traces.idx.npz --delays 10,40
+    trace_index.py query traces.idx.npz 'p10_mbps < 5 and cov > 0.5'
+
+Rates are over sliding windows of window_ms every hop_ms. An outage is a
+run of at least outage_ms without a delivery opportunity. bdp_<d>ms is
+the bandwidth-delay product in packets at a one-way delay of d ms, i.e.
+over a round trip of 2d, at the mean rate.
+"""
+
+import re
+import sys
+import argparse
+import operator
+import multiprocessing
+import numpy as np
+from traces import PACKETS_PER_MS_PER_MBPS
+from trace_cache import load_any_trace
+from preprocess_traces import find_traces
+
+
+STATS = ['duration_ms', 'mean_mbps', 'p10_mbps', 'p50_mbps', 'p90_mbps',
+         'cov', 'outage_frac', 'max_outage_ms', 'outages']
+
+COMPARISONS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+CLAUSE = re.compile(r'^\s*(\w+)\s*(<=|>=|==|!=|<|>)\s*([-+.\deE]+)\s*$')
+
+
+def trace_stats(trace, window_ms=1000, hop_ms=100, outage_ms=100,
+                delays=()):
+    """Returns a dict of the STATS of a trace and its bdp_<d>ms for every
+    one-way delay d in delays.
+    """
+    duration_ms = int(trace[-1])
+    # deliveries in each ms of the period (0, duration_ms], as mahimahi
+    # replays it
+    counts = np.bincount(trace, minlength=duration_ms + 1)[1:]
+    cum = np.concatenate([[0], np.cumsum(counts)])
+
+    window_ms = min(window_ms, duration_ms)
+    starts = np.arange(0, duration_ms - window_ms + 1, hop_ms)
+    rates = ((cum[starts + window_ms] - cum[starts]) /
+             (PACKETS_PER_MS_PER_MBPS * window_ms))
+
+    # runs of empty ms, from the edges of the padded empty mask
+    edges = np.diff(np.concatenate([[0], counts == 0, [0]]).astype(np.int8))
+    runs = np.flatnonzero(edges == -1) - np.flatnonzero(edges == 1)
+    runs = runs[runs >= outage_ms]
+
+    mean_mbps = len(trace) / (PACKETS_PER_MS_PER_MBPS * duration_ms)
+    p10, p50, p90 = np.percentile(rates, [10, 50, 90])
+    stats = {
+        'duration_ms': duration_ms,
+        'mean_mbps': mean_mbps,
+        'p10_mbps': p10,
+        'p50_mbps': p50,
+        'p90_mbps': p90,
+        'cov': np.std(rates) / np.mean(rates) if np.mean(rates) else 0.0,
+        'outage_frac': np.sum(runs) / float(duration_ms),
+        'max_outage_ms': np.max(runs) if len(runs) else 0,
+        'outages': len(runs),
+    }
+
+    for delay in delays:
+        stats['bdp_%dms' % delay] = (
+            mean_mbps * PACKETS_PER_MS_PER_MBPS * 2 * delay)
+    return stats
+
+
+def stats_job(job):
+    trace_path, kwargs = job
+    try:
+        return trace_stats(load_any_trace(trace_path), **kwargs)
+    except ValueError as e:
+        sys.stderr.write('Skipping %s: %s\n' % (trace_path, e))
+        return None
+
+
+def build_index(trace_paths, index_path, window_ms=1000, hop_ms=100,
+                outage_ms=100, delays=(), processes=None):
+    """Computes the statistics of trace_paths, one trace per worker
+    process, and saves them to index_path. Returns the TraceIndex.
+    """
+    kwargs = {'window_ms': window_ms, 'hop_ms': hop_ms,
+              'outage_ms': outage_ms, 'delays': delays}
+    jobs = [(trace_path, kwargs) for trace_path in trace_paths]
+
+    if processes == 1 or len(jobs) <= 1:
+        results = map(stats_job, jobs)
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(stats_job, jobs, chunksize=4)
+        finally:
+            pool.close()
+            pool.join()
+
+    rows = [(p, r) for p, r in zip(trace_paths, results) if r is not None]
+    fields = STATS + ['bdp_%dms' % d for d in delays]
+
+    columns = {'path': np.array([p for p, _ in rows], dtype=str)}
+    for field in fields:
+        columns[field] = np.array([r[field] for _, r in rows],
+                                  dtype=np.float32)
+
+    np.savez(index_path, window_ms=window_ms, hop_ms=hop_ms,
+             outage_ms=outage_ms, delays=np.array(delays, dtype=np.int64),
+             **columns)
+    return TraceIndex(index_path)
+
+
+class TraceIndex(object):
+    """The statistics of indexed traces, by field, one row per trace."""
+
+    def __init__(self, index_path):
+        with np.load(index_path) as index:
+            self.paths = list(index['path'])
+            self.delays = list(index['delays'])
+            self.columns = dict((k, index[k]) for k in index.files
+                                if k not in ['path', 'delays', 'window_ms',
+                                             'hop_ms', 'outage_ms'])
+            self.params = dict((k, int(index[k])) for k in
+                               ['window_ms', 'hop_ms', 'outage_ms'])
+
+    def __len__(self):
+        return len(self.paths)
+
+    def fields(self):
+        return sorted(self.columns)
+
+    def where(self, query):
+        """Boolean mask of the rows that satisfy query: comparisons of
+        fields with numbers joined by 'and' and 'or', 'and' first.
+        Raises ValueError on a malformed query or an unknown field.
+        """
+        mask = np.zeros(len(self), dtype=bool)
+
+        for disjunct in re.split(r'\s+or\s+', query.strip()):
+            match = np.ones(len(self), dtype=bool)
+
+            for clause in re.split(r'\s+and\s+', disjunct):
+                m = CLAUSE.match(clause)
+                if m is None:
+                    raise ValueError('malformed clause: %s' % clause)
+
+                field, op, value = m.groups()
+                if field not in self.columns:
+                    raise ValueError('unknown field: %s (known: %s)' %
+                                     (field, ', '.join(self.fields())))
+                match &= COMPARISONS[op](self.columns[field], float(value))
+
+            mask |= match
+
+        return mask
+
+    def query(self, query):
+        """Paths of the traces that satisfy query, in index order."""
+        return [self.paths[i] for i in np.flatnonzero(self.where(query))]
+
+    def row(self, trace_path):
+        i = self.paths.index(trace_path)
+        return dict((field, self.columns[field][i].item())
+                    for field in self.columns)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='index trace statistics, or query an index')
+    subparsers = parser.add_subparsers(dest='command')
+
+    build = subparsers.add_parser('build', help='index traces')
+    build.add_argument('inputs', metavar='INPUT', nargs='+',
+                       help='trace, directory of traces or glob')
+    build.add_argument('--index', metavar='PATH', required=True,
+                       help='index file to write (.npz)')
+    build.add_argument('--window-ms', type=int, default=1000,
+                       help='sliding window of rates (default: 1000)')
+    build.add_argument('--hop-ms', type=int, default=100,
+                       help='distance between windows (default: 100)')
+    build.add_argument('--outage-ms', type=int, default=100,
+                       help='shortest outage (default: 100)')
+    build.add_argument('--delays', default='',
+                       help='comma-separated one-way delays (ms) to '
+                       'compute BDPs at')
+    build.add_argument('--jobs', type=int, default=None,
+                       help='worker processes (default: one per CPU)')
+
+    query = subparsers.add_parser('query', help='select indexed traces')
+    query.add_argument('index', help='index file')
+    query.add_argument('query', nargs='?', default=None,
+                       help="e.g. 'p10_mbps < 5 and cov > 0.5' "
+                       '(default: list every field)')
+    query.add_argument('--stats', action='store_true',
+                       help='print the statistics of each trace selected')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        delays = [int(d) for d in args.delays.split(',') if d]
+        trace_paths = find_traces(args.inputs)
+        index = build_index(trace_paths, args.index, args.window_ms,
+                            args.hop_ms, args.outage_ms, delays, args.jobs)
+        sys.stderr.write('Indexed %d of %d traces in %s\n' %
+                         (len(index), len(trace_paths), args.index))
+        return
+
+    index = TraceIndex(args.index)
+    if args.query is None:
+        print ' '.join(index.fields())
+        return
+
+    try:
+        trace_paths = index.query(args.query)
+    except ValueError as e:
+        sys.exit(str(e))
+
+    for trace_path in trace_paths:
+        if args.stats:
+            row = index.row(trace_path)
+            print trace_path, ' '.join(
+                '%s=%.6g' % (f, row[f]) for f in index.fields())
+        else:
+            print trace_path
+
+
+if __name__ == '__main__':
+    main()
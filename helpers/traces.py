@@ -0,0 +1,250 @@
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+"""Seeded generators of mahimahi traces.
+
+A model draws a bandwidth profile, in Mbps for every millisecond of the
+trace. The profile becomes delivery opportunities of one 1500-byte packet
+each, either spread evenly or drawn as a Poisson process, and the trace
+is written out as one integer millisecond per opportunity.
+"""
+
+import multiprocessing
+import numpy as np
+from os import path
+
+
+# 1500-byte packets per ms at 1 Mbps
+PACKETS_PER_MS_PER_MBPS = 1e6 / 8 / 1500 / 1000
+
+
+def constant(duration_ms, rng, bandwidth):
+    return np.full(duration_ms, float(bandwidth))
+
+
+def on_off(duration_ms, rng, on_mbps, off_mbps=0.0, mean_on_ms=1000,
+           mean_off_ms=1000):
+    """Alternates between on_mbps and off_mbps, for exponentially
+    distributed periods, starting on.
+    """
+    # enough periods to cover the trace many times over on average
+    n = 2 * int(duration_ms / (mean_on_ms + mean_off_ms) + 10)
+    means = np.tile([mean_on_ms, mean_off_ms], n // 2)
+    lengths = np.maximum(1, rng.exponential(means)).astype(np.int64)
+
+    rates = np.tile([float(on_mbps), float(off_mbps)], n // 2)
+    return periods_to_profile(duration_ms, rates, lengths)
+
+
+def markov(duration_ms, rng, rates, mean_dwell_ms=1000, transitions=None):
+    """Markov-modulated bandwidth: dwells in a state of rates for an
+    exponential time, then moves to another state, uniformly or as the
+    rows of transitions give.
+    """
+    rates = np.asarray(rates, dtype=np.float64)
+    k = len(rates)
+    if transitions is None:
+        transitions = (np.ones([k, k]) - np.eye(k)) / max(1, k - 1)
+    cum_transitions = np.cumsum(transitions, axis=1)
+
+    n = int(duration_ms / mean_dwell_ms + 10) * 2
+    lengths = np.maximum(1, rng.exponential(mean_dwell_ms, n)).astype(
+        np.int64)
+
+    # the chain itself is sequential, but only one step per dwell
+    states = np.empty(n, dtype=np.int64)
+    states[0] = rng.randint(k)
+    draws = rng.random_sample(n)
+    for i in xrange(1, n):
+        states[i] = min(k - 1, np.searchsorted(
+            cum_transitions[states[i - 1]], draws[i], side='right'))
+
+    return periods_to_profile(duration_ms, rates[states], lengths)
+
+
+def random_walk(duration_ms, rng, start_mbps, min_mbps, max_mbps,
+                step_ms=100, sigma=0.1):
+    """Cellular-like bandwidth: a geometric random walk, clipped to
+    [min_mbps, max_mbps], that moves every step_ms by a log-normal factor.
+    """
+    step_ms = int(step_ms)
+    n = -(-duration_ms // step_ms)
+    log_rates = np.log(start_mbps) + np.cumsum(rng.normal(0, sigma, n))
+
+    # reflect rather than stick at the bounds
+    lo, hi = np.log(min_mbps), np.log(max_mbps)
+    span = 2 * (hi - lo)
+    log_rates = np.abs(np.mod(log_rates - lo, span) - span / 2)
+    log_rates = hi - log_rates
+
+    return np.repeat(np.exp(log_rates), step_ms)[:duration_ms]
+
+
+def step_change(duration_ms, rng, rates, change_ms=None):
+    """Steps through rates, every change_ms, or at random times if
+    change_ms is None.
+    """
+    rates = np.asarray(rates, dtype=np.float64)
+    if change_ms is None:
+        cuts = np.sort(rng.randint(1, duration_ms, len(rates) - 1))
+        lengths = np.diff(np.concatenate([[0], cuts, [duration_ms]]))
+    else:
+        lengths = np.full(len(rates), int(change_ms), dtype=np.int64)
+
+    return periods_to_profile(duration_ms, rates, lengths, repeat=True)
+
+
+MODELS = {
+    'constant': constant,
+    'on_off': on_off,
+    'markov': markov,
+    'random_walk': random_walk,
+    'step_change': step_change,
+}
+
+
+def periods_to_profile(duration_ms, rates, lengths, repeat=False):
+    """Bandwidth of each ms of duration_ms, holding rates[i] for
+    lengths[i] ms in turn, and starting over if repeat.
+    """
+    profile = np.repeat(rates, lengths)
+    if len(profile) < duration_ms:
+        if not repeat:
+            raise ValueError('periods cover only %d ms' % len(profile))
+        profile = np.tile(profile, -(-duration_ms // len(profile)))
+
+    return profile[:duration_ms]
+
+
+def profile_to_trace(profile, rng=None, poisson=False):
+    """Delivery opportunities (ms) of a bandwidth profile (Mbps per ms),
+    evenly spread or, if poisson, drawn as a Poisson process.
+    """
+    packets_per_ms = np.asarray(profile) * PACKETS_PER_MS_PER_MBPS
+
+    if poisson:
+        counts = rng.poisson(packets_per_ms)
+    else:
+        # packet i goes out in the ms where the cumulative rate reaches i,
+        # as np.linspace() placed them at a constant rate
+        owed = np.ceil(np.round(np.cumsum(packets_per_ms), 6)).astype(
+            np.int64)
+        counts = np.diff(np.concatenate([[0], owed]))
+
+    trace = np.repeat(np.arange(len(profile), dtype=np.int64), counts)
+    if len(trace) == 0 or trace[-1] == 0:
+        raise ValueError('the profile delivers nothing after 0 ms')
+    return trace
+
+
+def generate(model, duration_ms=60000, seed=None, poisson=False,
+             **params):
+    """Returns the opportunities of a trace of model, a name in MODELS."""
+    rng = np.random.RandomState(seed)
+    profile = MODELS[model](duration_ms, rng, **params)
+    return profile_to_trace(profile, rng, poisson)
+
+
+def write_trace(trace_path, trace):
+    """Writes a trace in one pass, without a Python loop per line."""
+    lines = np.asarray(trace, dtype=np.int64).astype(str)
+    with open(trace_path, 'w') as trace_file:
+        trace_file.write('\n'.join(lines))
+        trace_file.write('\n')
+
+
+def rate_mbps(trace, duration_ms):
+    """Average bandwidth of the opportunities of trace over duration_ms."""
+    return len(trace) / PACKETS_PER_MS_PER_MBPS / float(duration_ms)
+
+
+def window(trace, start_ms, end_ms):
+    """Opportunities in [start_ms, end_ms), shifted to start at 0."""
+    trace = np.asarray(trace)
+    lo, hi = np.searchsorted(trace, [start_ms, end_ms])
+    return trace[lo:hi] - start_ms
+
+
+def segments(trace, length_ms, start_ms=0, end_ms=None, hop_ms=None):
+    """Windows of length_ms every hop_ms (default: length_ms) from
+    start_ms, as long as they end by end_ms (default: the trace's end).
+    Returns (start_ms, opportunities) pairs.
+    """
+    trace = np.asarray(trace)
+    if end_ms is None:
+        end_ms = int(trace[-1]) + 1
+    hop_ms = length_ms if hop_ms is None else hop_ms
+
+    starts = np.arange(start_ms, end_ms - length_ms + 1, hop_ms)
+    # one searchsorted for the bounds of every window
+    bounds = np.searchsorted(trace, np.concatenate(
+        [starts, starts + length_ms])).reshape(2, -1)
+
+    return [(start, trace[lo:hi] - start)
+            for start, lo, hi in zip(starts, bounds[0], bounds[1])]
+
+
+def resample(trace, duration_ms, scale=1.0, bin_ms=1):
+    """Opportunities of trace over duration_ms with the bandwidth scaled
+    by scale and averaged over bins of bin_ms, evenly spread as generate()
+    spreads them. Returns trace as is if there is nothing to do.
+    """
+    if scale == 1.0 and bin_ms == 1:
+        return trace
+
+    counts = np.bincount(trace, minlength=duration_ms)[:duration_ms]
+    profile = counts * (scale / PACKETS_PER_MS_PER_MBPS)
+
+    if bin_ms > 1:
+        bins = -(-duration_ms // bin_ms)
+        sums = np.bincount(np.arange(duration_ms) // bin_ms, profile, bins)
+        widths = np.minimum(bin_ms, duration_ms - bin_ms * np.arange(bins))
+        profile = np.repeat(sums / widths, widths)
+
+    return profile_to_trace(profile)
+
+
+def generate_file(spec):
+    """Generates the trace of spec, a dict of generate() arguments and
+    'path', and writes it. Returns the path.
+    """
+    spec = dict(spec)
+    trace_path = spec.pop('path')
+    write_trace(trace_path, generate(**spec))
+    return trace_path
+
+
+def family(model, count, output_dir, seed=0, **params):
+    """Specs of count traces of model with seeds seed, seed + 1, ..., named
+    <model>-<seed>.trace in output_dir.
+    """
+    return [dict(params, model=model, seed=s,
+                 path=path.join(output_dir, '%s-%d.trace' % (model, s)))
+            for s in xrange(seed, seed + count)]
+
+
+def generate_files(specs, processes=None):
+    """generate_file() for every spec, in a pool of worker processes.
+    Returns the paths in order.
+    """
+    if processes == 1 or len(specs) <= 1:
+        return map(generate_file, specs)
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        return pool.map(generate_file, specs, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+import numpy as np
+import tensorflow as tf
+import project_root
+from os import path
+from env.sender import Sender
+from a3c.models import ActorCriticLSTM
+
+
+MODEL = path.join(project_root.DIR, 'a3c', 'logs', 'model')
+
+
+def restored_model():
+    with tf.variable_scope('local'):
+        pi = ActorCriticLSTM(Sender.state_dim, Sender.action_cnt)
+
+    sess = tf.Session()
+    tf.train.Saver(pi.trainable_vars).restore(sess, MODEL)
+    return pi, sess
+
+
+def test_step_matches_sequence():
+    rng = np.random.RandomState(0)
+
+    with tf.Graph().as_default():
+        pi, sess = restored_model()
+        # the checkpoint still has every variable of the step graph
+        assert len(pi.trainable_vars) == 12
+
+        episodes = [rng.uniform(0, 200, [30, Sender.state_dim])
+                    for _ in xrange(2)]
+
+        seq_probs = []
+        seq_values = []
+        for states in episodes:
+            probs, values = sess.run(
+                [pi.action_probs, pi.state_values],
+                {pi.states: states, pi.indices: range(len(states))})
+            seq_probs.append(probs)
+            seq_values.append(values)
+
+        # both episodes as two flows, one step at a time
+        lstm_state = pi.zero_init_state(2)
+        for t in xrange(30):
+            probs, lstm_state, values = sess.run(
+                [pi.step_action_probs, pi.step_state_out,
+                 pi.step_state_values],
+                {pi.step_states: [episodes[0][t], episodes[1][t]],
+                 pi.step_state_in: lstm_state})
+
+            for i in xrange(2):
+                assert np.allclose(probs[i], seq_probs[i][t], atol=1e-5)
+                assert np.allclose(values[i], seq_values[i][t], atol=1e-4)
+
+        # the sequence continues from a fed LSTM state
+        final_state = sess.run(pi.lstm_state_out,
+                               {pi.states: episodes[0]})
+        for (c, h), (step_c, step_h) in zip(final_state, lstm_state):
+            assert np.allclose(c[0], step_c[0], atol=1e-5)
+            assert np.allclose(h[0], step_h[0], atol=1e-5)
+
+        sess.close()
+
+    print 'test_step_matches_sequence: success'
+
+
+def test_episodes_are_separate():
+    rng = np.random.RandomState(1)
+
+    with tf.Graph().as_default():
+        pi, sess = restored_model()
+
+        episodes = [rng.uniform(0, 200, [length, Sender.state_dim])
+                    for length in [12, 30, 7]]
+
+        # each episode from a zero LSTM state, as when it was sampled
+        ep_scores = []
+        ep_values = []
+        for states in episodes:
+            scores, values = sess.run(
+                [pi.action_scores, pi.state_values],
+                {pi.states: states, pi.indices: range(len(states))})
+            ep_scores.append(scores)
+            ep_values.append(values)
+
+        # the same episodes merged into the buffers of one update
+        merged = np.concatenate(episodes)
+        scores, values, final_state = sess.run(
+            [pi.action_scores, pi.state_values, pi.lstm_state_out],
+            {pi.states: merged, pi.indices: range(len(merged)),
+             pi.seq_lens: [len(states) for states in episodes]})
+
+        assert np.allclose(scores, np.concatenate(ep_scores), atol=1e-4)
+        assert np.allclose(values, np.concatenate(ep_values), atol=1e-4)
+
+        # one final LSTM state per episode
+        assert final_state[0][0].shape == (3, pi.lstm_state_dim)
+
+        sess.close()
+
+    print 'test_episodes_are_separate: success'
+
+
+def main():
+    test_step_matches_sequence()
+    test_episodes_are_separate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+import time
+import threading
+import project_root
+from env.sender import Sender
+from env.wire import Ack
+from env.action_sampler import BatchedActionSampler
+
+
+def test_async_sender():
+    sender = Sender(0, async_inference=True)
+    proceed = threading.Event()
+
+    def slow_policy(state):
+        proceed.wait()
+        return 4  # *2.0
+
+    sender.set_sample_action(slow_policy)
+    sender.step_start_ms = -Sender.max_steps  # force a step end
+
+    ack = Ack(seq_num=0, send_ts=0, sent_bytes=0, delivered_time=0,
+              delivered=0, ack_bytes=1429)
+    sender.update_state([ack])
+    sender.check_step_end()
+    assert sender.async_sampler.pending
+    assert sender.cwnd == 10.0
+    sender.step_len_ms = float('inf')  # no further step ends
+
+    # the packet loop keeps going on the old cwnd while inference runs
+    for _ in xrange(3):
+        sender.update_state([ack])
+        sender.check_step_end()
+    assert sender.cwnd == 10.0
+
+    proceed.set()
+    while sender.async_sampler.pending:
+        time.sleep(0.001)
+        sender.update_state([ack])
+        sender.check_step_end()
+
+    assert sender.cwnd == 20.0
+    assert sender.staleness.get()[0] >= 4
+
+    sender.cleanup()
+    print 'test_async_sender: success'
+
+
+def test_batched_sampler():
+    calls = []
+
+    def sample_actions(flow_ids, states):
+        calls.append(list(flow_ids))
+        return [state[0] for state in states]
+
+    batch = BatchedActionSampler(sample_actions)
+    flows = [batch.flow(flow_id) for flow_id in xrange(3)]
+
+    flows[2].submit([7])
+    flows[0].submit([5])
+    assert flows[0].poll() is None
+    assert batch.flush() == [2, 0]
+    assert batch.flush() == []
+    assert calls == [[2, 0]]
+
+    assert flows[0].poll() == 5
+    assert flows[1].poll() is None
+    assert flows[2].poll() == 7
+    assert not flows[2].pending
+
+    print 'test_batched_sampler: success'
+
+
+def main():
+    test_async_sender()
+    test_batched_sampler()
+
+
+if __name__ == '__main__':
+    main()
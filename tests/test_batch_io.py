@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+import time
+import socket
+import project_root
+from helpers.batch_io import BatchSocketIO
+
+
+def udp_pair():
+    a = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    b = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    a.bind(('127.0.0.1', 0))
+    b.bind(('127.0.0.1', 0))
+    a.setblocking(0)
+    b.setblocking(0)
+    return a, b
+
+
+def check_round_trip(vectorized):
+    a, b = udp_pair()
+    io_a = BatchSocketIO(a, max_batch=8)
+    io_b = BatchSocketIO(b, max_batch=8)
+    io_a.vectorized = io_a.vectorized and vectorized
+    io_b.vectorized = io_b.vectorized and vectorized
+
+    datagrams = ['datagram %d' % i for i in xrange(20)]
+    assert io_a.send_batch(datagrams, b.getsockname()) == 20
+    time.sleep(0.05)
+
+    received = []
+    while True:
+        batch = io_b.recv_batch()
+        if not batch:
+            break
+        assert len(batch) <= 8
+        received += batch
+
+    assert [data for data, _ in received] == datagrams
+    assert all(addr == a.getsockname() for _, addr in received)
+    assert io_b.recv_batch() == []
+
+    a.close()
+    b.close()
+
+
+def test_batch_io():
+    check_round_trip(vectorized=True)
+    check_round_trip(vectorized=False)
+
+    print 'test_batch_io: success'
+
+
+def main():
+    test_batch_io()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+import shutil
+import tempfile
+import yaml
+import project_root
+from os import path
+from dagger.best_cwnd import (
+    BestCwndTable, DEFAULT_TABLE, scenario_key, link_of, bdp_packets,
+    evaluate, sweep)
+
+
+TRACE = path.join(project_root.DIR, 'env', '12mbps.trace')
+
+
+def test_lookup():
+    table = BestCwndTable()
+    with open(DEFAULT_TABLE) as table_file:
+        grid = yaml.safe_load(table_file)
+    del grid['scenarios']
+
+    # grid points as they are
+    for bandwidth, row in grid.iteritems():
+        for delay, cwnd in row.iteritems():
+            assert table.lookup(bandwidth, delay) == cwnd
+            assert table.lookup(float(bandwidth), float(delay)) == cwnd
+
+    # in between, bilinear: exact for a BDP-like table
+    assert table.lookup(5, 15) == round((15 + 20) / 2.0)
+    assert table.lookup(7.5, 10) == round((15 + 20) / 2.0)
+    assert grid[10][20] < table.lookup(12, 25) < grid[20][30]
+
+    # beyond, scaled by the BDP from the edge
+    assert table.lookup(400, 10) == 2 * grid[200][10]
+    assert table.lookup(10, 320) == 2 * grid[10][160]
+    assert table.lookup(1, 10) == 3
+
+    print 'test_lookup: success'
+
+
+def test_scenarios():
+    cmd = ('mm-delay 28 mm-loss uplink 0.0477 mm-link /a/b/0.57mbps-poisson.'
+           'trace /c/0.57mbps-poisson.trace --uplink-queue=droptail '
+           '--uplink-queue-args=packets=14')
+    assert scenario_key(cmd) == (
+        'mm-delay 28 mm-loss uplink 0.0477 mm-link 0.57mbps-poisson.trace '
+        '0.57mbps-poisson.trace --uplink-queue=droptail '
+        '--uplink-queue-args=packets=14')
+    # the scenarios that create_env() used to hard-code
+    assert BestCwndTable().for_cmd(cmd) == 5
+
+    # any other command goes by the mean rate of its trace
+    cmd = 'mm-delay 20 mm-link %s %s' % (TRACE, TRACE)
+    bandwidth, delay = link_of(cmd)
+    assert abs(bandwidth - 12) < 0.01 and delay == 20
+    assert BestCwndTable().for_cmd(cmd) == BestCwndTable().lookup(12, 20)
+
+    # tables round trip through YAML
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        table = BestCwndTable(path.join(tmp_dir, 'best_cwnds.yml'))
+        table.add(12, 20, 45)
+        table.add_scenario(cmd, 44)
+        table.save()
+
+        table = BestCwndTable(table.table_path)
+        assert table.lookup(12, 20) == 45
+        assert table.for_cmd(cmd) == 44
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    print 'test_scenarios: success'
+
+
+def test_sweep():
+    cmd = 'mm-delay 20 mm-link %s %s' % (TRACE, TRACE)
+    bdp = bdp_packets(12, 20)
+
+    # too small a window wastes bandwidth, too large one queues
+    scores = evaluate(cmd, [bdp / 4, bdp, 8 * bdp])
+    assert scores[1] > max(scores[0], scores[2])
+
+    cwnd, score = sweep(cmd)
+    assert 0.7 * bdp < cwnd < 1.5 * bdp
+    assert score >= scores[1]
+
+    print 'test_sweep: success'
+
+
+def main():
+    test_lookup()
+    test_scenarios()
+    test_sweep()
+
+
+if __name__ == '__main__':
+    main()
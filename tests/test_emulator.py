@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+import numpy as np
+import project_root
+from os import path
+from env.sender import Sender
+from env.environment import Environment
+from env.emulator import MTU, Link, LinkEmulator, parse_mahimahi_cmd
+
+
+TRACE = path.join(project_root.DIR, 'env', '12mbps.trace')
+
+
+def test_parse_mahimahi_cmd():
+    cmd = ('mm-delay 28 mm-loss uplink 0.0477 mm-link %s %s '
+           '--uplink-queue=droptail --uplink-queue-args=packets=14' %
+           (TRACE, TRACE))
+    assert parse_mahimahi_cmd(cmd) == [
+        ('delay', 28.0), ('loss', 'uplink', 0.0477),
+        ('link', TRACE, TRACE, 14, None)]
+
+    for cmd in ['mm-delay 10 mm-meter', 'mm-link a b --uplink-log=x',
+                'mm-link a b --uplink-queue=codel']:
+        try:
+            parse_mahimahi_cmd(cmd)
+            assert False
+        except ValueError:
+            pass
+
+    print 'test_parse_mahimahi_cmd: success'
+
+
+def test_link():
+    # two opportunities per 4 ms period
+    link = Link(np.array([1, 4]))
+    assert link.first_opp(0) == 0
+    assert link.first_opp(4) == 1
+    assert link.first_opp(4.5) == 2
+    assert link.opp_time(2) == 5
+
+    # full-size packets back to back take one opportunity each
+    assert [link.enqueue(0, MTU) for _ in xrange(3)] == [1, 4, 5]
+    # small packets share an opportunity
+    assert link.enqueue(5, 100) == 8
+    assert link.enqueue(5, 100) == 8
+    # a packet spans opportunities
+    assert link.enqueue(5, MTU) == 9
+    # opportunities with nothing queued are lost
+    assert link.enqueue(18, 100) == 20
+
+    # droptail
+    link = Link(np.array([1]), queue_packets=2)
+    assert link.enqueue(0, MTU) == 1
+    assert link.enqueue(0, MTU) == 2
+    assert link.enqueue(0, MTU) is None
+    assert link.enqueue(1, MTU) == 3
+
+    print 'test_link: success'
+
+
+def test_emulated_episode():
+    max_steps = Sender.max_steps
+    Sender.max_steps = 100
+
+    env = Environment('mm-delay 20 mm-link %s %s' % (TRACE, TRACE),
+                      emulate=True)
+    env.set_sample_action(lambda state: 3)  # +10 packets every step
+
+    try:
+        env.reset()
+        env.rollout()
+        sender = env.sender
+
+        # 100 steps of just over 10 ms, in virtual time
+        duration = sender.clock.now_ms() - sender.ts_first
+        assert 1000 <= duration < 1300
+        # at most 12 Mbps, and at least the 40 ms RTT of the shell
+        assert 0 < 0.008 * sender.delivered / duration <= 12.5
+        assert sender.rtt_sketch.percentile(0) >= 40
+    finally:
+        Sender.max_steps = max_steps
+        env.cleanup()
+
+    print 'test_emulated_episode: success'
+
+
+def test_deterministic_episode():
+    max_steps = Sender.max_steps
+    Sender.max_steps = 50
+
+    cmd = ('mm-delay 10 mm-loss uplink 0.05 mm-link %s %s '
+           '--uplink-queue=droptail --uplink-queue-args=packets=20' %
+           (TRACE, TRACE))
+
+    # the same seed gives the same episode, however fast it runs
+    episodes = []
+    try:
+        for _ in xrange(2):
+            sender = Sender(train=True)
+            sender.set_sample_action(lambda state: 3)  # +10 packets
+            try:
+                LinkEmulator(cmd, seed=1).run(sender)
+                episodes.append((sender.clock.now_us(), sender.delivered,
+                                 sender.rtt_sketch.percentile(95)))
+            finally:
+                sender.cleanup()
+    finally:
+        Sender.max_steps = max_steps
+
+    assert episodes[0] == episodes[1]
+
+    print 'test_deterministic_episode: success'
+
+
+def main():
+    test_parse_mahimahi_cmd()
+    test_link()
+    test_emulated_episode()
+    test_deterministic_episode()
+
+
+if __name__ == '__main__':
+    main()
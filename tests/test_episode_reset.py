@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+import socket
+import threading
+import project_root
+from env import wire
+from env.sender import Sender
+from env.receiver import Receiver
+from helpers.clock import MonotonicClock
+
+
+def test_episode_reset():
+    sender = Sender(0, train=True, wire_format='struct')
+    port = sender.sock.getsockname()[1]
+
+    receiver = Receiver('127.0.0.1', port, ack_count=4)
+
+    def serve():
+        receiver.handshake()
+        receiver.run()
+
+    thread = threading.Thread(target=serve)
+    thread.daemon = True
+    thread.start()
+
+    sender.handshake()
+
+    # leave the ACKs of a finished episode, and one held ACK, behind
+    for _ in xrange(10):
+        sender.send()
+    sender.cwnd = 100.0
+    sender.running = False
+
+    sender.reset_episode()
+    assert sender.seq_num == 0 and sender.cwnd == 10.0 and sender.running
+    assert sender.resync()
+
+    # nothing of the previous episode is left to read
+    try:
+        sender.sock.recv(1600)
+        assert False
+    except socket.error:
+        pass
+
+    # a held ACK of the previous episode is never sent
+    sender.sock.settimeout(5)
+    for _ in xrange(4):
+        sender.send()
+    ack = sender.parse_ack(sender.sock.recv(1600))
+    assert ack.seq_num == 3
+    assert ack.ack_bytes == sender.sent_bytes
+
+    sender.cleanup()
+    print 'test_episode_reset: success'
+
+
+def test_stale_reset_answers():
+    # a clock started 10 s ago, so that an answer taken for an ACK sent at
+    # time 0 shows as an RTT of more than 10 s
+    clock = MonotonicClock()
+    clock.epoch_us -= 10 ** 7
+    sender = Sender(0, train=True, clock=clock)
+    port = sender.sock.getsockname()[1]
+
+    receiver = Receiver('127.0.0.1', port)
+
+    def serve():
+        receiver.handshake()
+        receiver.run()
+
+    thread = threading.Thread(target=serve)
+    thread.daemon = True
+    thread.start()
+
+    max_steps = Sender.max_steps
+    Sender.max_steps = 20
+    try:
+        sender.handshake()
+        sender.set_sample_action(lambda state: 2)  # keep cwnd
+
+        sender.reset_episode()
+        assert sender.resync()
+
+        # retries of the reset request, answered once the episode started
+        request = wire.RESET_FORMAT % sender.episode
+        for _ in xrange(3):
+            sender.sock.sendto(request, sender.peer_addr)
+
+        sender.run()
+
+        # no answer was taken for an ACK sent at time 0
+        assert sender.rtt_percentiles((100,))[0] < 1000
+    finally:
+        Sender.max_steps = max_steps
+        sender.cleanup()
+
+    print 'test_stale_reset_answers: success'
+
+
+def main():
+    test_episode_reset()
+    test_stale_reset_answers()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+import numpy as np
+import project_root
+from env.sender import Sender
+from helpers.helpers import normalize, one_hot
+from dagger.experts import (
+    action_error, best_actions, get_best_action, ExpertTable, relabel)
+
+
+ACTIONS = Sender.action_mapping
+
+
+def min_best_action(cwnd, target):
+    return min(ACTIONS,
+               key=lambda idx: action_error(ACTIONS, idx, cwnd, target))
+
+
+def test_best_actions():
+    rng = np.random.RandomState(0)
+    cwnds = np.concatenate([rng.uniform(2, 2000, 500),
+                            np.arange(2, 200, 0.5)])
+    targets = rng.choice([5, 40, 70, 500, 690, 870], len(cwnds))
+
+    labels = best_actions(cwnds, targets)
+    for cwnd, target, label in zip(cwnds, targets, labels):
+        assert label == min_best_action(cwnd, target)
+        assert get_best_action(ACTIONS, cwnd, target) == label
+
+    print 'test_best_actions: success'
+
+
+def test_expert_table():
+    rng = np.random.RandomState(1)
+
+    for target in [2, 5, 12.5, 40, 870]:
+        table = ExpertTable(target)
+        cwnds = np.concatenate([rng.uniform(0, 4 * target + 100, 500),
+                                np.arange(0, 2 * target + 30, 0.5),
+                                table.breakpoints[table.breakpoints >= 0]])
+
+        labels = table.labels(cwnds)
+        assert labels.shape == cwnds.shape
+        for cwnd, label in zip(cwnds, labels):
+            assert label == min_best_action(cwnd, target)
+
+        assert table.labels(target) == get_best_action(ACTIONS, target,
+                                                       target)
+
+    print 'test_expert_table: success'
+
+
+def test_relabel():
+    cwnds = [2.0, 10.0, 35.0, 40.0, 80.0, 300.0]
+    aug_states = []
+    for cwnd in cwnds:
+        state = [0.0] * (Sender.state_dim - 1) + [cwnd]
+        aug_states.append(normalize(state) + one_hot(0, len(ACTIONS)))
+
+    for best_cwnd in [5, 40, 500]:
+        labels = relabel(aug_states, best_cwnd)
+        assert list(labels) == [min_best_action(c, best_cwnd) for c in cwnds]
+
+    print 'test_relabel: success'
+
+
+def main():
+    test_best_actions()
+    test_expert_table()
+    test_relabel()
+
+
+if __name__ == '__main__':
+    main()
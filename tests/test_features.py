@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+import numpy as np
+import project_root
+from env.wire import Ack
+from helpers.features import (
+    StepFeatures, STATE_FEATURES, Feature, ewma, ewma_last, normalize,
+    normalize_state_buf, a3c_state)
+
+
+class ScalarState(object):
+    """The per-ACK scalar EWMA updates that StepFeatures replaces."""
+
+    def __init__(self):
+        self.min_rtt = float('inf')
+        self.delivered = 0
+        self.reset()
+
+    def reset(self):
+        self.delay_ewma = None
+        self.delivery_rate_ewma = None
+        self.send_rate_ewma = None
+
+    def ewma(self, old, new):
+        return new if old is None else 0.875 * old + 0.125 * new
+
+    def update(self, rows, now, sent_bytes):
+        for _, send_ts, ack_sent, delivered_time, delivered, ack_bytes in rows:
+            rtt = float(now - send_ts)
+            self.min_rtt = min(self.min_rtt, rtt)
+            self.delay_ewma = self.ewma(self.delay_ewma, rtt - self.min_rtt)
+
+            self.delivered += ack_bytes
+            delivery_rate = (0.008 * (self.delivered - delivered) /
+                             max(1, now - delivered_time))
+            self.delivery_rate_ewma = self.ewma(
+                self.delivery_rate_ewma, delivery_rate)
+
+            send_rate = 0.008 * (sent_bytes - ack_sent) / max(1, rtt)
+            self.send_rate_ewma = self.ewma(self.send_rate_ewma, send_rate)
+
+
+def test_step_features():
+    rng = np.random.RandomState(1)
+    features = StepFeatures(capacity=4)
+    scalar = ScalarState()
+
+    now = 1000
+    sent_bytes = 0
+    for step in xrange(20):
+        for _ in xrange(rng.randint(0, 5)):  # wakeups in this step
+            now += rng.randint(0, 3)
+            sent_bytes += rng.randint(0, 20000)
+            rows = []
+            for _ in xrange(rng.randint(1, 10)):
+                rows.append(Ack(seq_num=0,
+                                send_ts=now - rng.randint(20, 200),
+                                sent_bytes=rng.randint(0, sent_bytes + 1),
+                                delivered_time=now - rng.randint(0, 300),
+                                delivered=rng.randint(0, scalar.delivered + 1),
+                                ack_bytes=1400))
+            features.add_acks(rows, now, sent_bytes)
+            scalar.update(rows, now, sent_bytes)
+
+        state = features.compute(cwnd=42.0)
+        expected = [scalar.delay_ewma, scalar.delivery_rate_ewma,
+                    scalar.send_rate_ewma, 42.0]
+        if len(features) == 0:
+            assert state == [None, None, None, 42.0]
+        else:
+            assert np.allclose(state, expected)
+
+        features.reset(scalar.delivered)
+        scalar.reset()
+
+    print 'test_step_features: success'
+
+
+def test_extra_features():
+    features = StepFeatures(STATE_FEATURES + [
+        Feature('delay_min', 'delay', 'min', None),
+        Feature('delay_max', 'delay', 'max', None),
+        Feature('delay_p50', 'delay', 'percentile', 50)])
+
+    features.add_acks([Ack(0, send_ts, 0, 0, 0, 1400)
+                       for send_ts in [90, 80, 70]], 100, 0)
+    assert features.compute(cwnd=10.0)[4:] == [0.0, 20.0, 10.0]
+
+    print 'test_extra_features: success'
+
+
+def test_ewma():
+    data = np.array([3.0, 1.0, 4.0, 1.0, 5.0, 9.0])
+    assert np.isclose(ewma_last(data, 0.5), ewma(data, 0.5)[-1])
+    assert np.allclose(a3c_state(data.reshape(2, 3)), ewma(data, 0.5))
+    assert np.allclose(normalize([200.0, 400.0, 0.0, 5000.0]),
+                       [1.0, 2.0, 0.0, 1.0])
+
+    print 'test_ewma: success'
+
+
+def test_normalize_state_buf():
+    buf = [[0.5, 0.5, 1.0, 10.0], [100.0, 100.0, 2.0, 20.0]]
+    norm = normalize_state_buf(buf)
+
+    # delay in log scale, from at least 1; the rest as they are
+    assert np.allclose(norm[:, 0], [0.0, np.log(100.0)])
+    assert np.allclose(norm[:, 1:], np.array(buf)[:, 1:])
+
+    print 'test_normalize_state_buf: success'
+
+
+def main():
+    test_step_features()
+    test_extra_features()
+    test_ewma()
+    test_normalize_state_buf()
+
+
+if __name__ == '__main__':
+    main()
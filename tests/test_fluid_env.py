@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+import numpy as np
+import project_root
+from os import path
+from env.sender import Sender
+from env.fluid_env import (
+    FluidBatchEnv, DATAGRAM_BYTES, PACKET_BYTES, affine_actions)
+from helpers.helpers import apply_op
+
+
+TRACE = path.join(project_root.DIR, 'env', '12mbps.trace')
+
+
+def test_affine_actions():
+    scale, shift = affine_actions(Sender.action_mapping)
+
+    for a, (op, val) in Sender.action_mapping.iteritems():
+        for cwnd in [2.0, 10.0, 123.0]:
+            assert np.isclose(cwnd * scale[a] + shift[a],
+                              apply_op(op, cwnd, val))
+
+    print 'test_affine_actions: success'
+
+
+def test_fluid_env():
+    # a small and a large window on the same 12 Mbps link, 40 ms RTT,
+    # and a large window behind a 20-packet droptail queue
+    cmds = ['mm-delay 20 mm-link %s %s' % (TRACE, TRACE)] * 2
+    cmds.append('mm-delay 20 mm-link %s %s --downlink-queue=droptail '
+                '--downlink-queue-args=packets=20' % (TRACE, TRACE))
+    env = FluidBatchEnv.from_mahimahi_cmds(cmds, max_steps=200)
+
+    states = env.reset()
+    assert states.shape == (3, Sender.state_dim)
+
+    hold = Sender.action_mapping.keys()[
+        Sender.action_mapping.values().index(['+', 0.0])]
+    env.cwnd[1:] = 200.0
+
+    done = False
+    while not done:
+        states, rewards, done = env.step([hold] * 3)
+
+    delay, delivery_rate, send_rate, cwnd = states.T
+    assert list(cwnd) == [10.0, 200.0, 200.0]
+
+    # 10 datagrams per 40 ms, counted without IPv4 and UDP headers as
+    # Sender counts them
+    assert np.isclose(delivery_rate[0], 0.008 * 10 * DATAGRAM_BYTES / 40)
+    assert delay[0] == 0
+    # the link is saturated by packets and the queue holds the excess
+    assert np.isclose(delivery_rate[1], 12 * 1504 / 1500.0 *
+                      DATAGRAM_BYTES / PACKET_BYTES)
+    assert delay[1] > 100
+    # the droptail queue caps the delay
+    assert np.isclose(delivery_rate[2], delivery_rate[1])
+    assert 0 < delay[2] < 25
+
+    # 10 * throughput - 95th percentile RTT, per link
+    assert np.isclose(rewards[0], 10 * delivery_rate[0] - 40, rtol=0.01)
+    assert rewards[2] > rewards[1]
+
+    print 'test_fluid_env: success'
+
+
+def main():
+    test_affine_actions()
+    test_fluid_env()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+import time
+import threading
+import project_root
+from env.sender import Sender
+from env.receiver import Receiver
+from helpers.helpers import get_open_udp_port
+
+
+def test_handshake_race():
+    # the receiver greets a port nobody listens on yet, as when it comes up
+    # before the sender in Environment.restart()
+    port = get_open_udp_port()
+    receiver = Receiver('127.0.0.1', port)
+
+    thread = threading.Thread(target=receiver.handshake)
+    thread.daemon = True
+    thread.start()
+
+    time.sleep(0.05)
+    sender = Sender(port)
+    try:
+        start = time.time()
+        assert sender.handshake(timeout_ms=2000)
+        # the next hello comes within the backoff, far below a second
+        assert time.time() - start < 0.2
+    finally:
+        sender.cleanup()
+        thread.join(1)
+        receiver.cleanup()
+
+    print 'test_handshake_race: success'
+
+
+def test_handshake_timeout():
+    sender = Sender(0)
+    try:
+        start = time.time()
+        assert not sender.handshake(timeout_ms=100)
+        assert 0.09 <= time.time() - start < 0.5
+    finally:
+        sender.cleanup()
+
+    print 'test_handshake_timeout: success'
+
+
+def test_episode_after_late_handshake():
+    # the sender listens 40 ms late, so the receiver's hellos are retried
+    # and their extra copies are still queued when the episode starts
+    sender = Sender(0, train=True)
+    port = sender.sock.getsockname()[1]
+    receiver = Receiver('127.0.0.1', port)
+
+    def serve():
+        receiver.handshake()
+        receiver.run()
+
+    thread = threading.Thread(target=serve)
+    thread.daemon = True
+    thread.start()
+
+    max_steps = Sender.max_steps
+    Sender.max_steps = 20
+    try:
+        time.sleep(0.04)
+        assert sender.handshake(timeout_ms=2000)
+
+        sender.set_sample_action(lambda state: 2)  # keep cwnd
+        sender.run()
+
+        # no hello was taken for an ACK sent at time 0
+        assert sender.rtt_percentiles((100,))[0] < 1000
+    finally:
+        Sender.max_steps = max_steps
+        sender.cleanup()
+
+    print 'test_episode_after_late_handshake: success'
+
+
+def main():
+    test_handshake_race()
+    test_handshake_timeout()
+    test_episode_after_late_handshake()
+
+
+if __name__ == '__main__':
+    main()
@@ -15,9 +15,13 @@
 #     limitations under the License.
 
 
+import time
 import numpy as np
 import project_root
-from helpers.helpers import RingBuffer, MeanVarHistory
+from helpers.clock import (
+    WallClock, MonotonicClock, SimulatedClock, monotonic_us)
+from helpers.helpers import (
+    RingBuffer, MeanVarHistory, LoopStats, QuantileSketch, Backoff)
 
 
 def test_ring_buffer():
@@ -63,9 +67,97 @@ def test_mean_var_history():
     print 'test_mean_var_history: success'
 
 
+def test_loop_stats():
+    stats = LoopStats()
+
+    for _ in xrange(3):
+        stats.wait_begin()
+        time.sleep(0.01)
+        stats.wait_end()
+
+    summary = stats.summary()
+    assert stats.wakeups == 3
+    assert stats.idle_time >= 0.03
+    assert 0.0 < summary['idle_frac'] <= 1.0
+    assert summary['wakeups_per_sec'] > 0
+
+    print 'test_loop_stats: success'
+
+
+def test_quantile_sketch():
+    sketch = QuantileSketch(max_bins=100)
+    assert sketch.percentile(95) is None
+
+    # exact while few distinct values are seen
+    rtts = np.random.randint(20, 80, 5000).astype(float)
+    for rtt in rtts:
+        sketch.add(rtt)
+    assert sketch.exact
+    for q in [0, 50, 95, 99, 100]:
+        assert np.isclose(sketch.percentile(q), np.percentile(rtts, q))
+
+    # bounded relative error afterwards
+    sketch.reset()
+    rtts = np.random.lognormal(4.0, 0.5, 20000)
+    for rtt in rtts:
+        sketch.add(rtt)
+    assert not sketch.exact
+    assert len(sketch.counts) < 1000
+    for q in [50, 95, 99]:
+        expected = np.percentile(rtts, q)
+        assert abs(sketch.percentile(q) - expected) <= 0.01 * expected
+
+    print 'test_quantile_sketch: success'
+
+
+def test_clocks():
+    # monotonic and microsecond resolution
+    samples = [monotonic_us() for _ in xrange(1000)]
+    assert samples == sorted(samples)
+    assert any(0 < b - a < 1000 for a, b in zip(samples, samples[1:]))
+
+    for clock in [WallClock(), MonotonicClock()]:
+        assert 0 <= clock.now_us() < 1000000
+        time.sleep(0.01)
+        assert 9 <= clock.now_ms() < 1000
+
+    clock = SimulatedClock()
+    assert clock.now_us() == 0
+    clock.advance(1500)
+    assert clock.now_us() == 1500 and clock.now_ms() == 1
+    clock.set(2000.7)
+    assert clock.now_us() == 2000
+    clock.set(1000)  # never goes back
+    assert clock.now_us() == 2000
+
+    print 'test_clocks: success'
+
+
+def test_backoff():
+    backoff = Backoff(5, 1000, 4000)
+    waits = []
+    while True:
+        wait_ms = backoff.next_ms()
+        if wait_ms is None:
+            break
+        waits.append(wait_ms)
+
+    assert waits == [5, 10, 20, 40, 80, 160, 320, 640, 1000, 1000]
+    assert backoff.attempts == len(waits)
+
+    backoff.reset()
+    assert backoff.next_ms() == 5
+
+    print 'test_backoff: success'
+
+
 def main():
     test_ring_buffer()
     test_mean_var_history()
+    test_loop_stats()
+    test_quantile_sketch()
+    test_clocks()
+    test_backoff()
 
 
 if __name__ == '__main__':
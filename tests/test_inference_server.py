@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+import time
+import shutil
+import socket
+import tempfile
+import threading
+import numpy as np
+import project_root
+from os import path
+from env.sender import Sender
+from helpers.features import STATE_SCALES
+from dagger.run_sender import NumpyLearner
+from dagger.inference_server import InferenceServer, InferenceClient, Flow
+
+
+def start_server(socket_path, max_flows, latency_budget_ms=1.0):
+    learner = NumpyLearner(Sender.state_dim, Sender.action_cnt,
+                           num_flows=max_flows)
+    server = InferenceServer(socket_path, learner, Sender.state_dim,
+                             max_flows, latency_budget_ms)
+
+    thread = threading.Thread(target=server.run)
+    thread.daemon = True
+    thread.start()
+    return server, thread
+
+
+def stop_server(server, thread):
+    server.running = False
+    # wake the server up to see it
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    sock.connect(server.socket_path)
+    sock.close()
+    thread.join(5)
+    server.cleanup()
+
+
+def random_states(rng, cnt):
+    return rng.uniform(0, 2, [cnt, len(STATE_SCALES)]) * STATE_SCALES
+
+
+def test_flows():
+    tmp_dir = tempfile.mkdtemp()
+    server, thread = start_server(path.join(tmp_dir, 'inference.sock'), 2)
+    try:
+        rng = np.random.RandomState(0)
+
+        # each flow keeps its own LSTM state, as with a learner of its own
+        clients = [InferenceClient(server.socket_path, 'a'),
+                   InferenceClient(server.socket_path, 'b')]
+        local = [NumpyLearner(Sender.state_dim, Sender.action_cnt)
+                 for _ in clients]
+
+        for t in xrange(50):
+            for client, learner, state in zip(clients, local,
+                                              random_states(rng, 2)):
+                state = list(state.astype(np.float32))
+                assert client.sample_action(state) == \
+                    learner.sample_action(state)
+
+        # no room for a third flow, nor for a second 'a'
+        for flow_id in ['c', 'a']:
+            try:
+                InferenceClient(server.socket_path, flow_id)
+                assert False
+            except ValueError:
+                pass
+
+        # a new flow starts from a fresh state in a freed row
+        clients[0].close()
+        client = InferenceClient(server.socket_path, 'c')
+        learner = NumpyLearner(Sender.state_dim, Sender.action_cnt)
+        for state in random_states(rng, 20):
+            state = list(state.astype(np.float32))
+            assert client.sample_action(state) == learner.sample_action(state)
+
+        client.close()
+        clients[1].close()
+    finally:
+        stop_server(server, thread)
+        shutil.rmtree(tmp_dir)
+
+    print 'test_flows: success'
+
+
+def test_micro_batching():
+    tmp_dir = tempfile.mkdtemp()
+    # a long budget, so that only a full batch runs early
+    server, thread = start_server(path.join(tmp_dir, 'inference.sock'), 4,
+                                  latency_budget_ms=2000)
+    try:
+        clients = [InferenceClient(server.socket_path, i) for i in xrange(3)]
+        state = [1.0] * Sender.state_dim
+
+        actions = [None] * len(clients)
+
+        def step(i):
+            actions[i] = clients[i].sample_action(state)
+
+        for _ in xrange(5):
+            threads = [threading.Thread(target=step, args=(i,))
+                       for i in xrange(len(clients))]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join(1)
+            assert None not in actions
+            actions = [None] * len(clients)
+
+        # every step of the connected flows was one batch
+        assert server.batch_calls == 5
+        assert server.batch_rows == 15
+
+        for client in clients:
+            client.close()
+    finally:
+        stop_server(server, thread)
+        shutil.rmtree(tmp_dir)
+
+    print 'test_micro_batching: success'
+
+
+def test_malformed_request():
+    tmp_dir = tempfile.mkdtemp()
+    server, thread = start_server(path.join(tmp_dir, 'inference.sock'), 2)
+    try:
+        client = InferenceClient(server.socket_path, 'a')
+
+        # a request of a length no state has closes that flow only
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        sock.connect(server.socket_path)
+        sock.send('b')
+        assert sock.recv(64).startswith('OK ')
+        sock.send('\0' * 5)
+        assert sock.recv(64) == ''
+        sock.close()
+
+        state = [1.0] * Sender.state_dim
+        learner = NumpyLearner(Sender.state_dim, Sender.action_cnt)
+        assert client.sample_action(state) == learner.sample_action(state)
+        assert thread.is_alive()
+
+        client.close()
+    finally:
+        stop_server(server, thread)
+        shutil.rmtree(tmp_dir)
+
+    print 'test_malformed_request: success'
+
+
+def test_latency_budget():
+    tmp_dir = tempfile.mkdtemp()
+    learner = NumpyLearner(Sender.state_dim, Sender.action_cnt, num_flows=3)
+    server = InferenceServer(path.join(tmp_dir, 'inference.sock'), learner,
+                             Sender.state_dim, 3, latency_budget_ms=100,
+                             max_batch=2)
+    peers = []
+    try:
+        # three requests that waited 80 ms, more than one batch holds
+        for row in xrange(3):
+            sock, peer = socket.socketpair(socket.AF_UNIX,
+                                           socket.SOCK_SEQPACKET)
+            peers.append(peer)
+            flow = Flow(sock)
+            flow.flow_id, flow.row = row, row
+            flow.state = np.ones(Sender.state_dim, np.float32)
+            flow.arrival = time.time() - 0.08
+            server.flows[sock.fileno()] = flow
+            server.flow_ids.add(row)
+            server.pending.append(flow)
+
+        assert server.batch_due()
+        server.run_batch()
+
+        # the one left over is due within the budget of its own arrival,
+        # not of the batch before it
+        assert not server.batch_due()
+        time.sleep(0.03)
+        assert server.batch_due()
+        server.run_batch()
+        assert not server.pending
+    finally:
+        for peer in peers:
+            peer.close()
+        server.cleanup()
+        shutil.rmtree(tmp_dir)
+
+    print 'test_latency_budget: success'
+
+
+def main():
+    test_flows()
+    test_micro_batching()
+    test_malformed_request()
+    test_latency_budget()
+
+
+if __name__ == '__main__':
+    main()
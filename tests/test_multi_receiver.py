@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+import threading
+import project_root
+from env.sender import Sender
+from env.multi_receiver import MultiReceiver
+
+
+def test_multi_receiver():
+    senders = [Sender(0, wire_format='struct'),
+               Sender(0, wire_format='protobuf')]
+
+    receiver = MultiReceiver(ack_count=2, ack_delay_us=1000)
+    for sender in senders:
+        receiver.add_peer('127.0.0.1', sender.sock.getsockname()[1])
+
+    thread = threading.Thread(target=receiver.run)
+    thread.daemon = True
+    thread.start()
+
+    for sender in senders:
+        sender.handshake()
+        sender.sock.settimeout(5)
+
+    assert senders[0].wire_format == 'struct'
+    assert senders[1].wire_format == 'protobuf'
+
+    # one coalesced ACK for the two struct datagrams
+    senders[0].send()
+    senders[0].send()
+    ack = senders[0].parse_ack(senders[0].sock.recv(1600))
+    assert ack.seq_num == 1
+    assert ack.ack_bytes == senders[0].sent_bytes
+
+    # protobuf datagrams are acked one by one
+    senders[1].send()
+    ack = senders[1].parse_ack(senders[1].sock.recv(1600))
+    assert ack.seq_num == 0
+
+    # a single struct datagram is acked once ack_delay_us passes
+    senders[0].send()
+    ack = senders[0].parse_ack(senders[0].sock.recv(1600))
+    assert ack.seq_num == 2
+
+    for sender in senders:
+        sender.cleanup()
+    print 'test_multi_receiver: success'
+
+
+def main():
+    test_multi_receiver()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+import shutil
+import tempfile
+import numpy as np
+import tensorflow as tf
+import project_root
+from os import path
+from env.sender import Sender
+from helpers.features import STATE_SCALES
+from dagger.numpy_model import (
+    export_weights, NumpyDaggerLSTM, DEFAULT_CHECKPOINT)
+from dagger.run_sender import Learner, NumpyLearner
+
+
+def random_states(rng, cnt):
+    # around the scale of each feature, as a sender sees them
+    return rng.uniform(0, 2, [cnt, len(STATE_SCALES)]) * STATE_SCALES
+
+
+def learners(weights_path, num_flows=1):
+    with tf.Graph().as_default():
+        tf_learner = Learner(Sender.state_dim, Sender.action_cnt,
+                             DEFAULT_CHECKPOINT, num_flows)
+    export_weights(DEFAULT_CHECKPOINT, weights_path)
+    np_learner = NumpyLearner(Sender.state_dim, Sender.action_cnt,
+                              weights_path, num_flows)
+    return tf_learner, np_learner
+
+
+def assert_same_lstm_state(tf_state, np_state):
+    for (tf_c, tf_h), (np_c, np_h) in zip(tf_state, np_state):
+        assert np.allclose(tf_c, np_c, rtol=1e-5, atol=1e-5)
+        assert np.allclose(tf_h, np_h, rtol=1e-5, atol=1e-5)
+
+
+def test_sample_action():
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        tf_learner, np_learner = learners(path.join(tmp_dir, 'model.npz'))
+        rng = np.random.RandomState(0)
+
+        for state in random_states(rng, 200):
+            tf_action = tf_learner.sample_action(list(state))
+            np_action = np_learner.sample_action(list(state))
+
+            assert tf_action == np_action
+            assert_same_lstm_state(tf_learner.lstm_state,
+                                   np_learner.lstm_state)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    print 'test_sample_action: success'
+
+
+def test_sample_actions():
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        tf_learner, np_learner = learners(path.join(tmp_dir, 'model.npz'),
+                                          num_flows=6)
+        rng = np.random.RandomState(1)
+
+        for _ in xrange(50):
+            flow_ids = np.flatnonzero(rng.rand(6) < 0.6)
+            if len(flow_ids) == 0:
+                continue
+            states = random_states(rng, len(flow_ids))
+
+            tf_actions = tf_learner.sample_actions(flow_ids, states)
+            np_actions = np_learner.sample_actions(flow_ids, states)
+
+            assert np.array_equal(tf_actions, np_actions)
+            assert_same_lstm_state(tf_learner.flow_lstm_state,
+                                   np_learner.flow_lstm_state)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    print 'test_sample_actions: success'
+
+
+def test_stale_weights():
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        # a checkpoint with its weights next to it, as save_model() leaves
+        checkpoint = path.join(tmp_dir, 'model')
+        for suffix in ['.data-00000-of-00001', '.index']:
+            shutil.copy(DEFAULT_CHECKPOINT + suffix, checkpoint + suffix)
+        weights_path = checkpoint + '.npz'
+        export_weights(checkpoint, weights_path)
+        NumpyDaggerLSTM(weights_path)
+
+        # retrained, but not exported again
+        with open(checkpoint + '.data-00000-of-00001', 'ab') as data_file:
+            data_file.write('\0')
+        try:
+            NumpyDaggerLSTM(weights_path)
+            assert False
+        except ValueError:
+            pass
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    print 'test_stale_weights: success'
+
+
+def main():
+    test_sample_action()
+    test_sample_actions()
+    test_stale_weights()
+
+
+if __name__ == '__main__':
+    main()
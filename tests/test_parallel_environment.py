@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+import project_root
+from os import path
+from env.sender import Sender
+from env.parallel_environment import ParallelEnvironment
+
+
+TRACE = path.join(project_root.DIR, 'env', '12mbps.trace')
+
+
+def test_parallel_environment():
+    max_steps = Sender.max_steps
+    Sender.max_steps = 50  # inherited by the child processes
+
+    # three links with different RTTs
+    cmds = ['mm-delay %d mm-link %s %s' % (delay, TRACE, TRACE)
+            for delay in [5, 20, 40]]
+    env = ParallelEnvironment(cmds, emulate=True)
+
+    steps = [0] * env.num_envs
+
+    def sample_actions(env_ids, states):
+        for env_id, state in zip(env_ids, states):
+            assert len(state) == Sender.state_dim
+            steps[env_id] += 1
+        return [3] * len(env_ids)  # +10 packets
+
+    env.set_sample_actions(sample_actions)
+
+    try:
+        for _ in xrange(2):
+            steps[:] = [0] * env.num_envs
+            env.reset()
+            rewards = env.rollout()
+
+            assert steps == [50] * env.num_envs
+            assert len(rewards) == env.num_envs
+            # a shorter RTT gives a better reward at the same windows
+            assert rewards[0] > rewards[2]
+    finally:
+        Sender.max_steps = max_steps
+        env.cleanup()
+
+    print 'test_parallel_environment: success'
+
+
+def main():
+    test_parallel_environment()
+
+
+if __name__ == '__main__':
+    main()
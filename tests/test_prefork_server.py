@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+import os
+import sys
+import time
+import shutil
+import socket
+import tempfile
+import subprocess
+import project_root
+from os import path
+from helpers.helpers import get_open_udp_port
+
+
+RUN_SENDER = path.join(project_root.DIR, 'dagger', 'run_sender.py')
+PREFORK_SERVER = path.join(project_root.DIR, 'dagger', 'prefork_server.py')
+
+
+def port_in_use(port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.bind(('0.0.0.0', port))
+        return False
+    except socket.error:
+        return True
+    finally:
+        sock.close()
+
+
+def test_prefork_flow():
+    tmp_dir = tempfile.mkdtemp()
+    socket_path = path.join(tmp_dir, 'prefork.sock')
+    devnull = open(os.devnull, 'w')
+
+    server = subprocess.Popen([sys.executable, PREFORK_SERVER, socket_path],
+                              stderr=devnull)
+    client = None
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(0.01)
+    try:
+        deadline = time.time() + 30
+        while not path.exists(socket_path):
+            assert time.time() < deadline
+            time.sleep(0.01)
+
+        port = get_open_udp_port()
+        client = subprocess.Popen(
+            [sys.executable, RUN_SENDER, str(port), '--server', socket_path],
+            stderr=devnull)
+
+        # the forked flow greets back, then sends data
+        greeted = False
+        data = None
+        while data is None:
+            assert time.time() < deadline
+            if not greeted:
+                sock.sendto('Hello from receiver', ('127.0.0.1', port))
+            try:
+                msg = sock.recv(1600)
+            except socket.timeout:
+                continue
+            if msg == 'Hello from sender':
+                greeted = True
+            elif greeted:
+                data = msg
+
+        # the flow ends with its client
+        client.kill()
+        client.wait()
+        while port_in_use(port):
+            assert time.time() < deadline
+            time.sleep(0.01)
+
+        # and the server outlives it
+        assert server.poll() is None
+    finally:
+        if client is not None and client.poll() is None:
+            client.kill()
+        server.terminate()
+        server.wait()
+        sock.close()
+        devnull.close()
+        shutil.rmtree(tmp_dir)
+
+    print 'test_prefork_flow: success'
+
+
+def main():
+    test_prefork_flow()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+import errno
+import socket
+import threading
+import project_root
+from env.sender import Sender
+from env.multi_sender import MultiSender
+
+
+class FailingSocket(object):
+    """A socket whose every send fails with err, e.g. EAGAIN when its send
+    buffer is full.
+    """
+
+    def __init__(self, sock, err):
+        self.sock = sock
+        self.err = err
+
+    def sendto(self, data, addr):
+        raise socket.error(self.err, 'sendto failed')
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+
+def test_send_eagain():
+    sender = Sender(0)
+    sender.peer_addr = ('127.0.0.1', sender.sock.getsockname()[1])
+    sock = sender.sock
+    sender.sock = FailingSocket(sock, errno.EAGAIN)
+    try:
+        # nothing is sent, nor counted, and the loops carry on
+        assert not sender.try_send()
+        assert sender.seq_num == 0 and sender.sent_bytes == 0
+        assert not sender.fill_window()
+
+        # other errors still propagate
+        sender.sock = FailingSocket(sock, errno.EPERM)
+        try:
+            sender.try_send()
+            assert False
+        except socket.error as e:
+            assert e.errno == errno.EPERM
+    finally:
+        sock.close()
+
+    print 'test_send_eagain: success'
+
+
+def test_multi_sender_eagain():
+    sender = Sender(0)
+    sender.peer_addr = ('127.0.0.1', sender.sock.getsockname()[1])
+    sock = sender.sock
+    sender.sock = FailingSocket(sock, errno.EAGAIN)
+    multi_sender = MultiSender([sender], lambda flow_ids, states: [])
+
+    # past the timeout that sends to a flow without ACKs
+    def stop():
+        sender.running = False
+    timer = threading.Timer(1.5, stop)
+    timer.start()
+    try:
+        multi_sender.run()
+        assert sender.seq_num == 0
+    finally:
+        timer.cancel()
+        sock.close()
+
+    print 'test_multi_sender_eagain: success'
+
+
+def main():
+    test_send_eagain()
+    test_multi_sender_eagain()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+import os
+import shutil
+import tempfile
+import numpy as np
+import project_root
+from os import path
+from helpers.traces import generate, write_trace
+from helpers.trace_cache import (
+    TraceCache, is_binary_trace, write_binary_trace, load_binary_trace,
+    load_text_trace, parse_text_trace, binary_to_text, text_to_binary)
+
+
+def test_binary_trace():
+    tmp_dir = tempfile.mkdtemp()
+
+    try:
+        trace = generate('on_off', seed=2, on_mbps=20, off_mbps=1)
+        binary_path = path.join(tmp_dir, 'a.bin')
+        write_binary_trace(binary_path, trace)
+        assert is_binary_trace(binary_path)
+
+        mapped, cum = load_binary_trace(binary_path)
+        assert isinstance(mapped, np.memmap)
+        assert np.array_equal(mapped, trace)
+        assert np.array_equal(
+            cum, np.searchsorted(trace, np.arange(trace[-1] + 1), 'right'))
+
+        # text -> binary -> text is lossless
+        text_path = path.join(tmp_dir, 'a.trace')
+        write_trace(text_path, trace)
+        assert not is_binary_trace(text_path)
+        text_to_binary(text_path, path.join(tmp_dir, 'b.bin'))
+        binary_to_text(path.join(tmp_dir, 'b.bin'),
+                       path.join(tmp_dir, 'b.trace'))
+        with open(text_path) as a, open(path.join(tmp_dir, 'b.trace')) as b:
+            assert a.read() == b.read()
+
+        # parsing falls back to a strict path on anything unusual
+        assert np.array_equal(parse_text_trace('1\n2\n3\n'), [1, 2, 3])
+        assert np.array_equal(parse_text_trace('1\n\n2\n'), [1, 2])
+        assert len(parse_text_trace('')) == 0
+        try:
+            parse_text_trace('1\nx\n3\n')
+            assert False
+        except ValueError:
+            pass
+
+        for bad_trace in [[], [0], [3, 2]]:
+            try:
+                write_binary_trace(path.join(tmp_dir, 'c.bin'), bad_trace)
+                assert False
+            except ValueError:
+                pass
+        # no temporary file left behind
+        assert sorted(os.listdir(tmp_dir)) == [
+            'a.bin', 'a.trace', 'b.bin', 'b.trace']
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    print 'test_binary_trace: success'
+
+
+def test_trace_cache():
+    tmp_dir = tempfile.mkdtemp()
+
+    try:
+        cache = TraceCache(path.join(tmp_dir, 'cache'))
+
+        trace, cum = cache.generated(model='constant', bandwidth=24)
+        assert np.array_equal(trace, generate('constant', bandwidth=24))
+        assert len(os.listdir(cache.cache_dir)) == 1
+
+        # the same parameters, defaults or not, hit the same entry
+        text_path = cache.generated_text(model='constant', bandwidth=24,
+                                         seed=0, duration_ms=60000)
+        assert len(os.listdir(cache.cache_dir)) == 2
+        assert np.array_equal(load_text_trace(text_path), trace)
+        assert cache.generated_text(model='constant',
+                                    bandwidth=24) == text_path
+
+        cache.generated(model='constant', bandwidth=48)
+        assert len(os.listdir(cache.cache_dir)) == 3
+
+        # text traces are keyed by content, wherever they are
+        for name in ['x.trace', 'y.trace']:
+            write_trace(path.join(tmp_dir, name), trace)
+            opened, _ = cache.open(path.join(tmp_dir, name))
+            assert np.array_equal(opened, trace)
+        assert len(os.listdir(cache.cache_dir)) == 4
+
+        # a fresh cache in another process finds the entries on disk
+        cache = TraceCache(cache.cache_dir)
+        assert np.array_equal(
+            cache.generated(model='constant', bandwidth=24)[0], trace)
+        assert len(os.listdir(cache.cache_dir)) == 4
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    print 'test_trace_cache: success'
+
+
+def main():
+    test_binary_trace()
+    test_trace_cache()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+import shutil
+import tempfile
+import numpy as np
+import project_root
+from os import path
+from helpers.traces import generate, write_trace
+from helpers.trace_index import trace_stats, build_index, TraceIndex
+
+
+def test_trace_stats():
+    stats = trace_stats(generate('constant', bandwidth=12), delays=[10, 40])
+    assert stats['duration_ms'] == 59999
+    assert abs(stats['mean_mbps'] - 12) < 0.01
+    assert abs(stats['p10_mbps'] - 12) < 0.01
+    assert abs(stats['p90_mbps'] - 12) < 0.01
+    assert stats['cov'] < 0.01
+    assert stats['outages'] == 0 and stats['outage_frac'] == 0
+    # 1 packet per ms over a 20 ms and an 80 ms round trip
+    assert abs(stats['bdp_10ms'] - 20) < 0.1
+    assert abs(stats['bdp_40ms'] - 80) < 0.1
+
+    # 12 Mbps for 1 s, then nothing for 1 s, and so on, for the 59 s
+    # up to the last opportunity
+    trace = generate('step_change', rates=[12, 0], change_ms=1000)
+    stats = trace_stats(trace, window_ms=500, hop_ms=500)
+    assert abs(stats['mean_mbps'] - 12 * 30 / 59.0) < 0.01
+    assert stats['p10_mbps'] < 0.01 and abs(stats['p90_mbps'] - 12) < 0.01
+    assert abs(stats['cov'] - 1) < 0.02
+    assert stats['outages'] == 29 and stats['max_outage_ms'] == 1000
+    assert abs(stats['outage_frac'] - 29 / 59.0) < 0.01
+
+    print 'test_trace_stats: success'
+
+
+def test_trace_index():
+    tmp_dir = tempfile.mkdtemp()
+
+    try:
+        specs = [('steady.trace', 'constant', {'bandwidth': 3}),
+                 ('fast.trace', 'constant', {'bandwidth': 48}),
+                 ('bursty.trace', 'step_change',
+                  {'rates': [1, 8], 'change_ms': 2000})]
+        trace_paths = []
+        for name, model, params in specs:
+            trace_paths.append(path.join(tmp_dir, name))
+            write_trace(trace_paths[-1], generate(model, **params))
+
+        # an invalid trace is left out
+        trace_paths.append(path.join(tmp_dir, 'empty.trace'))
+        open(trace_paths[-1], 'w').close()
+
+        index_path = path.join(tmp_dir, 'index.npz')
+        build_index(trace_paths, index_path, delays=[20], processes=2)
+
+        index = TraceIndex(index_path)
+        assert len(index) == 3
+        assert 'bdp_20ms' in index.fields()
+        assert index.params['window_ms'] == 1000
+
+        assert index.query('p10_mbps < 5') == trace_paths[0:3:2]
+        assert index.query('p10_mbps < 5 and cov > 0.5') == [trace_paths[2]]
+        assert index.query('cov > 0.5 or bdp_20ms >= 100') == \
+            trace_paths[1:3]
+        assert abs(index.row(trace_paths[1])['mean_mbps'] - 48) < 0.1
+
+        for query in ['p10_mbps <', 'rate < 5', 'cov > 1 and']:
+            try:
+                index.query(query)
+                assert False
+            except ValueError:
+                pass
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    print 'test_trace_index: success'
+
+
+def main():
+    test_trace_stats()
+    test_trace_index()
+
+
+if __name__ == '__main__':
+    main()
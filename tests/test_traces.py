@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+import os
+import shutil
+import tempfile
+import numpy as np
+import project_root
+from os import path
+from env.emulator import load_trace
+from helpers.traces import (
+    PACKETS_PER_MS_PER_MBPS, MODELS, generate, write_trace, family,
+    generate_files, rate_mbps, window, segments, resample)
+from helpers.preprocess_traces import find_traces, preprocess
+
+
+def test_constant():
+    # the evenly spaced timestamps of np.linspace(0, 60000, 5000 * Mbps)
+    for mbps in [0.5, 7.3, 12, 200]:
+        num_packets = int(mbps * 5000)
+        expected = np.linspace(0, 60000, num=num_packets,
+                               endpoint=False).astype(np.int64)
+        assert np.array_equal(generate('constant', bandwidth=mbps), expected)
+
+    # Poisson opportunities keep the mean rate
+    trace = generate('constant', seed=1, poisson=True, bandwidth=12)
+    assert abs(len(trace) - 60000) < 1000
+    assert np.all(np.diff(trace) >= 0)
+
+    print 'test_constant: success'
+
+
+def test_models():
+    params = {
+        'on_off': {'on_mbps': 24, 'mean_on_ms': 500, 'mean_off_ms': 500},
+        'markov': {'rates': [1, 12, 48]},
+        'random_walk': {'start_mbps': 12, 'min_mbps': 2, 'max_mbps': 50},
+        'step_change': {'rates': [6, 24, 12]},  # at random times
+    }
+
+    for model in MODELS:
+        if model == 'constant':
+            continue
+
+        trace = generate(model, seed=3, **params[model])
+        # seeded: the same seed, the same trace
+        assert np.array_equal(trace, generate(model, seed=3, **params[model]))
+        assert not np.array_equal(
+            trace, generate(model, seed=4, **params[model]))
+
+        assert np.all(np.diff(trace) >= 0)
+        assert 0 < trace[-1] < 60000
+
+    # bandwidth stays within bounds, a second at a time
+    trace = generate('random_walk', seed=5, start_mbps=12, min_mbps=2,
+                     max_mbps=50)
+    mbps = np.bincount(trace // 1000) / PACKETS_PER_MS_PER_MBPS / 1000
+    assert np.all(mbps >= 1.9) and np.all(mbps <= 50.1)
+
+    trace = generate('step_change', rates=[6, 24], change_ms=30000)
+    assert abs(np.sum(trace < 30000) - 6 * 2500) <= 1
+    assert abs(np.sum(trace >= 30000) - 24 * 2500) <= 1
+
+    print 'test_models: success'
+
+
+def test_write_trace():
+    output_dir = tempfile.mkdtemp()
+
+    try:
+        trace = generate('markov', seed=0, rates=[3, 30])
+        trace_path = path.join(output_dir, 'markov.trace')
+        write_trace(trace_path, trace)
+        assert np.array_equal(load_trace(trace_path), trace)
+
+        specs = family('on_off', 3, output_dir, seed=10, on_mbps=12)
+        paths = generate_files(specs, processes=2)
+        assert paths == [path.join(output_dir, 'on_off-%d.trace' % s)
+                         for s in [10, 11, 12]]
+        for s, trace_path in zip([10, 11, 12], paths):
+            assert np.array_equal(load_trace(trace_path),
+                                  generate('on_off', seed=s, on_mbps=12))
+    finally:
+        shutil.rmtree(output_dir)
+
+    print 'test_write_trace: success'
+
+
+def test_segments():
+    trace = np.array([0, 5, 10, 10, 15, 20, 25, 29])
+
+    assert np.array_equal(window(trace, 10, 20), [0, 0, 5])
+    parts = segments(trace, 10, start_ms=5, hop_ms=5)
+    assert [start for start, _ in parts] == [5, 10, 15, 20]
+    assert np.array_equal(parts[0][1], [0, 5, 5])
+    assert np.array_equal(parts[3][1], [0, 5, 9])
+
+    # resampling a trace as is, scaling it, or averaging it over bins
+    trace = generate('on_off', seed=1, on_mbps=24, off_mbps=2)
+    assert resample(trace, 60000) is trace
+    assert np.array_equal(resample(trace, 60000, bin_ms=1.0), trace)
+    assert abs(rate_mbps(resample(trace, 60000, scale=0.5), 60000) -
+               0.5 * rate_mbps(trace, 60000)) < 0.01
+    smooth = resample(trace, 60000, bin_ms=1000)
+    assert abs(len(smooth) - len(trace)) <= 1
+    assert np.array_equal(smooth[:100] // 1000, np.zeros(100))
+
+    print 'test_segments: success'
+
+
+def test_preprocess():
+    tmp_dir = tempfile.mkdtemp()
+
+    try:
+        raw_dir = path.join(tmp_dir, 'raw')
+        os.mkdir(raw_dir)
+        write_trace(path.join(raw_dir, 'slow.trace'),
+                    generate('constant', duration_ms=40000, bandwidth=2))
+        write_trace(path.join(raw_dir, 'fast.trace'),
+                    generate('constant', duration_ms=40000, bandwidth=20))
+        assert len(find_traces([raw_dir])) == 2
+        assert len(find_traces([path.join(raw_dir, 'f*')])) == 1
+
+        # 10 s segments every 5 s of [5 s, 40 s), at least 5 Mbps
+        output_dir = path.join(tmp_dir, 'out')
+        os.mkdir(output_dir)
+        for trace_path in find_traces([raw_dir]):
+            written, filtered = preprocess(
+                trace_path, output_dir, start_ms=5000, end_ms=40000,
+                segment_ms=10000, hop_ms=5000, min_mbps=5)
+            assert len(written) + filtered == 6
+
+        assert sorted(os.listdir(output_dir)) == [
+            'fast-%d.trace' % s for s in [10000, 15000, 20000, 25000,
+                                          30000, 5000]]
+        segment = load_trace(path.join(output_dir, 'fast-5000.trace'))
+        assert len(segment) == 20 * 2500 / 3 and segment[-1] <= 10000
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    print 'test_preprocess: success'
+
+
+def main():
+    test_constant()
+    test_models()
+    test_write_trace()
+    test_segments()
+    test_preprocess()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+
+# Copyright 2018 Francis Y. Yan, Jestin Ma
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+
+import project_root
+from env import datagram_pb2, wire
+
+
+def test_struct_round_trip():
+    writer = wire.DataWriter('x' * 1400, count=2)
+
+    first = writer.pack(1, 100, 1429, 90, 0)
+    second = writer.pack(2, 101, 2858, 95, 1429)
+    assert first is not second
+    assert len(first) == wire.DATA_HEADER.size + 1400
+    assert wire.is_struct(first)
+
+    ack = wire.parse_ack(wire.construct_ack(str(second)))
+    assert ack == wire.Ack(seq_num=2, send_ts=101, sent_bytes=2858,
+                           delivered_time=95, delivered=1429,
+                           ack_bytes=len(second))
+
+    # buffers are reused round-robin and payload is left untouched
+    assert writer.pack(3, 102, 4287, 99, 2858) is first
+    assert first[wire.DATA_HEADER.size:] == 'x' * 1400
+
+    print 'test_struct_round_trip: success'
+
+
+def test_format_detection():
+    data = datagram_pb2.Data()
+    data.seq_num = 7
+    data.payload = 'x' * 1400
+    assert not wire.is_struct(data.SerializeToString())
+
+    ack = datagram_pb2.Ack()
+    ack.seq_num = 7
+    assert not wire.is_struct(ack.SerializeToString())
+    assert not wire.is_struct(wire.WIRE_OFFER)
+
+    print 'test_format_detection: success'
+
+
+def test_ack_coalescing():
+    writer = wire.DataWriter('x' * 1400)
+    coalescer = wire.AckCoalescer(max_count=4, max_delay_us=1000)
+    assert coalescer.timeout_us(0) is None
+
+    datagrams = [str(writer.pack(seq_num, 100 + seq_num, 0, 90, 0))
+                 for seq_num in [1, 2, 3, 5]]
+    assert not coalescer.add(datagrams[0], 10000)
+    assert coalescer.timeout_us(10300) == 700
+    assert not coalescer.add(datagrams[1], 10400)
+    assert not coalescer.add(datagrams[2], 10500)
+    assert coalescer.add(datagrams[3], 10600)  # max_count reached
+
+    serialized_ack = coalescer.flush(12600)
+    assert coalescer.timeout_us(12600) is None
+    assert wire.is_struct(serialized_ack)
+
+    ack, ack_delay_us, ranges = wire.parse_coalesced_ack(serialized_ack)
+    assert ack_delay_us == 2000
+    assert ranges == [(1, 3), (5, 5)]
+    assert ack.send_ts == 105
+    assert ack.ack_bytes == 4 * len(datagrams[0])
+
+    # the hold time is taken out of the sender's samples
+    ack = wire.parse_ack(serialized_ack)
+    assert ack.seq_num == 5
+    assert ack.send_ts == 107 and isinstance(ack.send_ts, (int, long))
+    assert ack.delivered_time == 92
+    assert isinstance(ack.delivered_time, (int, long))
+
+    # holds are rounded to whole ms
+    coalescer.add(datagrams[0], 0)
+    ack = wire.parse_ack(coalescer.flush(1600))
+    assert ack.send_ts == 103 and ack.delivered_time == 92
+
+    print 'test_ack_coalescing: success'
+
+
+def main():
+    test_struct_round_trip()
+    test_format_detection()
+    test_ack_coalescing()
+
+
+if __name__ == '__main__':
+    main()